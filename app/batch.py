@@ -0,0 +1,106 @@
+# evtx-analyzer/app/batch.py
+"""Splitting the reports of one batch Chainsaw/Hayabusa run back into per-file reports.
+
+In batch mode both tools run once over the whole upload directory. The
+results page expects one set of reports per EVTX file, so every detection is
+routed to the file it came from: Chainsaw records it in document.path,
+Hayabusa in the EvtxFile field of its verbose profile.
+"""
+import json
+import logging
+import os
+from pathlib import Path
+
+from jsonstream import JsonArrayWriter, iter_json_array
+
+logger = logging.getLogger(__name__)
+
+
+class SourceResolver:
+    """Maps the file paths the tools report back to the analysed EVTX files."""
+
+    def __init__(self, evtx_files: list):
+        self._by_path = {}
+        self._by_name = {}
+        for evtx_file in evtx_files:
+            self._by_path[os.path.realpath(evtx_file)] = evtx_file
+            # Names are only a fallback, and only when they are unambiguous
+            self._by_name.setdefault(Path(evtx_file).name, []).append(evtx_file)
+
+    def resolve(self, reported_path):
+        if not reported_path:
+            return None
+        evtx_file = self._by_path.get(os.path.realpath(reported_path))
+        if evtx_file is not None:
+            return evtx_file
+        candidates = self._by_name.get(Path(str(reported_path).replace("\\", "/")).name, [])
+        return candidates[0] if len(candidates) == 1 else None
+
+
+def split_chainsaw_report(report_path: Path, outputs: dict) -> int:
+    """Writes the detections of a batch Chainsaw JSON report into per-file reports.
+
+    outputs maps each EVTX file to the report path it should get; every file
+    gets a report, empty if nothing was detected in it. Aggregate detections
+    spanning several files go to each of them, with only that file's documents.
+    Returns the number of detections that could not be attributed to a file.
+    """
+    resolver = SourceResolver(list(outputs))
+    handles = {evtx_file: open(output_path, "w", encoding="utf-8") for evtx_file, output_path in outputs.items()}
+    writers = {evtx_file: JsonArrayWriter(handle) for evtx_file, handle in handles.items()}
+    unattributed = 0
+    try:
+        # Detections are streamed from the report into the per-file reports
+        with open(report_path, "r", encoding="utf-8") as f:
+            for detection in iter_json_array(f):
+                if "documents" in detection:
+                    by_file = {}
+                    for document in detection["documents"]:
+                        evtx_file = resolver.resolve(document.get("path"))
+                        if evtx_file is not None:
+                            by_file.setdefault(evtx_file, []).append(document)
+                    if not by_file:
+                        unattributed += 1
+                    for evtx_file, documents in by_file.items():
+                        writers[evtx_file].write({**detection, "documents": documents})
+                else:
+                    evtx_file = resolver.resolve(detection.get("document", {}).get("path"))
+                    if evtx_file is None:
+                        unattributed += 1
+                    else:
+                        writers[evtx_file].write(detection)
+        for writer in writers.values():
+            writer.close()
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return unattributed
+
+
+def split_hayabusa_jsonl(report_path: Path, outputs: dict, source_field: str = "EvtxFile") -> int:
+    """Streams the lines of a batch Hayabusa JSONL report into per-file reports.
+
+    outputs maps each EVTX file to the report path it should get. Returns the
+    number of lines that could not be attributed to a file.
+    """
+    resolver = SourceResolver(list(outputs))
+    handles = {evtx_file: open(output_path, "w", encoding="utf-8") for evtx_file, output_path in outputs.items()}
+    unattributed = 0
+    try:
+        with open(report_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    source = json.loads(line).get(source_field)
+                except (ValueError, AttributeError):
+                    source = None
+                evtx_file = resolver.resolve(source)
+                if evtx_file is None:
+                    unattributed += 1
+                    continue
+                handles[evtx_file].write(line if line.endswith("\n") else line + "\n")
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return unattributed
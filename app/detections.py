@@ -0,0 +1,388 @@
+# evtx-analyzer/app/detections.py
+"""Searchable store of the detections of every analysed file, across tickets.
+
+The Chainsaw and Hayabusa reports of a file are loaded into SQLite once its
+analysis finishes, so questions like "which tickets hit rule X" or "all
+detections on host Y last week" are answered from indexes instead of by
+grepping every report. Rule, level, timestamp, computer, channel, EventID and
+ticket are indexed columns; the rule name, computer, channel and event
+details are also in a full-text (FTS5) index.
+
+Existing results are loaded with:
+
+    python3 detections.py rebuild --db FILE RESULTS_DIR
+"""
+import argparse
+import json
+import logging
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from jsonstream import iter_json_array
+from lineindex import find_artifact, open_artifact
+
+logger = logging.getLogger(__name__)
+
+INSERT_BATCH = 5000
+# Event details are kept for display and full-text search, up to this length
+DETAILS_MAX_CHARS = 16384
+# Counting every match of a broad query is slow; past this, the total is a lower bound
+COUNT_LIMIT = 10000
+SUMMARY_FIELDS = ("ticket", "rule", "level", "computer", "channel", "event_id")
+
+# Hayabusa abbreviates its levels; stored levels use Chainsaw's (Sigma's) names
+_LEVELS = {
+    "crit": "critical",
+    "med": "medium",
+    "info": "informational",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id        INTEGER PRIMARY KEY,
+    ticket    TEXT NOT NULL,
+    stem      TEXT NOT NULL,
+    source    TEXT NOT NULL,
+    rule      TEXT,
+    level     TEXT,
+    ts        REAL,
+    timestamp TEXT,
+    computer  TEXT COLLATE NOCASE,
+    channel   TEXT COLLATE NOCASE,
+    event_id  INTEGER,
+    record_id INTEGER,
+    details   TEXT
+);
+CREATE INDEX IF NOT EXISTS detections_file ON detections (ticket, stem);
+CREATE INDEX IF NOT EXISTS detections_ts ON detections (ts);
+CREATE INDEX IF NOT EXISTS detections_rule ON detections (rule, ts);
+CREATE INDEX IF NOT EXISTS detections_level ON detections (level, ts);
+CREATE INDEX IF NOT EXISTS detections_computer ON detections (computer, ts);
+CREATE INDEX IF NOT EXISTS detections_channel ON detections (channel, ts);
+CREATE INDEX IF NOT EXISTS detections_event_id ON detections (event_id, ts);
+"""
+
+# The full-text index reads its text from the detections table; the triggers keep it in step
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS detections_fts USING fts5(
+    rule, computer, channel, details, content='detections', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS detections_fts_insert AFTER INSERT ON detections BEGIN
+    INSERT INTO detections_fts (rowid, rule, computer, channel, details)
+    VALUES (new.id, new.rule, new.computer, new.channel, new.details);
+END;
+CREATE TRIGGER IF NOT EXISTS detections_fts_delete AFTER DELETE ON detections BEGIN
+    INSERT INTO detections_fts (detections_fts, rowid, rule, computer, channel, details)
+    VALUES ('delete', old.id, old.rule, old.computer, old.channel, old.details);
+END;
+"""
+
+
+def parse_timestamp(value):
+    """Seconds since the epoch for the timestamp formats of both tools, or None.
+
+    Chainsaw writes ISO 8601 ("2024-01-01T10:00:00.123456Z"), Hayabusa
+    "2024-01-01 10:00:00.123 +01:00". Timestamps without an offset are UTC.
+    """
+    if not value:
+        return None
+    text = re.sub(r"\s+([+-]\d\d:?\d\d)$", r"\1", str(value).strip())
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
+    # Python only parses up to six fractional digits
+    text = re.sub(r"(\.\d{6})\d+", r"\1", text)
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _scalar(value):
+    # XML-derived values may carry attributes, e.g. {"#text": 4624, "Qualifiers": ""}
+    if isinstance(value, dict):
+        value = value.get("#text", value.get("$value"))
+    return value
+
+
+def _int(value):
+    try:
+        return int(_scalar(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _details(value) -> str:
+    if value is None:
+        return None
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return text[:DETAILS_MAX_CHARS]
+
+
+def chainsaw_rows(report_path: Path):
+    """Yields (source, rule, level, ts, timestamp, computer, channel, event_id, record_id, details).
+
+    An aggregate detection yields one row for each event it grouped.
+    """
+    with open_artifact(report_path, "r", encoding="utf-8") as f:
+        for detection in iter_json_array(f):
+            documents = detection.get("documents") or [detection.get("document") or {}]
+            for document in documents:
+                event = (document.get("data") or {}).get("Event") or {}
+                system = event.get("System") or {}
+                timestamp = detection.get("timestamp") \
+                    or (system.get("TimeCreated_attributes") or {}).get("SystemTime")
+                yield (
+                    "chainsaw",
+                    detection.get("name"),
+                    (detection.get("level") or "").lower() or None,
+                    parse_timestamp(timestamp),
+                    timestamp,
+                    _scalar(system.get("Computer")),
+                    _scalar(system.get("Channel")),
+                    _int(system.get("EventID")),
+                    _int(system.get("EventRecordID")),
+                    _details(event.get("EventData") or event.get("UserData")),
+                )
+
+
+def hayabusa_rows(report_path: Path):
+    """Yields rows like chainsaw_rows for every line of a Hayabusa JSONL timeline (gzipped or not)."""
+    with open_artifact(report_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                detection = json.loads(line)
+            except ValueError:
+                continue
+            level = (detection.get("Level") or "").lower()
+            details = {key: detection[key] for key in ("Details", "ExtraFieldInfo") if detection.get(key)}
+            yield (
+                "hayabusa",
+                detection.get("RuleTitle"),
+                _LEVELS.get(level, level) or None,
+                parse_timestamp(detection.get("Timestamp")),
+                detection.get("Timestamp"),
+                detection.get("Computer"),
+                detection.get("Channel"),
+                _int(detection.get("EventID")),
+                _int(detection.get("RecordID")),
+                _details(details or None),
+            )
+
+
+class DetectionStore:
+    """Loads detections into the store and queries them.
+
+    Every call opens its own connection: with the database in WAL mode,
+    searches keep being answered while a large report is being loaded.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.created = not self.db_path.exists()
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            try:
+                conn.executescript(_FTS_SCHEMA)
+                self.full_text = True
+            except sqlite3.OperationalError:
+                # SQLite built without FTS5; text search falls back to LIKE
+                logger.warning("SQLite has no FTS5 support, detection text search will be slow")
+                self.full_text = False
+        finally:
+            conn.close()
+
+    def close(self):
+        """Moves the write-ahead log into the database file, so it is complete on its own."""
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def ingest(self, ticket: str, stem: str, chainsaw_report: Path = None, hayabusa_report: Path = None) -> int:
+        """Replaces the detections of one file with those in its reports. Returns the number loaded."""
+        sources = []
+        if chainsaw_report is not None and chainsaw_report.is_file():
+            sources.append((chainsaw_rows, chainsaw_report))
+        if hayabusa_report is not None and hayabusa_report.is_file():
+            sources.append((hayabusa_rows, hayabusa_report))
+        loaded = 0
+        conn = self._connect()
+        try:
+            # One transaction, so searches see either the old or the new detections
+            with conn:
+                conn.execute("DELETE FROM detections WHERE ticket = ? AND stem = ?", (ticket, stem))
+                for rows, report in sources:
+                    try:
+                        batch = []
+                        for row in rows(report):
+                            batch.append((ticket, stem, *row))
+                            if len(batch) >= INSERT_BATCH:
+                                loaded += self._insert(conn, batch)
+                                batch = []
+                        loaded += self._insert(conn, batch)
+                    except (OSError, ValueError) as e:
+                        logger.error(f"Could not load the detections in {report}: {e}")
+        finally:
+            conn.close()
+        return loaded
+
+    @staticmethod
+    def _insert(conn, batch: list) -> int:
+        conn.executemany(
+            "INSERT INTO detections (ticket, stem, source, rule, level, ts, timestamp, computer, channel, "
+            "event_id, record_id, details) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            batch,
+        )
+        return len(batch)
+
+    def remove_stem(self, ticket: str, stem: str):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM detections WHERE ticket = ? AND stem = ?", (ticket, stem))
+        finally:
+            conn.close()
+
+    def remove_ticket(self, ticket: str):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM detections WHERE ticket = ?", (ticket,))
+        finally:
+            conn.close()
+
+    def rebuild(self, results_dir: Path) -> int:
+        """Loads the reports of every file under results_dir. Returns the number of detections."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM detections")
+        finally:
+            conn.close()
+        loaded = 0
+        for stem_dir in sorted(Path(results_dir).glob("*/*")):
+            if not stem_dir.is_dir():
+                continue
+            stem = stem_dir.name
+            loaded += self.ingest(
+                stem_dir.parent.name,
+                stem,
+                find_artifact(stem_dir / f"{stem}_chainsaw_report.json"),
+                find_artifact(stem_dir / f"{stem}_hayabusa_report.jsonl"),
+            )
+        return loaded
+
+    def _where(self, filters: dict) -> tuple:
+        """SQL conditions and parameters for the filters of search() and summary()."""
+        clauses = []
+        params = []
+        for column in ("ticket", "stem", "source", "rule", "computer", "channel"):
+            value = filters.get(column)
+            if value:
+                clauses.append(f"detections.{column} = ?")
+                params.append(value)
+        if filters.get("levels"):
+            clauses.append(f"detections.level IN ({', '.join('?' * len(filters['levels']))})")
+            params.extend(filters["levels"])
+        if filters.get("event_ids"):
+            clauses.append(f"detections.event_id IN ({', '.join('?' * len(filters['event_ids']))})")
+            params.extend(filters["event_ids"])
+        if filters.get("since") is not None:
+            clauses.append("detections.ts >= ?")
+            params.append(filters["since"])
+        if filters.get("until") is not None:
+            clauses.append("detections.ts < ?")
+            params.append(filters["until"])
+        text = filters.get("q")
+        if text:
+            if self.full_text:
+                clauses.append("detections.id IN (SELECT rowid FROM detections_fts WHERE detections_fts MATCH ?)")
+                params.append(_fts_query(text))
+            else:
+                clauses.append("(detections.rule LIKE ? OR detections.details LIKE ?)")
+                params.extend([f"%{text}%", f"%{text}%"])
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def search(self, filters: dict, offset: int = 0, limit: int = 50) -> dict:
+        """One page of matching detections, newest first.
+
+        filters may hold ticket, stem, source, rule, computer, channel (exact
+        matches), levels and event_ids (lists), since and until (epoch
+        seconds) and q (full-text terms).
+        """
+        where, params = self._where(filters)
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT * FROM detections{where} ORDER BY ts DESC, id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+            counted = conn.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM detections{where} LIMIT ?)", params + [COUNT_LIMIT + 1]
+            ).fetchone()[0]
+        finally:
+            conn.close()
+        return {
+            "total": min(counted, COUNT_LIMIT),
+            "total_exact": counted <= COUNT_LIMIT,
+            "detections": [dict(row) for row in rows],
+        }
+
+    def summary(self, field: str, filters: dict, limit: int = 100) -> list:
+        """Number of matching detections per value of field, most frequent first."""
+        if field not in SUMMARY_FIELDS:
+            raise ValueError(f"Cannot summarise by '{field}'")
+        where, params = self._where(filters)
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT {field} AS value, COUNT(*) AS count, MIN(ts) AS first_seen, MAX(ts) AS last_seen "
+                f"FROM detections{where} GROUP BY {field} ORDER BY count DESC LIMIT ?",
+                params + [limit],
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+
+def _fts_query(text: str) -> str:
+    # Every word must match (as a prefix); quoting keeps FTS5 syntax characters literal
+    terms = [term.replace('"', '""') for term in text.split()]
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detection store maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild = commands.add_parser("rebuild", help="load the reports of an existing results volume")
+    rebuild.add_argument("--db", type=Path, required=True)
+    rebuild.add_argument("results_dir", type=Path)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    start = time.perf_counter()
+    count = DetectionStore(args.db).rebuild(args.results_dir)
+    logger.info(f"Loaded {count} detection(s) from {args.results_dir} ({time.perf_counter() - start:.2f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+# evtx-analyzer/app/eventfilter.py
+"""Scoping an analysis to a time window, EventIDs and channels.
+
+An EventFilter travels with an upload through every stage: Chainsaw and
+Hayabusa get their own time (and for Hayabusa, EventID) options, the JSONL
+parser tests each record's header timestamp and its EventID and Channel
+values before converting it (see evtx_jsonl.py), and files with no record in
+the window are not analysed at all. Chainsaw's report is filtered by EventID
+and channel afterwards (filter_chainsaw_report). Hayabusa abbreviates channel
+names in its timeline, so its report is the one artifact the channel filter
+does not reach; not_applied() says so.
+
+Times are compared with the timestamp in each record's header, the time the
+record was written, as a FILETIME (100 ns intervals since 1601-01-01 UTC).
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+from jsonstream import JsonArrayWriter, iter_json_array
+
+# Seconds between 1601-01-01 and 1970-01-01
+_FILETIME_EPOCH = 11644473600
+
+
+def to_filetime(seconds: float) -> int:
+    """FILETIME of a time given in seconds since the Unix epoch."""
+    return int((seconds + _FILETIME_EPOCH) * 10_000_000)
+
+
+def _utc(seconds: float) -> datetime:
+    return datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+
+def _scalar(value):
+    # XML-derived values may carry attributes, e.g. {"#text": 4624, "Qualifiers": ""}
+    if isinstance(value, dict):
+        value = value.get("#text", value.get("$value"))
+    return value
+
+
+class EventFilter:
+    """Which records of an upload to analyse; every part is optional.
+
+    start and end are seconds since the Unix epoch and both inclusive.
+    Channels match case-insensitively.
+    """
+
+    def __init__(self, start: float = None, end: float = None, event_ids=None, channels=None):
+        if start is not None and end is not None and start > end:
+            raise ValueError("The start of the time window is after its end")
+        self.start = start
+        self.end = end
+        self.event_ids = frozenset(int(event_id) for event_id in event_ids or ())
+        self.channels = frozenset(channel.strip().casefold() for channel in channels or () if channel.strip())
+        self.start_filetime = to_filetime(start) if start is not None else None
+        self.end_filetime = to_filetime(end) if end is not None else None
+
+    def __bool__(self):
+        return self.has_window or self.checks_content
+
+    @property
+    def has_window(self) -> bool:
+        return self.start is not None or self.end is not None
+
+    @property
+    def checks_content(self) -> bool:
+        """Whether records have to be looked into (for their EventID or Channel), not just at their header."""
+        return bool(self.event_ids or self.channels)
+
+    def matches_time(self, filetime: int) -> bool:
+        if self.start_filetime is not None and filetime < self.start_filetime:
+            return False
+        return self.end_filetime is None or filetime <= self.end_filetime
+
+    def matches_content(self, event_id, channel) -> bool:
+        """Tests the EventID and Channel text of a record; a missing value never matches a set filter."""
+        if self.event_ids:
+            try:
+                if int(event_id) not in self.event_ids:
+                    return False
+            except (TypeError, ValueError):
+                return False
+        if self.channels:
+            return channel is not None and channel.casefold() in self.channels
+        return True
+
+    def matches_document(self, document: dict) -> bool:
+        """Tests the EventID and Channel of a Chainsaw detection document."""
+        system = (((document or {}).get("data") or {}).get("Event") or {}).get("System") or {}
+        channel = _scalar(system.get("Channel"))
+        return self.matches_content(_scalar(system.get("EventID")), channel if isinstance(channel, str) else None)
+
+    def not_applied(self) -> dict:
+        """The parts of the filter that a report does not honour, by report."""
+        return {"hayabusa_report": ["channels"]} if self.channels else {}
+
+    def chainsaw_args(self) -> list:
+        """Chainsaw hunt options for the time window; Chainsaw reads them as UTC."""
+        args = []
+        if self.start is not None:
+            args += ["--from", _utc(self.start).strftime("%Y-%m-%dT%H:%M:%S")]
+        if self.end is not None:
+            args += ["--to", _utc(self.end).strftime("%Y-%m-%dT%H:%M:%S")]
+        return args
+
+    def hayabusa_args(self) -> list:
+        """Hayabusa timeline options for the time window and the EventIDs (it has no channel filter)."""
+        args = []
+        if self.start is not None:
+            args += ["--timeline-start", _utc(self.start).strftime("%Y-%m-%d %H:%M:%S +00:00")]
+        if self.end is not None:
+            args += ["--timeline-end", _utc(self.end).strftime("%Y-%m-%d %H:%M:%S +00:00")]
+        if self.event_ids:
+            args += ["--include-eid", ",".join(str(event_id) for event_id in sorted(self.event_ids))]
+        return args
+
+    def to_dict(self) -> dict:
+        return {
+            "start": _utc(self.start).isoformat() if self.start is not None else None,
+            "end": _utc(self.end).isoformat() if self.end is not None else None,
+            "event_ids": sorted(self.event_ids),
+            "channels": sorted(self.channels),
+        }
+
+    def key(self) -> str:
+        """Short fingerprint of the filter, to keep filtered results apart in the result cache."""
+        return hashlib.sha256(json.dumps(self.to_dict(), sort_keys=True).encode()).hexdigest()[:16]
+
+    def __str__(self):
+        parts = []
+        if self.has_window:
+            start = _utc(self.start).isoformat() if self.start is not None else "..."
+            end = _utc(self.end).isoformat() if self.end is not None else "..."
+            parts.append(f"{start} to {end}")
+        if self.event_ids:
+            parts.append(f"EventID {', '.join(str(event_id) for event_id in sorted(self.event_ids))}")
+        if self.channels:
+            parts.append(f"channel {', '.join(sorted(self.channels))}")
+        return "; ".join(parts) or "everything"
+
+
+def filter_chainsaw_report(report_path: Path, event_filter: EventFilter) -> int:
+    """Drops the detections of a Chainsaw JSON report whose events event_filter does not match.
+
+    Chainsaw only takes the time window, so the EventIDs and channels are
+    applied to its report instead. An aggregate detection keeps the documents
+    that match and is dropped if none does. The report is rewritten in place
+    (through a temporary file) one detection at a time. Returns the number of
+    detections dropped.
+    """
+    if not event_filter.checks_content:
+        return 0
+    report_path = Path(report_path)
+    filtered_path = report_path.with_name(f".{report_path.name}.filtered")
+    dropped = 0
+    try:
+        with open(report_path, "r", encoding="utf-8") as f_in, open(filtered_path, "w", encoding="utf-8") as f_out:
+            writer = JsonArrayWriter(f_out)
+            for detection in iter_json_array(f_in):
+                if "documents" in detection:
+                    documents = [document for document in detection["documents"] if event_filter.matches_document(document)]
+                    if documents:
+                        writer.write({**detection, "documents": documents})
+                        continue
+                elif event_filter.matches_document(detection.get("document")):
+                    writer.write(detection)
+                    continue
+                dropped += 1
+            writer.close()
+        os.replace(filtered_path, report_path)
+    finally:
+        filtered_path.unlink(missing_ok=True)
+    return dropped
@@ -0,0 +1,665 @@
+# evtx-analyzer/app/evtx_jsonl.py
+"""EVTX record to JSONL conversion.
+
+Two converters produce the same JSON object per record:
+
+* "xml"    - the original path: render each record to XML, re-parse it with
+             xmltodict and walk the resulting dicts.
+* "native" - reads the BinXML template of each record directly. Every template
+             is compiled once into a small description of where EventRecordID
+             and the EventData name/value pairs live, and records only decode
+             the substitution values they need. Templates the compiler does not
+             understand fall back to the xml path record by record.
+
+Large files can be split into runs of chunks that are converted by a pool of
+processes and merged back in EventRecordID order.
+
+With an event filter (see eventfilter.py), records are tested before they are
+converted: the time window against the timestamp in the record header, and
+EventIDs and channels against the values the native converter decodes first.
+Records that do not match are dropped without decoding anything else.
+"""
+import heapq
+import json
+import logging
+import multiprocessing
+import os
+import re
+import resource
+import shutil
+import struct
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import xmltodict
+import Evtx.Evtx as evtx
+from Evtx.Evtx import Record
+from Evtx.Nodes import (
+    AttributeNode, BXmlTypeNode, CloseElementNode, CloseEmptyElementNode, CloseStartElementNode,
+    ConditionalSubstitutionNode, EndOfStreamNode, NormalSubstitutionNode, OpenStartElementNode,
+    StreamStartNode, TemplateNode, ValueNode, get_variant_value,
+)
+
+from lineindex import GzipLineWriter, IndexingWriter, LineIndexBuilder
+
+logger = logging.getLogger(__name__)
+
+PARSER_MODES = ("native", "xml")
+
+# Records are written in batches of this many lines
+WRITE_BATCH = 1000
+
+# Chunks (64 KB each) converted per process pool task in parallel mode
+PARALLEL_TASK_CHUNKS = 128
+
+# Characters python-evtx strips while rendering XML
+_RESTRICTED_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+_NEWLINES = re.compile("\r\n?")
+_ATTR_WHITESPACE = re.compile("[\t\n]")
+
+_BXML_TYPE = 0x21
+
+# Returned for records an event filter drops
+_FILTERED = object()
+
+
+def _record_filetime(buf, record_offset: int) -> int:
+    """Timestamp in a record's header (FILETIME)."""
+    return struct.unpack_from("<Q", buf, record_offset + 0x10)[0]
+
+
+# --- "xml" converter ---
+def _xml_text(value):
+    # Elements with attributes, e.g. EventID with Qualifiers, parse to a dict
+    if isinstance(value, dict):
+        return value.get("#text")
+    return value
+
+
+def record_to_dict_xml(record, event_filter=None):
+    """Converts a record by rendering it to XML and parsing that with xmltodict.
+
+    Returns (json_subline, has_event_data), or _FILTERED if the EventID or
+    Channel of the record does not match event_filter.
+    """
+    # Convert the record to a dict for ease of parsing
+    data_dict = xmltodict.parse(record.xml())
+
+    if event_filter is not None and event_filter.checks_content:
+        system = data_dict["Event"]["System"] or {}
+        if not event_filter.matches_content(_xml_text(system.get("EventID")), _xml_text(system.get("Channel"))):
+            return _FILTERED
+
+    # Initialize JSON object for this record
+    json_subline = {}
+
+    # Loop through each key,value pair of the System section of the evtx logs and extract the EventRecordID
+    for event_system_key, event_system_value in data_dict["Event"]["System"].items():
+        if event_system_key == "EventRecordID":
+            firstline = {event_system_key: event_system_value}
+            # Add information to the JSON object for this specific log
+            json_subline.update(firstline)  # add the event ID to JSON subline
+
+    # Loop through each key, value pair of the EventData section of the evtx logs
+    # Check if EventData exists first
+    if "EventData" not in data_dict["Event"]:
+        return json_subline, False
+
+    for event_data_key, event_data_value in data_dict["Event"]["EventData"].items():
+        for values in event_data_value:
+            # Initialize variables for each data pair
+            data_name = None
+            data_value = None
+
+            # Loop through each subvalue within the EventData section to extract necessary information
+            for event_data_subkey, event_data_subvalue in values.items():
+                if event_data_subkey == "@Name":
+                    data_name = event_data_subvalue
+                else:
+                    data_value = event_data_subvalue
+
+            # Add information to the JSON object for this specific log
+            if data_name is not None and data_value is not None:
+                json_subline.update({data_name: data_value})
+
+    return json_subline, True
+
+
+# --- "native" converter ---
+class _Unsupported(Exception):
+    """The template has a shape the native converter does not reproduce exactly."""
+
+
+def _text_value(text: str):
+    """Element text as the xml path sees it after rendering and xmltodict.parse."""
+    text = _NEWLINES.sub("\n", _RESTRICTED_CHARS.sub("", text)).strip()
+    return text or None
+
+
+def _attribute_value(text: str) -> str:
+    """Attribute text as the xml path sees it (XML attribute-value normalisation)."""
+    return _ATTR_WHITESPACE.sub(" ", _NEWLINES.sub("\n", _RESTRICTED_CHARS.sub("", text)))
+
+
+def _element_parts(element) -> tuple:
+    """Splits an element's children into (attributes, content parts, child elements).
+
+    Content parts are literal strings or substitution indexes.
+    """
+    attributes = []
+    parts = []
+    children = []
+    for child in element.children():
+        if isinstance(child, AttributeNode):
+            value = child.attribute_value()
+            if isinstance(value, ValueNode):
+                attr_parts = [value.children()[0].string()]
+            elif isinstance(value, (NormalSubstitutionNode, ConditionalSubstitutionNode)):
+                attr_parts = [value.index()]
+            else:
+                raise _Unsupported("attribute value")
+            attributes.append((child.attribute_name().string(), attr_parts))
+        elif isinstance(child, OpenStartElementNode):
+            children.append(child)
+        elif isinstance(child, ValueNode):
+            parts.append(child.children()[0].string())
+        elif isinstance(child, (NormalSubstitutionNode, ConditionalSubstitutionNode)):
+            parts.append(child.index())
+        elif isinstance(child, (CloseStartElementNode, CloseElementNode, CloseEmptyElementNode)):
+            continue
+        else:
+            raise _Unsupported(type(child).__name__)
+    return attributes, parts, children
+
+
+class CompiledTemplate:
+    """Where a template keeps the values that end up in the JSONL record.
+
+    record_id: content parts of Event/System/EventRecordID, or None
+    data:      (name parts, value parts) for each EventData child with a Name,
+               in the order xmltodict groups them
+    event_id, channel:
+               content parts of Event/System/EventID and Channel, or None;
+               only decoded to filter records
+    filterable: False if EventID or Channel has a shape the event filter
+               cannot read, so filtering needs the xml path
+    """
+
+    def __init__(self, record_id, has_event_data: bool, data: list, event_id=None, channel=None, filterable=True):
+        self.record_id = record_id
+        self.has_event_data = has_event_data
+        self.data = data
+        self.indexes = sorted({p for parts in ([record_id or []] + [n + v for n, v in data]) for p in parts if isinstance(p, int)})
+        self.event_id = event_id
+        self.channel = channel
+        self.filterable = filterable
+        self.filter_indexes = sorted({p for parts in (event_id or [], channel or []) for p in parts if isinstance(p, int)})
+
+
+def compile_template(template: TemplateNode) -> CompiledTemplate:
+    """Walks a template once and records where the interesting values are.
+
+    Raises _Unsupported if the xml path would produce a different shape for it.
+    """
+    roots = [c for c in template.children() if isinstance(c, OpenStartElementNode)]
+    if len(roots) != 1 or roots[0].tag_name() != "Event":
+        raise _Unsupported("root element")
+    for child in template.children():
+        if not isinstance(child, (OpenStartElementNode, StreamStartNode, EndOfStreamNode)):
+            raise _Unsupported("template content")
+
+    _, event_parts, event_children = _element_parts(roots[0])
+    sections = {}
+    for child in event_children:
+        sections.setdefault(child.tag_name(), []).append(child)
+    if event_parts or len(sections.get("System", [])) != 1 or len(sections.get("EventData", [])) > 1:
+        raise _Unsupported("event sections")
+
+    # EventRecordID lives in Event/System
+    _, _, system_children = _element_parts(sections["System"][0])
+    filter_values = {}
+    filterable = True
+    for tag in ("EventID", "Channel"):
+        elements = [c for c in system_children if c.tag_name() == tag]
+        if len(elements) > 1:
+            filterable = False
+        elif elements:
+            # Attributes (EventID Qualifiers) do not matter here
+            _, filter_values[tag], nested = _element_parts(elements[0])
+            filterable = filterable and not nested
+    record_ids = [c for c in system_children if c.tag_name() == "EventRecordID"]
+    record_id = None
+    if len(record_ids) > 1:
+        raise _Unsupported("EventRecordID")
+    if record_ids:
+        attributes, record_id, nested = _element_parts(record_ids[0])
+        if attributes or nested:
+            raise _Unsupported("EventRecordID")
+
+    filters = (filter_values.get("EventID"), filter_values.get("Channel"), filterable)
+    if "EventData" not in sections:
+        return CompiledTemplate(record_id, False, [], *filters)
+
+    attributes, parts, data_children = _element_parts(sections["EventData"][0])
+    if attributes or parts:
+        raise _Unsupported("EventData content")
+
+    # xmltodict groups the children by tag, in order of first appearance
+    groups = {}
+    for child in data_children:
+        groups.setdefault(child.tag_name(), []).append(child)
+    data = []
+    for children in groups.values():
+        for child in children:
+            attributes, value_parts, nested = _element_parts(child)
+            if nested or len(attributes) > 1 or (attributes and attributes[0][0] != "Name"):
+                raise _Unsupported("EventData element")
+            if attributes:
+                data.append((attributes[0][1], value_parts))
+    return CompiledTemplate(record_id, True, data, *filters)
+
+
+class NativeRecordConverter:
+    """Converts records straight from BinXML, caching compiled templates.
+
+    Windows re-emits every template in each chunk it is used in, with the same
+    GUID but different string offsets, so compiled templates are cached by GUID
+    and each template is only walked once per file rather than once per chunk.
+    """
+
+    def __init__(self):
+        self._compiled = {}        # template GUID bytes -> CompiledTemplate or None
+        self._chunk_templates = {} # chunk-relative template offset -> CompiledTemplate or None
+        self._chunk = None
+        self.fallbacks = 0
+
+    def set_chunk(self, chunk):
+        """Must be called before converting the records of a new chunk."""
+        self._chunk = chunk
+        self._chunk_templates = {}
+        # Templates may name strings defined by templates we never walk in this
+        # chunk (they were cached from an earlier one), so load the string table
+        chunk.strings()
+
+    def _template(self, buf, template_offset: int):
+        try:
+            return self._chunk_templates[template_offset]
+        except KeyError:
+            pass
+        chunk = self._chunk
+        absolute = chunk.offset() + template_offset
+        key = bytes(buf[absolute + 0x04:absolute + 0x14])
+        if key in self._compiled:
+            compiled = self._compiled[key]
+        else:
+            try:
+                compiled = compile_template(TemplateNode(buf, absolute, chunk, chunk))
+            except Exception as e:
+                logger.debug(f"Template at {absolute:#x} needs the xml path: {e}")
+                compiled = None
+            self._compiled[key] = compiled
+        self._chunk_templates[template_offset] = compiled
+        return compiled
+
+    def convert(self, buf, record_offset: int, event_filter=None):
+        """Returns (json_subline, has_event_data) for the record at record_offset.
+
+        Returns None for a record that even the xml path cannot convert, and
+        _FILTERED for one whose EventID or Channel does not match event_filter.
+        Only the EventID and Channel values are decoded before that decision.
+        """
+        chunk = self._chunk
+        root = record_offset + 0x18
+        ofs = root + 4 if buf[root] & 0x0F == 0x0F else root
+        # Template instance: token, unknown, template id, template offset
+        template_offset = struct.unpack_from("<I", buf, ofs + 6)[0]
+        subs_ofs = ofs + 10
+        if template_offset > ofs - chunk.offset():
+            # The template definition is stored inline, right after the instance
+            subs_ofs += 0x18 + struct.unpack_from("<I", buf, chunk.offset() + template_offset + 0x14)[0]
+
+        compiled = self._template(buf, template_offset)
+        if compiled is None:
+            return self._fallback(buf, record_offset, event_filter)
+
+        # Substitution array: count, then (size, type) descriptors, then the values
+        count = struct.unpack_from("<I", buf, subs_ofs)[0]
+        descriptors = struct.unpack_from("<" + "HBx" * count, buf, subs_ofs + 4)
+        value_ofs = subs_ofs + 4 + 4 * count
+
+        if event_filter is not None and event_filter.checks_content:
+            values = self._values(buf, compiled.filter_indexes, count, descriptors, value_ofs) if compiled.filterable else None
+            if values is None:
+                return self._fallback(buf, record_offset, event_filter)
+            event_id = _text_value(_join(compiled.event_id, values)) if compiled.event_id is not None else None
+            channel = _text_value(_join(compiled.channel, values)) if compiled.channel is not None else None
+            if not event_filter.matches_content(event_id, channel):
+                return _FILTERED
+
+        values = self._values(buf, compiled.indexes, count, descriptors, value_ofs)
+        if values is None:
+            return self._fallback(buf, record_offset, event_filter)
+
+        json_subline = {}
+        if compiled.record_id is not None:
+            json_subline["EventRecordID"] = _text_value(_join(compiled.record_id, values))
+        for name_parts, value_parts in compiled.data:
+            data_value = _text_value(_join(value_parts, values))
+            if data_value is not None:
+                json_subline[_attribute_value(_join(name_parts, values))] = data_value
+        return json_subline, compiled.has_event_data
+
+    def _values(self, buf, wanted: list, count: int, descriptors: tuple, value_ofs: int):
+        """Decodes the substitution values at the (sorted) indexes in wanted.
+
+        Returns None if one of them needs the xml path.
+        """
+        chunk = self._chunk
+        values = {}
+        position = value_ofs
+        next_index = 0
+        for index in wanted:
+            if index >= count:
+                # A missing substitution renders as an error in the xml path
+                return None
+            while next_index < index:
+                position += descriptors[2 * next_index]
+                next_index += 1
+            size, value_type = descriptors[2 * index], descriptors[2 * index + 1]
+            if value_type == _BXML_TYPE:
+                return None
+            if value_type == 0x01:
+                values[index] = bytes(buf[position:position + size]).decode("utf16").rstrip("\x00")
+            else:
+                node = get_variant_value(buf, position, chunk, chunk, value_type, length=size)
+                if isinstance(node, BXmlTypeNode):
+                    return None
+                values[index] = node.string()
+        return values
+
+    def _fallback(self, buf, record_offset: int, event_filter=None):
+        self.fallbacks += 1
+        try:
+            return record_to_dict_xml(Record(buf, record_offset, self._chunk), event_filter)
+        except Exception as e:
+            # The xml path gives up on the whole file here; skip just this record
+            logger.warning(f"Skipping unparseable record at offset {record_offset:#x}: {e}")
+            return None
+
+
+def _join(parts: list, values: dict) -> str:
+    if len(parts) == 1:
+        part = parts[0]
+        return values[part] if isinstance(part, int) else part
+    return "".join(values[p] if isinstance(p, int) else p for p in parts)
+
+
+def iter_chunk_records(chunk):
+    """Yields the offsets of the records in a chunk without building Record objects."""
+    buf = chunk._buf
+    start = chunk.offset()
+    end = start + chunk.next_record_offset()
+    offset = start + 0x200
+    while offset < end:
+        size = struct.unpack_from("<I", buf, offset + 4)[0]
+        if size == 0 or size > 0x10000:
+            return
+        yield offset
+        offset += size
+
+
+# --- Writers ---
+def _write_batches(lines, f_out):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= WRITE_BATCH:
+            f_out.write("\n".join(batch) + "\n")
+            batch = []
+    if batch:
+        f_out.write("\n".join(batch) + "\n")
+
+
+def _new_stats() -> dict:
+    return {"records": 0, "no_event_data": 0, "fallbacks": 0, "skipped": 0, "filtered": 0}
+
+
+def _convert_chunks(chunks, mode: str, stats: dict, event_filter=None):
+    """Yields the converted (json_subline, has_event_data) records of chunks.
+
+    Yields None for skipped records and _FILTERED for records event_filter drops.
+    """
+    if mode == "xml":
+        return _xml_records(chunks, event_filter)
+    return _native_records(chunks, stats, event_filter)
+
+
+def _xml_records(chunks, event_filter=None):
+    window = event_filter is not None and event_filter.has_window
+    for chunk in chunks:
+        for record in chunk.records():
+            if window and not event_filter.matches_time(_record_filetime(chunk._buf, record.offset())):
+                yield _FILTERED
+            else:
+                yield record_to_dict_xml(record, event_filter)
+
+
+def _json_lines(converted, stats: dict, check_cancelled=None):
+    for seen, converted_record in enumerate(converted):
+        # Counted over every record, so a filter that drops them all cannot delay cancelling
+        if seen % WRITE_BATCH == 0 and check_cancelled is not None:
+            check_cancelled()
+        if converted_record is None:
+            stats["skipped"] += 1
+            continue
+        if converted_record is _FILTERED:
+            stats["filtered"] += 1
+            continue
+        json_subline, has_event_data = converted_record
+        stats["records"] += 1
+        if not has_event_data:
+            stats["no_event_data"] += 1
+        # Write the JSON object as a single line to the JSONL file
+        yield json.dumps(json_subline)
+
+
+def _output_writer(f, line_index: bool, compress_level):
+    """Returns (writer, indexer) for the output file f; indexer.save() writes its line index, if any."""
+    if compress_level is not None:
+        writer = GzipLineWriter(f, level=compress_level)
+        return writer, writer
+    if line_index:
+        builder = LineIndexBuilder()
+        return IndexingWriter(f, builder), builder
+    return f, None
+
+
+def convert_evtx_to_jsonl(evtx_path, jsonl_output_path, mode: str = "native", check_cancelled=None,
+                          processes: int = 1, line_index: bool = False, compress_level: int = None,
+                          event_filter=None) -> dict:
+    """Writes one JSON object per record of evtx_path to jsonl_output_path.
+
+    check_cancelled is called every WRITE_BATCH records and may raise to abort.
+    With processes > 1 the chunks are converted by a process pool, see
+    convert_evtx_to_jsonl_parallel. With line_index, the line-offset index of
+    the output is built as it is written (see lineindex.py). With
+    compress_level, the output is a seekable gzip file (lineindex.GzipLineWriter),
+    which always gets its index. With an event_filter (eventfilter.EventFilter),
+    only the records it matches are written.
+    Returns counters: records (written), filtered, no_event_data and (native
+    mode) fallbacks and skipped;
+    with processes > 1 also the CPU time (including starting them) and peak
+    memory (bytes) of the pool processes, worker_cpu_seconds and worker_peak_rss.
+    """
+    if processes > 1:
+        return convert_evtx_to_jsonl_parallel(
+            evtx_path, jsonl_output_path, processes, mode, check_cancelled, line_index, compress_level, event_filter
+        )
+
+    stats = _new_stats()
+    with open(jsonl_output_path, "w" if compress_level is None else "wb") as f_out:
+        writer, indexer = _output_writer(f_out, line_index, compress_level)
+        with evtx.Evtx(str(evtx_path)) as log:
+            converted = _convert_chunks(log.chunks(), mode, stats, event_filter)
+            _write_batches(_json_lines(converted, stats, check_cancelled), writer)
+        if compress_level is not None:
+            writer.close()
+    if indexer is not None:
+        indexer.save(jsonl_output_path)
+    return stats
+
+
+def _native_records(chunks, stats: dict, event_filter=None):
+    converter = NativeRecordConverter()
+    window = event_filter is not None and event_filter.has_window
+    content_filter = event_filter if event_filter is not None and event_filter.checks_content else None
+    try:
+        for chunk in chunks:
+            converter.set_chunk(chunk)
+            buf = chunk._buf
+            for record_offset in iter_chunk_records(chunk):
+                if window and not event_filter.matches_time(_record_filetime(buf, record_offset)):
+                    yield _FILTERED
+                else:
+                    yield converter.convert(buf, record_offset, content_filter)
+    finally:
+        stats["fallbacks"] = converter.fallbacks
+
+
+def file_in_window(evtx_path, event_filter) -> bool:
+    """Whether any record of evtx_path was written inside the time window of event_filter.
+
+    Only record headers are read, and the scan stops at the first record in the window.
+    """
+    with evtx.Evtx(str(evtx_path)) as log:
+        for chunk in log.chunks():
+            buf = chunk._buf
+            for record_offset in iter_chunk_records(chunk):
+                if event_filter.matches_time(_record_filetime(buf, record_offset)):
+                    return True
+    return False
+
+
+# --- Parallel conversion ---
+def _chunk_ranges(evtx_path) -> list:
+    """Returns (first record id, last record id, offset) for every chunk, in record id order."""
+    with evtx.Evtx(str(evtx_path)) as log:
+        ranges = [
+            (chunk.log_first_record_number(), chunk.log_last_record_number(), chunk.offset())
+            for chunk in log.chunks()
+        ]
+    ranges.sort()
+    return ranges
+
+
+def _convert_chunk_task(evtx_path: str, chunk_offsets: list, part_path: str, mode: str, event_filter=None,
+                        sort: bool = False) -> dict:
+    """Process pool task: converts the chunks at chunk_offsets into part_path.
+
+    With sort, the lines of the part are sorted by EventRecordID, for chunks
+    whose record ranges overlap.
+    """
+    wanted = set(chunk_offsets)
+    order = {offset: i for i, offset in enumerate(chunk_offsets)}
+    stats = _new_stats()
+    with open(part_path, "w") as f_out:
+        with evtx.Evtx(evtx_path) as log:
+            chunks = sorted((c for c in log.chunks() if c.offset() in wanted), key=lambda c: order[c.offset()])
+            lines = _json_lines(_convert_chunks(chunks, mode, stats, event_filter), stats)
+            if sort:
+                # A part is at most PARALLEL_TASK_CHUNKS chunks, so this stays small
+                lines = sorted(lines, key=_line_record_id)
+            _write_batches(lines, f_out)
+    # The usage of the worker process so far, including starting it; the caller keeps the latest per worker
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is in kilobytes on Linux
+    stats["worker"] = (os.getpid(), usage.ru_utime + usage.ru_stime, usage.ru_maxrss * 1024)
+    return stats
+
+
+def _line_record_id(line: str) -> int:
+    try:
+        return int(json.loads(line).get("EventRecordID") or 0)
+    except ValueError:
+        return 0
+
+
+def convert_evtx_to_jsonl_parallel(evtx_path, jsonl_output_path, processes: int, mode: str = "native",
+                                   check_cancelled=None, line_index: bool = False, compress_level: int = None,
+                                   event_filter=None) -> dict:
+    """Converts the chunks of one EVTX file on a pool of processes.
+
+    Chunks are sorted by their first EventRecordID and handed out in runs of
+    PARALLEL_TASK_CHUNKS, each written to its own part file next to the output.
+    Part files are appended to the output in order as soon as they are done, so
+    memory use does not grow with the file. If the record ranges of chunks
+    overlap (e.g. a damaged or wrapped log), every part is sorted by
+    EventRecordID and the parts are merged line by line on it instead.
+    """
+    evtx_path = Path(evtx_path)
+    jsonl_output_path = Path(jsonl_output_path)
+    ranges = _chunk_ranges(evtx_path)
+    # Unused chunks at the end of a log have no records and a zeroed header
+    used = [(first, last) for first, last, _ in ranges if first and last >= first]
+    overlapping = any(used[i][0] <= used[i - 1][1] for i in range(1, len(used)))
+    offsets = [offset for _, _, offset in ranges]
+    tasks = [offsets[i:i + PARALLEL_TASK_CHUNKS] for i in range(0, len(offsets), PARALLEL_TASK_CHUNKS)]
+
+    stats = _new_stats()
+    # Worker process id -> (CPU seconds, peak RSS) as of its latest task
+    workers = {}
+    with tempfile.TemporaryDirectory(dir=jsonl_output_path.parent, prefix=".parts-") as parts_dir:
+        part_paths = [Path(parts_dir) / f"{i:06d}.jsonl" for i in range(len(tasks))]
+        # spawn rather than fork: the app process is multi-threaded
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max(1, processes), mp_context=context) as pool, \
+                open(jsonl_output_path, "w" if compress_level is None else "wb") as f_file:
+            f_out, indexer = _output_writer(f_file, line_index, compress_level)
+            futures = {
+                pool.submit(
+                    _convert_chunk_task, str(evtx_path), chunk_offsets, str(part_path), mode, event_filter, overlapping
+                ): i
+                for i, (chunk_offsets, part_path) in enumerate(zip(tasks, part_paths))
+            }
+            done_parts = set()
+            next_part = 0
+            pending = set(futures)
+            try:
+                while pending:
+                    done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                    if check_cancelled is not None:
+                        check_cancelled()
+                    for future in done:
+                        part_stats = future.result()
+                        pid, cpu_seconds, peak_rss = part_stats.pop("worker")
+                        workers[pid] = max(workers.get(pid, (0.0, 0)), (cpu_seconds, peak_rss))
+                        for key, value in part_stats.items():
+                            stats[key] += value
+                        done_parts.add(futures[future])
+                    # Append finished parts to the output in order while the rest is still running
+                    while not overlapping and next_part in done_parts:
+                        with open(part_paths[next_part]) as part:
+                            shutil.copyfileobj(part, f_out)
+                        part_paths[next_part].unlink()
+                        next_part += 1
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+
+            if overlapping:
+                logger.info(f"Record ranges of the chunks in {evtx_path.name} overlap, merging by EventRecordID")
+                parts = [open(part_path) for part_path in part_paths]
+                try:
+                    f_out.writelines(heapq.merge(*parts, key=_line_record_id))
+                finally:
+                    for part in parts:
+                        part.close()
+            if compress_level is not None:
+                f_out.close()
+    if indexer is not None:
+        indexer.save(jsonl_output_path)
+    stats["worker_cpu_seconds"] = sum(cpu_seconds for cpu_seconds, _ in workers.values())
+    stats["worker_peak_rss"] = max((peak_rss for _, peak_rss in workers.values()), default=0)
+    return stats
@@ -0,0 +1,297 @@
+# evtx-analyzer/app/jobs.py
+import logging
+import os
+import select
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+# Thread-local holding the job the current worker thread is working on
+_local = threading.local()
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been cancelled by the user."""
+
+
+def current_job():
+    """Returns the job the calling thread is working on, or None."""
+    return getattr(_local, "job", None)
+
+
+def set_current_job(job):
+    """Binds a job to the calling thread (used by worker threads)."""
+    _local.job = job
+
+
+class Job:
+    """A single queued upload, tracked from submission until it finishes."""
+
+    def __init__(self, ticket_number: str, filename: str, on_finish=None):
+        self.id = uuid.uuid4().hex
+        self.ticket_number = ticket_number
+        self.filename = filename
+        self.status = QUEUED
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.files_total = 0
+        self.files_done = 0
+        self.files_cached = 0
+        self.files_skipped = 0
+        # Version of the rule set the job was analysed with
+        self.rules_version = None
+        # The time window, EventIDs and channels the upload was limited to (see eventfilter.py)
+        self.event_filter = None
+        # Measurements of every stage run for the job (see metrics.py)
+        self.stages = []
+        # Called once when the job finishes, however it ends (e.g. to remove its upload)
+        self._on_finish = on_finish
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self) -> bool:
+        """Flags the job as cancelled; running work stops at the next checkpoint.
+
+        Returns whether the job was still queued, and so will never start.
+        """
+        with self._lock:
+            self._cancel_event.set()
+            return self.status == QUEUED
+
+    def raise_if_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    def start(self):
+        """Marks the job as running, unless it was cancelled while it was queued."""
+        with self._lock:
+            if self._cancel_event.is_set():
+                raise JobCancelled(f"Job {self.id} was cancelled")
+            self.status = RUNNING
+            self.started_at = time.time()
+
+    def finish(self, status: str, error: str = None):
+        """Records how the job ended and runs its on_finish callback, the first time only."""
+        with self._lock:
+            if self.status in FINISHED_STATES:
+                return
+            self.status = status
+            self.error = error
+            self.finished_at = time.time()
+            on_finish, self._on_finish = self._on_finish, None
+        if on_finish is not None:
+            try:
+                on_finish()
+            except Exception as e:
+                logger.exception(f"Cleanup of job {self.id} failed: {e}")
+
+    def set_progress(self, files_total=None, files_done=None):
+        with self._lock:
+            if files_total is not None:
+                self.files_total = files_total
+            if files_done is not None:
+                self.files_done = files_done
+
+    def file_done(self, cached: bool = False, skipped: bool = False):
+        with self._lock:
+            self.files_done += 1
+            if cached:
+                self.files_cached += 1
+            if skipped:
+                self.files_skipped += 1
+
+    def add_stage(self, measurements: dict):
+        with self._lock:
+            self.stages.append(measurements)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "id": self.id,
+                "ticket_number": self.ticket_number,
+                "filename": self.filename,
+                "status": self.status,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "rules_version": self.rules_version,
+                "event_filter": self.event_filter,
+                "progress": {
+                    "files_total": self.files_total,
+                    "files_done": self.files_done,
+                    "files_cached": self.files_cached,
+                    "files_skipped": self.files_skipped,
+                },
+                "stages": list(self.stages),
+            }
+
+
+class JobManager:
+    """Runs jobs on a bounded pool of worker threads and keeps track of their state."""
+
+    def __init__(self, max_workers: int, max_finished: int = 500):
+        self.max_workers = max_workers
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-worker")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, ticket_number: str, filename: str, *args, on_finish=None) -> Job:
+        """Queues fn(job, *args) and returns the new job straight away.
+
+        on_finish is called once the job has finished, also when it was
+        cancelled before it started or dropped at shutdown, so it is the place
+        to release what the job was handed.
+        """
+        job = Job(ticket_number, filename, on_finish)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        future = self._executor.submit(self._run, job, fn, args)
+        future.add_done_callback(lambda f: self._dropped(job, f))
+        logger.info(f"Queued job {job.id} for ticket {ticket_number} ({filename})")
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> list:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return sorted(jobs, key=lambda j: j.created_at, reverse=True)
+
+    def cancel(self, job_id: str):
+        """Cancels a job. Queued jobs never start; running jobs stop at the next checkpoint."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job.status not in FINISHED_STATES:
+            logger.info(f"Cancellation requested for job {job.id}")
+            if job.cancel():
+                # Its worker will not start it, so it is done now
+                job.finish(CANCELLED)
+        return job
+
+    def shutdown(self):
+        for job in self.list():
+            if job.status not in FINISHED_STATES:
+                job.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _dropped(job: Job, future):
+        # A future cancelled at shutdown never calls _run
+        if future.cancelled():
+            job.finish(CANCELLED)
+
+    def _run(self, job: Job, fn, args):
+        set_current_job(job)
+        status, error = FAILED, None
+        try:
+            job.start()
+            fn(job, *args)
+            status = COMPLETED
+        except JobCancelled:
+            status = CANCELLED
+            logger.warning(f"Job {job.id} cancelled")
+        except Exception as e:
+            error = str(e)
+            logger.exception(f"Job {job.id} failed: {e}")
+        finally:
+            job.finish(status, error)
+            set_current_job(None)
+
+    def _prune(self):
+        # Only keep the most recent finished jobs around; caller holds the lock
+        finished = [j for j in self._jobs.values() if j.status in FINISHED_STATES]
+        if len(finished) <= self.max_finished:
+            return
+        finished.sort(key=lambda j: j.finished_at or j.created_at)
+        for job in finished[: len(finished) - self.max_finished]:
+            del self._jobs[job.id]
+
+
+def _reap(proc: subprocess.Popen, job: Job = None, poll_interval: float = 0.5) -> tuple:
+    """Waits for proc with os.wait4 and returns (its resource usage, whether it was killed).
+
+    If a job is given, the process group of proc is killed as soon as the job
+    is cancelled. Sets proc.returncode, so Popen does not wait for it again.
+    """
+    pidfd = None
+    if job is not None:
+        try:
+            # Becomes readable when the child exits, so waiting needs no polling
+            pidfd = os.pidfd_open(proc.pid)
+        except (AttributeError, OSError):
+            pass
+    killed = False
+    try:
+        while True:
+            if job is not None and not killed and job.cancelled:
+                os.killpg(proc.pid, signal.SIGKILL)
+                killed = True
+            pid, status, rusage = os.wait4(proc.pid, os.WNOHANG if job is not None and not killed else 0)
+            if pid == proc.pid:
+                proc.returncode = os.waitstatus_to_exitcode(status)
+                return rusage, killed
+            if pidfd is not None:
+                select.select([pidfd], [], [], poll_interval)
+            else:
+                time.sleep(min(poll_interval, 0.05))
+    finally:
+        if pidfd is not None:
+            os.close(pidfd)
+
+
+def run_command(cmd: list, job: Job = None, env: dict = None, poll_interval: float = 0.5) -> subprocess.CompletedProcess:
+    """Runs cmd like subprocess.run(check=True, capture_output=True, text=True).
+
+    If a job is given, the child process is killed as soon as the job is cancelled
+    and JobCancelled is raised instead of waiting for the tool to finish. The
+    returned CompletedProcess (or raised CalledProcessError) has the child's
+    resource usage, including the processes it waited for, as .rusage.
+    """
+    if job is not None:
+        job.raise_if_cancelled()
+    # The output goes to temporary files rather than pipes, so the child can be
+    # reaped with os.wait4 (for its resource usage) without reading pipes meanwhile
+    with tempfile.TemporaryFile("w+") as stdout_file, tempfile.TemporaryFile("w+") as stderr_file:
+        # Own process group, so cancelling also takes down anything the tool spawned
+        with subprocess.Popen(cmd, stdout=stdout_file, stderr=stderr_file, text=True, env=env,
+                              start_new_session=True) as proc:
+            rusage, killed = _reap(proc, job, poll_interval)
+        if killed:
+            raise JobCancelled(f"Job {job.id} was cancelled")
+        stdout_file.seek(0)
+        stderr_file.seek(0)
+        stdout, stderr = stdout_file.read(), stderr_file.read()
+    if proc.returncode:
+        error = subprocess.CalledProcessError(proc.returncode, cmd, output=stdout, stderr=stderr)
+        error.rusage = rusage
+        raise error
+    completed = subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+    completed.rusage = rusage
+    return completed
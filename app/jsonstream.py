@@ -0,0 +1,149 @@
+# evtx-analyzer/app/jsonstream.py
+"""Incremental reading of large JSON array reports.
+
+Chainsaw writes its detections as one JSON array. These helpers walk such a
+file item by item, so converting or splitting it needs memory for one item at
+a time instead of the whole report.
+"""
+import json
+from pathlib import Path
+
+from lineindex import GzipLineWriter
+
+READ_SIZE = 1024 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = "0123456789+-.eE"
+
+
+class _Reader:
+    """A text buffer over a file that is refilled as items are consumed."""
+
+    def __init__(self, f, read_size: int):
+        self.f = f
+        self.read_size = read_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size: int = None) -> bool:
+        """Appends more data; returns False at end of file."""
+        if self.eof:
+            return False
+        data = self.f.read(size or self.read_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def skip_whitespace(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or not self.fill():
+                return
+
+    def peek(self) -> str:
+        self.skip_whitespace()
+        return self.buf[self.pos] if self.pos < len(self.buf) else ""
+
+    def decode_value(self):
+        # Each retry decodes the value from its start again, so the reads grow
+        # to keep a value spanning many reads from costing quadratic time
+        size = self.read_size
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Most likely the value continues past the buffer; a real syntax
+                # error surfaces once there is nothing left to read
+                if not self.fill(size):
+                    raise
+                size *= 2
+                continue
+            # A number at the end of the buffer may continue in the next read
+            if isinstance(value, (int, float)) and not self.eof \
+                    and not self.buf[end:].strip(_NUMBER_CHARS) and self.fill(size):
+                size *= 2
+                continue
+            self.pos = end
+            return value
+
+
+def is_json_array(f) -> bool:
+    """Whether the text file f holds a JSON array; rewinds f."""
+    reader = _Reader(f, 4096)
+    first = reader.peek()
+    f.seek(0)
+    return first == "["
+
+
+def iter_json_array(f, read_size: int = READ_SIZE):
+    """Yields the items of the JSON array in text file f one at a time.
+
+    Raises json.JSONDecodeError if f does not hold a well-formed array.
+    """
+    reader = _Reader(f, read_size)
+    if reader.peek() != "[":
+        raise json.JSONDecodeError("Expecting '['", reader.buf, reader.pos)
+    reader.pos += 1
+    if reader.peek() == "]":
+        reader.pos += 1
+    else:
+        while True:
+            reader.peek()
+            yield reader.decode_value()
+            separator = reader.peek()
+            reader.pos += 1
+            if separator == "]":
+                break
+            if separator != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", reader.buf, reader.pos - 1)
+    if reader.peek():
+        raise json.JSONDecodeError("Extra data", reader.buf, reader.pos)
+
+
+def json_to_jsonl(src: Path, dest: Path, compress_level: int = None) -> int:
+    """Converts a JSON report to JSONL, one array item per line. Returns the line count.
+
+    Arrays are streamed; any other top-level value is small and written as a
+    single line, objects as they are and everything else as {"data": value}.
+    With compress_level, dest is written gzipped (see lineindex.GzipLineWriter).
+    Raises json.JSONDecodeError for malformed input, leaving dest partial.
+    """
+    lines = 0
+    with open(src, "r", encoding="utf-8") as f_src, \
+            (open(dest, "w", encoding="utf-8") if compress_level is None else open(dest, "wb")) as f_file:
+        f_dest = f_file if compress_level is None else GzipLineWriter(f_file, level=compress_level)
+        if is_json_array(f_src):
+            for item in iter_json_array(f_src):
+                f_dest.write(json.dumps(item) + "\n")
+                lines += 1
+        else:
+            data = json.load(f_src)
+            f_dest.write(json.dumps(data if isinstance(data, dict) else {"data": data}) + "\n")
+            lines = 1
+        if compress_level is not None:
+            f_dest.close()
+    return lines
+
+
+class JsonArrayWriter:
+    """Writes a JSON array to a text file one item at a time."""
+
+    def __init__(self, f):
+        self.f = f
+        self.count = 0
+        f.write("[")
+
+    def write(self, item):
+        if self.count:
+            self.f.write(",")
+        self.f.write(json.dumps(item))
+        self.count += 1
+
+    def close(self):
+        self.f.write("]")
@@ -0,0 +1,395 @@
+# evtx-analyzer/app/lineindex.py
+"""Sparse line-offset indexes for large JSONL files, and paging over them.
+
+An index records the byte offset of every INDEX_STRIDE-th line of a file, so
+any line can be reached with one seek plus at most INDEX_STRIDE - 1 short
+reads, however large the file. Indexes live next to the file they describe
+(Security_dump.jsonl -> Security_dump.jsonl.idx) and are invalidated by any
+change to the file's size or modification time.
+
+The EVTX parser builds the index of its output while writing it
+(IndexingWriter); files written by other tools are indexed in one pass
+afterwards (ensure_line_index).
+
+Reports may also be stored gzip-compressed (Security_dump.jsonl.gz). Those
+written by GzipLineWriter keep the same random access: their index holds
+restart points in the compressed stream instead of plain byte offsets.
+"""
+import gzip
+import json
+import logging
+import os
+import re
+import struct
+import zlib
+from array import array
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = ".idx"
+INDEX_STRIDE = 1000
+SCAN_BUFFER = 1024 * 1024
+# Compressed bytes inflated at a time; a page of records rarely needs more
+INFLATE_BUFFER = 64 * 1024
+GZIP_SUFFIX = ".gz"
+GZIP_LEVEL = 6
+
+_MAGIC = b"CHYLIDX2"
+# magic, stride, flags, line count, size and mtime_ns of the indexed file
+_HEADER = struct.Struct("<8sIIQQq")
+# The offsets are restart points in the deflate stream of a gzip file
+_RESTART_POINTS = 1
+# Stride of the index of a gzip file without restart points, which can only be read from the start
+_SEQUENTIAL = 0xFFFFFFFF
+# No file name, no modification time (the output only depends on the input), unknown OS
+_GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+_EVENT_ID = re.compile(rb'"EventID"\s*:\s*"?(\d+)')
+
+
+def index_path(path: Path) -> Path:
+    return Path(f"{path}{INDEX_SUFFIX}")
+
+
+def is_gzip(path) -> bool:
+    return str(path).endswith(GZIP_SUFFIX)
+
+
+def find_artifact(path: Path) -> Path:
+    """path, or its gzipped version if only that exists."""
+    compressed = Path(f"{path}{GZIP_SUFFIX}")
+    if not path.exists() and compressed.exists():
+        return compressed
+    return path
+
+
+def open_artifact(path: Path, mode: str = "rb", encoding: str = None):
+    """Opens a report for reading, decompressing it on the fly if it is gzipped."""
+    if is_gzip(path):
+        return gzip.open(path, mode if "b" in mode else mode.replace("t", "") + "t", encoding=encoding)
+    return open(path, mode, encoding=encoding)
+
+
+def _write_index(path: Path, stride: int, flags: int, lines: int, offsets: array):
+    """Writes the index of the (closed) file at path."""
+    stat = os.stat(path)
+    # Entries past the last line (e.g. for the end of the file) are no line starts
+    offsets = offsets[:max(1, -(-lines // stride))]
+    tmp = Path(f"{index_path(path)}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, stride, flags, lines, stat.st_size, stat.st_mtime_ns))
+        offsets.tofile(f)
+    os.replace(tmp, index_path(path))
+
+
+class LineIndexBuilder:
+    """Accumulates line offsets from the bytes of a file, in order."""
+
+    def __init__(self, stride: int = INDEX_STRIDE):
+        self.stride = stride
+        self.offsets = array("Q", [0])
+        self.lines = 0
+        self.size = 0
+        self._ends_with_newline = True
+
+    def feed(self, data: bytes):
+        if not data:
+            return
+        count = data.count(b"\n")
+        # Lines with an index entry start right after these newlines
+        first = self.stride - self.lines % self.stride
+        if count >= first:
+            position = -1
+            seen = 0
+            for wanted in range(first, count + 1, self.stride):
+                while seen < wanted:
+                    position = data.index(b"\n", position + 1)
+                    seen += 1
+                self.offsets.append(self.size + position + 1)
+        self.lines += count
+        self.size += len(data)
+        self._ends_with_newline = data.endswith(b"\n")
+
+    def save(self, path: Path):
+        """Writes the index for the (closed) file at path."""
+        _write_index(path, self.stride, 0, self.lines + (0 if self._ends_with_newline else 1), self.offsets)
+
+
+class IndexingWriter:
+    """Text file wrapper that feeds everything written through it to a LineIndexBuilder."""
+
+    def __init__(self, f, builder: LineIndexBuilder):
+        self._f = f
+        self._builder = builder
+
+    def write(self, text: str):
+        # JSONL written by this app is ASCII; anything else needs its real byte length
+        self._builder.feed(text.encode("ascii") if text.isascii() else text.encode("utf-8"))
+        return self._f.write(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+
+class GzipLineWriter:
+    """Text writer producing a gzip file that can be read from every stride-th line on.
+
+    The output is one ordinary gzip member, so any gzip reader (and any HTTP
+    client accepting Content-Encoding: gzip) can decompress it as a whole.
+    Before every stride-th line the deflate stream is fully flushed, which
+    resets the compressor: inflating can start at such a point without
+    anything that came before. These restart points make up the line index,
+    written by save() once the writer is closed. The wrapped binary file is
+    left open.
+    """
+
+    def __init__(self, f, stride: int = INDEX_STRIDE, level: int = GZIP_LEVEL):
+        self._f = f
+        self.stride = stride
+        self.lines = 0
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._crc = 0
+        self._size = 0
+        self._ends_with_newline = True
+        f.write(_GZIP_HEADER)
+        self._position = len(_GZIP_HEADER)
+        self.offsets = array("Q", [self._position])
+
+    def _put(self, compressed: bytes):
+        if compressed:
+            self._f.write(compressed)
+            self._position += len(compressed)
+
+    def _compress(self, data: bytes):
+        if data:
+            self._crc = zlib.crc32(data, self._crc)
+            self._size += len(data)
+            self._put(self._compressor.compress(data))
+
+    def write_bytes(self, data: bytes):
+        if not data:
+            return
+        count = data.count(b"\n")
+        # Lines with a restart point start right after these newlines
+        first = self.stride - self.lines % self.stride
+        start = 0
+        if count >= first:
+            position = -1
+            seen = 0
+            for wanted in range(first, count + 1, self.stride):
+                while seen < wanted:
+                    position = data.index(b"\n", position + 1)
+                    seen += 1
+                self._compress(data[start:position + 1])
+                start = position + 1
+                self._put(self._compressor.flush(zlib.Z_FULL_FLUSH))
+                self.offsets.append(self._position)
+        self._compress(data[start:])
+        self.lines += count
+        self._ends_with_newline = data.endswith(b"\n")
+
+    def write(self, text: str):
+        self.write_bytes(text.encode("ascii") if text.isascii() else text.encode("utf-8"))
+        return len(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def close(self):
+        """Ends the gzip stream (compressed data and trailer)."""
+        self._put(self._compressor.flush())
+        self._put(struct.pack("<II", self._crc, self._size & 0xFFFFFFFF))
+
+    def save(self, path: Path):
+        """Writes the index for the (closed) file at path."""
+        lines = self.lines + (0 if self._ends_with_newline else 1)
+        _write_index(path, self.stride, _RESTART_POINTS, lines, self.offsets)
+
+
+def compress_lines(src: Path, dest: Path, level: int = GZIP_LEVEL):
+    """Compresses a line-oriented file (e.g. a JSONL report) with GzipLineWriter and indexes it."""
+    tmp = Path(f"{dest}.tmp")
+    with open(src, "rb") as f_src, open(tmp, "wb") as f_dest:
+        writer = GzipLineWriter(f_dest, level=level)
+        while True:
+            block = f_src.read(SCAN_BUFFER)
+            if not block:
+                break
+            writer.write_bytes(block)
+        writer.close()
+    os.replace(tmp, dest)
+    writer.save(dest)
+
+
+class LineIndex:
+    """A loaded index."""
+
+    def __init__(self, stride: int, lines: int, offsets: array, flags: int = 0):
+        self.stride = stride
+        self.lines = lines
+        self.offsets = offsets
+        self.flags = flags
+
+    def offset_of(self, line: int) -> tuple:
+        """Returns (byte offset, lines to skip after it) to reach line."""
+        entry = min(line // self.stride, len(self.offsets) - 1)
+        return self.offsets[entry], line - entry * self.stride
+
+
+def build_line_index(path: Path, stride: int = INDEX_STRIDE):
+    """Indexes an existing file in one sequential pass.
+
+    A gzip file not written by GzipLineWriter has no restart points, so only
+    its lines are counted and it is always read from the start.
+    """
+    builder = LineIndexBuilder(_SEQUENTIAL if is_gzip(path) else stride)
+    with open_artifact(path) as f:
+        while True:
+            block = f.read(SCAN_BUFFER)
+            if not block:
+                break
+            builder.feed(block)
+    builder.save(path)
+
+
+def load_line_index(path: Path):
+    """The index of path if there is a current one, else None."""
+    try:
+        stat = os.stat(path)
+        with open(index_path(path), "rb") as f:
+            magic, stride, flags, lines, size, mtime_ns = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC or size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+                return None
+            offsets = array("Q")
+            offsets.frombytes(f.read())
+    except (OSError, struct.error, ValueError):
+        return None
+    return LineIndex(stride, lines, offsets, flags)
+
+
+def ensure_line_index(path: Path) -> LineIndex:
+    """Loads the index of path, (re)building it first if it is missing or stale."""
+    index = load_line_index(path)
+    if index is None:
+        logger.info(f"Building line index for {path}")
+        build_line_index(path)
+        index = load_line_index(path)
+    return index
+
+
+# --- Paging and filtering ---
+def _lookup(record, field: str):
+    """Value of a dotted field; a plain name is also looked up one level down (e.g. in Details)."""
+    value = record
+    for part in field.split("."):
+        if not isinstance(value, dict) or part not in value:
+            value = None
+            break
+        value = value[part]
+    if value is None and "." not in field and isinstance(record, dict):
+        for nested in record.values():
+            if isinstance(nested, dict) and field in nested:
+                return nested[field]
+    return value
+
+
+class RecordFilter:
+    """Cheap per-line filters: EventIDs and field=value equality.
+
+    Raw lines are pre-checked on their bytes (an EventID regex, the value as a
+    substring) so that only candidate lines are decoded. EventIDs are matched
+    on an "EventID" key, as in Hayabusa's timeline; records without one (such
+    as the lines of the parsed dump) never match them.
+    """
+
+    def __init__(self, event_ids=None, fields=None):
+        self.event_ids = {str(event_id).encode() for event_id in event_ids or ()}
+        self.fields = list(fields or ())
+        # Values that appear verbatim in JSON can be looked for before decoding
+        self._needles = [
+            value.encode() for _, value in self.fields
+            if value and value.isascii() and '"' not in value and "\\" not in value and "/" not in value
+        ]
+
+    def __bool__(self):
+        return bool(self.event_ids or self.fields)
+
+    def match(self, line: bytes):
+        """Returns the decoded record if line passes every filter, else None."""
+        if self.event_ids:
+            found = _EVENT_ID.search(line)
+            if found is None or found.group(1) not in self.event_ids:
+                return None
+        for needle in self._needles:
+            if needle not in line:
+                return None
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        for field, value in self.fields:
+            actual = _lookup(record, field)
+            if actual is None or str(actual) != value:
+                return None
+        return record
+
+
+def _inflate_lines(f, offset: int):
+    """Lines of a gzip file from the restart point at offset on."""
+    f.seek(offset)
+    inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+    pending = b""
+    while not inflater.eof:
+        block = f.read(INFLATE_BUFFER)
+        if not block:
+            break
+        lines = (pending + inflater.decompress(block)).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+    if pending:
+        yield pending
+
+
+def _lines_from(f, path: Path, index: LineIndex, offset: int):
+    if index.flags & _RESTART_POINTS:
+        return _inflate_lines(f, offset)
+    if is_gzip(path):
+        return gzip.GzipFile(fileobj=f)
+    f.seek(offset)
+    return f
+
+
+def read_records(path: Path, index: LineIndex, start: int, limit: int, record_filter: RecordFilter = None,
+                 max_scan: int = None) -> tuple:
+    """Returns ([(line number, record)], next line number or None) from line start on.
+
+    Without a filter this reads exactly limit lines. With one, lines are
+    scanned until limit matches are found, the file ends, or max_scan lines
+    have been looked at; next is where to continue from.
+    """
+    offset, skip = index.offset_of(start)
+    records = []
+    line_number = start - skip
+    scanned = 0
+    with open(path, "rb") as f:
+        for line in _lines_from(f, path, index, offset):
+            if line_number < start:
+                line_number += 1
+                continue
+            if len(records) >= limit or (max_scan is not None and scanned >= max_scan):
+                return records, line_number
+            scanned += 1
+            if record_filter:
+                record = record_filter.match(line)
+                if record is not None:
+                    records.append((line_number, record))
+            elif line.strip():
+                try:
+                    records.append((line_number, json.loads(line)))
+                except ValueError:
+                    records.append((line_number, {"_raw": line.decode("utf-8", "replace").rstrip("\n")}))
+            line_number += 1
+    return records, None
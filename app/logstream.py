@@ -0,0 +1,165 @@
+# evtx-analyzer/app/logstream.py
+"""Fan-out of log lines to any number of Server-Sent Events clients.
+
+Every line is published to the global channel and, when it was logged while
+working on a job, to that job's channel as well. Each subscriber has its own
+bounded buffer, so every client sees every line of its channel. A client that
+cannot keep up loses its oldest unread lines (and is told how many) instead of
+slowing down the analysis or growing memory without limit.
+
+Each channel keeps a ring buffer of its latest lines, which a new subscriber
+gets first. Lines carry increasing ids, sent as SSE event ids, so a client
+that reconnects with Last-Event-ID resumes where it left off. Dropped lines are
+reported as a "dropped" event whose data is the number of lines lost.
+"""
+import asyncio
+import threading
+from collections import OrderedDict, deque
+
+GLOBAL_CHANNEL = ""
+
+
+class Subscriber:
+    """The receiving end of one client's subscription."""
+
+    def __init__(self, broadcaster, channel: str, loop, buffer_size: int):
+        self.channel = channel
+        self.dropped = 0
+        self._broadcaster = broadcaster
+        self._loop = loop
+        self._lines = deque(maxlen=buffer_size)
+        self._event = asyncio.Event()
+        self._notified = False
+
+    def _push(self, line: tuple) -> bool:
+        """Called under the broadcaster's lock, from any thread.
+
+        Returns False if the subscriber's event loop has closed (e.g. during
+        shutdown), so nothing will ever read the line.
+        """
+        if len(self._lines) == self._lines.maxlen:
+            self.dropped += 1
+        self._lines.append(line)
+        # One wake-up per batch of lines rather than one per line
+        if not self._notified:
+            try:
+                self._loop.call_soon_threadsafe(self._event.set)
+            except RuntimeError:
+                return False
+            self._notified = True
+        return True
+
+    async def next_batch(self, timeout: float):
+        """Waits up to timeout seconds for lines.
+
+        Returns (lines, dropped since the last batch); ([], 0) on timeout.
+        """
+        if not self._lines:
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return [], 0
+        with self._broadcaster.lock:
+            lines = list(self._lines)
+            self._lines.clear()
+            dropped, self.dropped = self.dropped, 0
+            self._event.clear()
+            self._notified = False
+        return lines, dropped
+
+    def close(self):
+        self._broadcaster.unsubscribe(self)
+
+
+class LogBroadcaster:
+    """Thread-safe publisher; subscribers are served on an asyncio event loop."""
+
+    def __init__(self, replay_lines: int = 500, subscriber_buffer: int = 1000, max_channels: int = 256):
+        self.replay_lines = replay_lines
+        self.subscriber_buffer = subscriber_buffer
+        self.max_channels = max_channels
+        self.lock = threading.Lock()
+        self._next_id = 1
+        # Ring buffers of recent lines per channel, least recently written first
+        self._history = OrderedDict({GLOBAL_CHANNEL: deque(maxlen=replay_lines)})
+        self._subscribers = {}
+
+    def publish(self, message: str, channel: str = None):
+        """Sends message to the global channel and, if given, to channel."""
+        with self.lock:
+            line = (self._next_id, message)
+            self._next_id += 1
+            channels = (GLOBAL_CHANNEL,) if not channel else (GLOBAL_CHANNEL, channel)
+            for name in channels:
+                history = self._history.get(name)
+                if history is None:
+                    history = self._history[name] = deque(maxlen=self.replay_lines)
+                    # Forget the channels of jobs nobody has written to for the longest
+                    while len(self._history) > self.max_channels:
+                        oldest = next(name for name in self._history if name != GLOBAL_CHANNEL)
+                        del self._history[oldest]
+                else:
+                    self._history.move_to_end(name)
+                history.append(line)
+                subscribers = self._subscribers.get(name, ())
+                closed = [subscriber for subscriber in subscribers if not subscriber._push(line)]
+                for subscriber in closed:
+                    self._remove(subscriber)
+
+    def subscribe(self, channel: str = None, last_event_id: int = None, replay: bool = True) -> Subscriber:
+        """Registers a subscriber on the running event loop.
+
+        With replay, it first gets the buffered lines of the channel, or only
+        those after last_event_id when resuming.
+        """
+        channel = channel or GLOBAL_CHANNEL
+        subscriber = Subscriber(self, channel, asyncio.get_running_loop(), self.subscriber_buffer)
+        with self.lock:
+            if replay:
+                for line in self._history.get(channel, ()):
+                    if last_event_id is None or line[0] > last_event_id:
+                        subscriber._push(line)
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self.lock:
+            self._remove(subscriber)
+
+    def _remove(self, subscriber: Subscriber):
+        # Caller holds the lock
+        subscribers = self._subscribers.get(subscriber.channel)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.channel]
+
+    def subscriber_count(self) -> int:
+        with self.lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+async def sse_stream(subscriber: Subscriber, heartbeat_seconds: float, greeting: str = None):
+    """Yields Server-Sent Events for subscriber until the client goes away.
+
+    A comment line is sent as a heartbeat whenever the channel has been quiet
+    for heartbeat_seconds, to keep proxies from closing the connection.
+    """
+    try:
+        if greeting:
+            yield f"data: {greeting}\n\n"
+        while True:
+            lines, dropped = await subscriber.next_batch(heartbeat_seconds)
+            if not lines and not dropped:
+                yield ": heartbeat\n\n"
+                continue
+            events = []
+            if dropped:
+                events.append(f"event: dropped\ndata: {dropped}\n\n")
+            for line_id, message in lines:
+                # A multi-line message (e.g. a traceback) needs one data field per line
+                data = "\n".join(f"data: {part}" for part in message.split("\n"))
+                events.append(f"id: {line_id}\n{data}\n\n")
+            yield "".join(events)
+    finally:
+        subscriber.close()
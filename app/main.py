@@ -1,30 +1,117 @@
 # evtx-analyzer/app/main.py
+import functools
+import itertools
 import json
-import xmltodict
+import mimetypes
 import os
 import shutil
 import logging
+import sqlite3
 import subprocess
 import uuid
-import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
 from pathlib import Path
 
-import Evtx.Evtx as evtx
-from fastapi import FastAPI, File, UploadFile, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
+from fastapi import FastAPI, Request, HTTPException, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse, FileResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.exceptions import HTTPException as StarletteHTTPException
 from fastapi.templating import Jinja2Templates
-import asyncio
-import queue
+from fastapi.concurrency import run_in_threadpool
 import threading
 
+from batch import split_chainsaw_report, split_hayabusa_jsonl
+from detections import DetectionStore, parse_timestamp
+from eventfilter import EventFilter, filter_chainsaw_report
+from evtx_jsonl import PARSER_MODES, convert_evtx_to_jsonl, file_in_window
+from jobs import JobManager, JobCancelled, current_job, run_command
+from jsonstream import json_to_jsonl
+from lineindex import (
+    GZIP_SUFFIX, RecordFilter, compress_lines, ensure_line_index, find_artifact, index_path, open_artifact, read_records,
+)
+from logstream import LogBroadcaster, sse_stream
+from metrics import PipelineMetrics, add_child_rusage, add_child_usage, record_io
+from result_cache import ResultCache, clone_file, fingerprint_paths
+from results_index import ResultsIndex
+from rulesync import read_rules_version
+from scheduler import StageScheduler, available_cpus
+from uploads import UploadError, UploadSessions, ZipExtractor, ZipLimits, stream_multipart_upload
+
 # --- Configuration ---
 # Using pathlib for cleaner path management
 BASE_DIR = Path(__file__).resolve().parent
-UPLOAD_DIR = BASE_DIR / "uploads"
-RESULTS_DIR = BASE_DIR / "results"
-JSONL_DIR = BASE_DIR / "jsonl_output"
-LOG_DIR = Path("/logs") # Use absolute path for logs
+UPLOAD_DIR = Path(os.environ.get("UPLOAD_DIR", str(BASE_DIR / "uploads")))
+RESULTS_DIR = Path(os.environ.get("RESULTS_DIR", str(BASE_DIR / "results")))
+JSONL_DIR = Path(os.environ.get("JSONL_DIR", str(BASE_DIR / "jsonl_output")))
+LOG_DIR = Path(os.environ.get("LOG_DIR", "/logs")) # Use absolute path for logs
+
+# Analysis tools
+CHAINSAW_BIN = os.environ.get("CHAINSAW_BIN", "chainsaw")
+HAYABUSA_BIN = os.environ.get("HAYABUSA_BIN", "/opt/hayabusa/hayabusa")
+# "per-file" runs Chainsaw and Hayabusa once for every EVTX file, "batch" once
+# per upload over the whole upload directory (rules are only loaded once)
+ANALYSIS_MODES = ("per-file", "batch")
+ANALYSIS_MODE = os.environ.get("ANALYSIS_MODE", "per-file")
+if ANALYSIS_MODE not in ANALYSIS_MODES:
+    raise ValueError(f"ANALYSIS_MODE must be one of {ANALYSIS_MODES}, got '{ANALYSIS_MODE}'")
+# Batch mode needs a Hayabusa profile that includes the EvtxFile field to split its output per file
+HAYABUSA_BATCH_PROFILE = os.environ.get("HAYABUSA_BATCH_PROFILE", "verbose")
+
+# Number of uploads that may be analysed at the same time
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", "2"))
+# Total number of cores the analysis stages may keep busy, across all jobs
+CPU_BUDGET = int(os.environ.get("CPU_BUDGET", str(available_cpus())))
+# Cores given to each Chainsaw/Hayabusa run; the Python parser always uses one
+TOOL_THREADS = int(os.environ.get("TOOL_THREADS", str(max(1, CPU_BUDGET // 2))))
+# Rayon-based tools size their thread pools from this variable
+TOOL_ENV = {**os.environ, "RAYON_NUM_THREADS": str(TOOL_THREADS)}
+# "native" decodes BinXML directly; "xml" renders every record to XML first
+PARSER_MODE = os.environ.get("PARSER_MODE", "native")
+if PARSER_MODE not in PARSER_MODES:
+    raise ValueError(f"PARSER_MODE must be one of {PARSER_MODES}, got '{PARSER_MODE}'")
+# EVTX files at least this large are parsed by several processes at once
+PARALLEL_PARSE_MIN_MB = int(os.environ.get("PARALLEL_PARSE_MIN_MB", "256"))
+# Processes used to parse one large file (counted against CPU_BUDGET)
+PARSER_PROCESSES = int(os.environ.get("PARSER_PROCESSES", str(max(1, CPU_BUDGET // 2))))
+# Results of previously analysed files, keyed by file hash and rule set version
+RESULT_CACHE_DIR = Path(os.environ.get("RESULT_CACHE_DIR", str(BASE_DIR / "cache")))
+# Size limit of the result cache in GB; 0 disables it
+RESULT_CACHE_MAX_GB = float(os.environ.get("RESULT_CACHE_MAX_GB", "20"))
+# Local state that must survive restarts (rule sync manifests, rule-set version, results index)
+STATE_DIR = Path(os.environ.get("STATE_DIR", "/var/lib/chayabusaw"))
+# Rule-set version recorded by rulesync.py at container start
+RULES_VERSION_FILE = Path(os.environ.get("RULES_VERSION_FILE", str(STATE_DIR / "rules_version.json")))
+# SQLite index of RESULTS_DIR behind the results page; keep it off network volumes
+RESULTS_INDEX_DB = Path(os.environ.get("RESULTS_INDEX_DB", str(STATE_DIR / "results_index.db")))
+# Searchable store of every detection across tickets, behind the /detections API
+DETECTIONS_DB = Path(os.environ.get("DETECTIONS_DB", str(STATE_DIR / "detections.db")))
+# Lines a filtered /records request scans at most before returning what it found
+VIEWER_SCAN_LINES = int(os.environ.get("VIEWER_SCAN_LINES", "1000000"))
+# Tickets per page on the results page and in the /results API
+RESULTS_PAGE_SIZE = int(os.environ.get("RESULTS_PAGE_SIZE", "50"))
+# "gzip" stores the parsed dump, the Hayabusa timeline and the JSONL directory copies as
+# seekable .gz files; "none" keeps them uncompressed
+ARTIFACT_COMPRESSIONS = ("none", "gzip")
+ARTIFACT_COMPRESSION = os.environ.get("ARTIFACT_COMPRESSION", "none")
+if ARTIFACT_COMPRESSION not in ARTIFACT_COMPRESSIONS:
+    raise ValueError(f"ARTIFACT_COMPRESSION must be one of {ARTIFACT_COMPRESSIONS}, got '{ARTIFACT_COMPRESSION}'")
+# zlib level of compressed artifacts, from 1 (fastest) to 9 (smallest)
+ARTIFACT_GZIP_LEVEL = int(os.environ.get("ARTIFACT_GZIP_LEVEL", "6"))
+# Passed to the writers of compressed artifacts; None writes them uncompressed
+ARTIFACT_LEVEL = ARTIFACT_GZIP_LEVEL if ARTIFACT_COMPRESSION == "gzip" else None
+# Largest file a resumable upload (/uploads) may declare, in GB
+UPLOAD_SESSION_MAX_GB = float(os.environ.get("UPLOAD_SESSION_MAX_GB", "128"))
+# Hours after its last received range that an unfinished resumable upload is removed
+UPLOAD_SESSION_TTL_HOURS = float(os.environ.get("UPLOAD_SESSION_TTL_HOURS", "24"))
+# Range size suggested to resumable upload clients (the web form uses it), in MB
+UPLOAD_CHUNK_MB = int(os.environ.get("UPLOAD_CHUNK_MB", "16"))
+# Rules, mappings and binaries that determine the analysis output besides the synced
+# rule set (/chainsaw-rules is a live volume, so it is checked on every upload too);
+# any change invalidates the cache
+RULE_PATHS = os.environ.get(
+    "RULE_PATHS",
+    "/chainsaw-rules:/chainsaw/mappings:/opt/hayabusa/rules:/opt/hayabusa/config:/usr/local/bin/chainsaw:/opt/hayabusa/hayabusa"
+).split(":")
 
 # Create directories if they don't exist
 UPLOAD_DIR.mkdir(exist_ok=True)
@@ -33,17 +120,28 @@ RESULTS_DIR.mkdir(exist_ok=True)
 LOG_DIR.mkdir(exist_ok=True)
 
 # --- Logging Configuration ---
-# Create a queue for log messages to stream to clients
-log_queue = queue.Queue()
+# Log lines replayed to clients that join late, per channel (global and per job)
+LOG_REPLAY_LINES = int(os.environ.get("LOG_REPLAY_LINES", "500"))
+# Unread lines kept for a slow client before its oldest ones are dropped
+LOG_CLIENT_BUFFER = int(os.environ.get("LOG_CLIENT_BUFFER", "1000"))
+# Seconds of silence after which a keep-alive is sent to log stream clients
+LOG_HEARTBEAT_SECONDS = float(os.environ.get("LOG_HEARTBEAT_SECONDS", "15"))
+
+# Fans log messages out to every client of the log stream
+log_broadcaster = LogBroadcaster(replay_lines=LOG_REPLAY_LINES, subscriber_buffer=LOG_CLIENT_BUFFER)
 
-class QueueHandler(logging.Handler):
-    """Custom logging handler that puts log records into a queue for streaming."""
+class BroadcastHandler(logging.Handler):
+    """Custom logging handler that publishes log records for streaming.
+
+    Records logged while working on a job also go to that job's channel.
+    """
     def emit(self, record):
-        log_entry = self.format(record)
         try:
-            log_queue.put_nowait(log_entry)
-        except queue.Full:
-            pass  # Drop log if queue is full
+            log_entry = self.format(record)
+            job = current_job()
+            log_broadcaster.publish(log_entry, channel=job.id if job is not None else None)
+        except Exception:
+            self.handleError(record)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -51,7 +149,7 @@ logging.basicConfig(
     handlers=[
         logging.FileHandler(LOG_DIR / "app.log"),
         logging.StreamHandler(), # Also log to console
-        QueueHandler() # Add our custom handler for streaming
+        BroadcastHandler() # Add our custom handler for streaming
     ]
 )
 logger = logging.getLogger(__name__)
@@ -60,109 +158,245 @@ logger = logging.getLogger(__name__)
 # --- FastAPI App Initialization ---
 app = FastAPI(title="EVTX Analysis Pipeline")
 
+class ArtifactFiles(StaticFiles):
+    """Static files where a report stored gzipped is also served under its plain name.
+
+    Clients that accept gzip get the compressed file as-is (Content-Encoding:
+    gzip); anyone else gets it decompressed on the fly.
+    """
+    async def get_response(self, path: str, scope):
+        try:
+            return await super().get_response(path, scope)
+        except StarletteHTTPException as e:
+            if e.status_code != 404 or path.endswith(GZIP_SUFFIX):
+                raise
+        full_path, stat_result = await run_in_threadpool(self.lookup_path, path + GZIP_SUFFIX)
+        if stat_result is None or not Path(full_path).is_file():
+            raise StarletteHTTPException(status_code=404)
+        media_type = mimetypes.guess_type(path)[0] or "text/plain"
+        accepted = {
+            encoding.split(";")[0].strip()
+            for encoding in Request(scope).headers.get("accept-encoding", "").split(",")
+        }
+        if "gzip" in accepted:
+            return FileResponse(
+                full_path, stat_result=stat_result, media_type=media_type,
+                headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"},
+            )
+        return StreamingResponse(decompressed(Path(full_path)), media_type=media_type, headers={"Vary": "Accept-Encoding"})
+
+def decompressed(path: Path):
+    """Yields the decompressed content of a gzipped report in blocks."""
+    with open_artifact(path) as f:
+        while True:
+            block = f.read(1024 * 1024)
+            if not block:
+                break
+            yield block
+
 # Mount directories to serve static files (the reports)
-app.mount("/static_results", StaticFiles(directory=RESULTS_DIR), name="static_results")
+app.mount("/static_results", ArtifactFiles(directory=RESULTS_DIR), name="static_results")
 
 # Setup Jinja2 templates
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 
+# Background workers that run the analyses so requests never block on them
+job_manager = JobManager(max_workers=ANALYSIS_WORKERS)
+# Shared CPU budget for the stages of every job
+stage_scheduler = StageScheduler(cpu_budget=CPU_BUDGET)
+# Skips the analysis of files that have been analysed before
+result_cache = ResultCache(RESULT_CACHE_DIR, max_bytes=int(RESULT_CACHE_MAX_GB * 1024 ** 3))
+# Zip bomb protection: per-member and total uncompressed size, and compression ratio
+ZIP_LIMITS = ZipLimits(
+    max_member_bytes=int(float(os.environ.get("ZIP_MAX_MEMBER_GB", "32")) * 1024 ** 3),
+    max_total_bytes=int(float(os.environ.get("ZIP_MAX_TOTAL_GB", "128")) * 1024 ** 3),
+    max_ratio=float(os.environ.get("ZIP_MAX_RATIO", "100")),
+)
+# Rule set fingerprint the cache was last checked against
+_rules_version = None
+# Tickets, files and reports on the results page, kept in step with RESULTS_DIR
+results_index = ResultsIndex(RESULTS_INDEX_DB)
+# Detections of every analysed file, for searches across tickets
+detection_store = DetectionStore(DETECTIONS_DB)
+# Measurements of every stage run, behind /metrics and the stages of each job
+pipeline_metrics = PipelineMetrics()
+# Resumable uploads in progress; kept in the upload directory so finished files are moved, not copied
+upload_sessions = UploadSessions(
+    UPLOAD_DIR / "sessions",
+    max_bytes=int(UPLOAD_SESSION_MAX_GB * 1024 ** 3),
+    ttl_seconds=UPLOAD_SESSION_TTL_HOURS * 3600,
+)
+# Set at shutdown to stop the removal of abandoned upload sessions
+_upload_sessions_stop = threading.Event()
+
+@app.on_event("startup")
+def index_existing_results():
+    """Indexes the results volume in the background when an index is new (first start, lost state)."""
+    if not (results_index.created or detection_store.created) or not any(RESULTS_DIR.iterdir()):
+        return
+
+    def rebuild():
+        if results_index.created:
+            logger.info(f"Building the results index from {RESULTS_DIR}...")
+            try:
+                count = results_index.rebuild(RESULTS_DIR)
+                logger.info(f"Indexed {count} result set(s)")
+            except (OSError, sqlite3.Error) as e:
+                logger.error(f"Could not build the results index: {e}")
+        if detection_store.created:
+            logger.info(f"Loading the detections in {RESULTS_DIR}...")
+            try:
+                count = detection_store.rebuild(RESULTS_DIR)
+                logger.info(f"Loaded {count} detection(s)")
+            except (OSError, sqlite3.Error) as e:
+                logger.error(f"Could not load the detections: {e}")
+
+    threading.Thread(target=rebuild, name="results-index-rebuild", daemon=True).start()
+
+@app.on_event("startup")
+def collect_abandoned_uploads():
+    """Removes resumable uploads nobody has continued for UPLOAD_SESSION_TTL_HOURS, checking every few minutes."""
+    interval = min(600, upload_sessions.ttl_seconds / 4)
+
+    def collect():
+        while True:
+            try:
+                upload_sessions.collect_garbage()
+            except OSError as e:
+                logger.error(f"Could not remove abandoned upload sessions: {e}")
+            if _upload_sessions_stop.wait(interval):
+                return
+
+    threading.Thread(target=collect, name="upload-session-gc", daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown_job_manager():
+    _upload_sessions_stop.set()
+    job_manager.shutdown()
+    stage_scheduler.shutdown()
+    results_index.close()
+    detection_store.close()
+
 # --- Helper Functions ---
-def parse_evtx_to_jsonl(evtx_path: Path, jsonl_output_path: Path):
-    """Parses an EVTX file to a JSONL file, one JSON object per line."""
+def parser_processes(evtx_path: Path) -> int:
+    """Number of processes to parse evtx_path with: several for large files, otherwise one."""
+    if evtx_path.stat().st_size >= PARALLEL_PARSE_MIN_MB * 1024 * 1024:
+        return min(max(1, PARSER_PROCESSES), CPU_BUDGET)
+    return 1
+
+def total_size(*paths: Path) -> int:
+    """Combined size of those of paths that exist."""
+    return sum(path.stat().st_size for path in paths if path.exists())
+
+@pipeline_metrics.measure("parse")
+def parse_evtx_to_jsonl(evtx_path: Path, jsonl_output_path: Path, job=None, processes: int = 1,
+                        event_filter: EventFilter = None) -> bool:
+    """Parses an EVTX file to a JSONL file, one JSON object per line. Returns True on success.
+
+    With an event_filter, only the records it matches are written.
+    """
     print(f"Parsing {evtx_path} to {jsonl_output_path}...")
     logger.info(f"Parsing {evtx_path} to {jsonl_output_path}...")
     try:
-        with jsonl_output_path.open("w") as f_out:
-            with evtx.Evtx(str(evtx_path)) as log:
-                for record in log.records():
-                    # Convert the record to a dict for ease of parsing
-                    data_dict = xmltodict.parse(record.xml())
-
-                    # Initialize JSON object for this record
-                    json_subline = {}
-
-                    # Loop through each key,value pair of the System section of the evtx logs and extract the EventRecordID
-                    for event_system_key, event_system_value in data_dict["Event"]["System"].items():
-                        if event_system_key == "EventRecordID":
-                            firstline = {event_system_key: event_system_value}
-                            # Add information to the JSON object for this specific log
-                            json_subline.update(firstline)  # add the event ID to JSON subline
-
-                    # Loop through each key, value pair of the EventData section of the evtx logs
-                    # Check if EventData exists first
-                    if "EventData" not in data_dict["Event"]:
-                        logger.warning(f"No EventData in record {json_subline.get('EventRecordID', 'unknown')}")
-                        # Write the record even if it has no EventData, as it may still be useful
-                        f_out.write(json.dumps(json_subline) + '\n')
-                        continue
-
-                    for event_data_key, event_data_value in data_dict["Event"]["EventData"].items():
-                        for values in event_data_value:
-                            # Initialize variables for each data pair
-                            data_name = None
-                            data_value = None
-
-                            # Loop through each subvalue within the EventData section to extract necessary information
-                            for event_data_subkey, event_data_subvalue in values.items():
-                                if event_data_subkey == "@Name":
-                                    data_name = event_data_subvalue
-                                else:
-                                    data_value = event_data_subvalue
-
-                            # Add information to the JSON object for this specific log
-                            if data_name is not None and data_value is not None:
-                                json_subline.update({data_name: data_value})
-
-                    # Write the JSON object as a single line to the JSONL file
-                    f_out.write(json.dumps(json_subline) + '\n')
-        logger.info(f"Successfully parsed to {jsonl_output_path}")
+        # Stop early if the job this file belongs to was cancelled
+        check_cancelled = job.raise_if_cancelled if job is not None else None
+        stats = convert_evtx_to_jsonl(
+            evtx_path, jsonl_output_path, mode=PARSER_MODE, check_cancelled=check_cancelled, processes=processes,
+            line_index=True, compress_level=ARTIFACT_LEVEL, event_filter=event_filter,
+        )
+        if stats["no_event_data"]:
+            # Written anyway, as they may still be useful
+            logger.warning(f"{stats['no_event_data']} record(s) without EventData in {evtx_path.name}")
+        if stats["fallbacks"]:
+            logger.info(f"{stats['fallbacks']} record(s) in {evtx_path.name} used the XML parser")
+        if stats["skipped"]:
+            logger.warning(f"Skipped {stats['skipped']} unparseable record(s) in {evtx_path.name}")
+        if stats["filtered"]:
+            logger.info(f"Left out {stats['filtered']} record(s) of {evtx_path.name} outside the filter ({event_filter})")
+        record_io(bytes_in=total_size(evtx_path), bytes_out=total_size(jsonl_output_path), records=stats["records"])
+        if processes > 1:
+            add_child_usage(stats["worker_cpu_seconds"], stats["worker_peak_rss"])
+        logger.info(f"Successfully parsed {stats['records']} records to {jsonl_output_path}")
+        return True
+    except JobCancelled:
+        raise
     except Exception as e:
         logger.error(f"Error parsing {evtx_path}: {e}")
-
-def run_analysis(evtx_path: Path, ticket_number: str):
-    """Runs Chainsaw, Hayabusa, and EVTX-to-JSONL parsing on a single file."""
-
-    file_stem = evtx_path.stem  # e.g., "Security" from "Security.evtx"
-    logger.info(f"--- Starting analysis for {evtx_path.name} (Ticket: {ticket_number}) ---")
-
-    # 1. Run Chainsaw
-    chainsaw_output_dir = RESULTS_DIR / ticket_number / file_stem
-    chainsaw_output_dir.mkdir(parents=True, exist_ok=True)
-    chainsaw_output_file = chainsaw_output_dir / f"{file_stem}_chainsaw_report.json"
+        return False
+
+def chainsaw_command(target: Path, output_file: Path, event_filter: EventFilter = None) -> list:
+    """Chainsaw hunt over a file or a directory, with the Sigma and Chainsaw rules.
+
+    An event_filter's time window is passed as --from/--to; its EventIDs and
+    channels are applied to the report afterwards (see scope_chainsaw_report).
+    """
+    # Command: chainsaw hunt /path/to/file.evtx --json -o /path/to/output.json
+    command = [CHAINSAW_BIN, "hunt", str(target), "-s", "/sigma", "--mapping", "/chainsaw/mappings/sigma-event-logs-all.yml", "-r", "/chainsaw-rules", "--json", "-o", str(output_file)]
+    return command + (event_filter.chainsaw_args() if event_filter else [])
+
+def hayabusa_command(target_flag: str, target: Path, jsonl_output: Path, html_output: Path,
+                     event_filter: EventFilter = None) -> list:
+    """Hayabusa JSONL + HTML timeline; target_flag is -f for a file or -d for a directory.
+
+    An event_filter's time window is passed as --timeline-start/--timeline-end,
+    its EventIDs as --include-eid.
+    """
+    # Command: hayabusa json-timeline -f /path/to/file.evtx -L -o /path/to/output.jsonl -H /path/to/html_output_directory -w
+    # -f specifies an evtx file as opposed to a directory (directory would be -d)
+    # -L specifies JSONL output
+    # -o tells it where to save the JSONL output
+    # -H tells it where to save the HTML output
+    # -w tells it to skip the CLI wizard so this stuff actually gets output and doesn't get hung up in the terminal
+    command = [HAYABUSA_BIN, "json-timeline", target_flag, str(target), "-L", "-o", str(jsonl_output), "-H", str(html_output), "-w"]
+    return command + (event_filter.hayabusa_args() if event_filter else [])
+
+def scope_chainsaw_report(report: Path, event_filter: EventFilter = None):
+    """Drops the detections of a Chainsaw report outside the EventIDs and channels of event_filter."""
+    if event_filter is None or not event_filter.checks_content:
+        return
+    dropped = filter_chainsaw_report(report, event_filter)
+    if dropped:
+        logger.info(f"Left out {dropped} Chainsaw detection(s) outside the filter ({event_filter})")
+
+@pipeline_metrics.measure("chainsaw")
+def run_chainsaw(evtx_path: Path, output_dir: Path, job=None, event_filter: EventFilter = None) -> bool:
+    """Runs a Chainsaw hunt on a single EVTX file. Returns True on success."""
+    file_stem = evtx_path.stem
+    chainsaw_output_file = output_dir / f"{file_stem}_chainsaw_report.json"
     logger.info(f"Running Chainsaw on {evtx_path.name}...")
     try:
-        # Command: chainsaw hunt /path/to/file.evtx --json -o /path/to/output.json
-        subprocess.run(
-            ["chainsaw", "hunt", str(evtx_path), "-s", "/sigma", "--mapping", "/chainsaw/mappings/sigma-event-logs-all.yml", "-r", "/chainsaw-rules", "--json", "-o", str(chainsaw_output_file)],
-            check=True, capture_output=True, text=True
-        )
+        result = run_command(chainsaw_command(evtx_path, chainsaw_output_file, event_filter), job=job, env=TOOL_ENV)
+        add_child_rusage(result.rusage)
+        scope_chainsaw_report(chainsaw_output_file, event_filter)
+        record_io(bytes_in=total_size(evtx_path), bytes_out=total_size(chainsaw_output_file))
         logger.info(f"Chainsaw analysis complete. Report at: {chainsaw_output_file}")
+        return True
     except subprocess.CalledProcessError as e:
+        add_child_rusage(e.rusage)
         logger.error(f"Chainsaw failed for {evtx_path.name}: {e.stderr}")
     except FileNotFoundError:
         logger.error("Error: 'chainsaw' command not found. Is it in the system's PATH?")
-
-
-    # 2. Run Hayabusa
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not filter the Chainsaw report for {evtx_path.name}: {e}")
+    return False
+
+@pipeline_metrics.measure("hayabusa")
+def run_hayabusa(evtx_path: Path, output_dir: Path, job=None, event_filter: EventFilter = None) -> bool:
+    """Runs a Hayabusa JSONL + HTML timeline on a single EVTX file. Returns True on success."""
+    file_stem = evtx_path.stem
     # Specify output path for the JSONL report
-    hayabusa_jsonl_output = RESULTS_DIR / ticket_number / file_stem / f"{file_stem}_hayabusa_report.jsonl"
-    # Specify output directory for the HTML report
-    hayabusa_html_output_dir = RESULTS_DIR / ticket_number / file_stem
-    hayabusa_html_output_dir.mkdir(parents=True, exist_ok=True) # Ensure directory exists
-    hayabusa_html_output_file = hayabusa_html_output_dir / "index.html"
+    hayabusa_jsonl_output = output_dir / f"{file_stem}_hayabusa_report.jsonl"
+    # Specify output path for the HTML report
+    hayabusa_html_output_file = output_dir / "index.html"
 
     logger.info(f"Running Hayabusa on {evtx_path.name}...")
     try:
-        # Command: hayabusa json-timeline -f /path/to/file.evtx -L -o /path/to/output.jsonl -H /path/to/html_output_directory -w
-        # -f specifies an evtx file as opposed to a directory (directory would be -d)
-        # -L specifies JSONL output
-        # -o tells it where to save the JSONL output
-        # -H tells it where to save the HTML output
-        # -w tells it to skip the CLI wizard so this stuff actually gets output and doesn't get hung up in the terminal
-        result = subprocess.run(
-            ["/opt/hayabusa/hayabusa", "json-timeline","-f", str(evtx_path), "-L", "-o", str(hayabusa_jsonl_output), "-H", str(hayabusa_html_output_file), "-w"],
-            check=True, capture_output=True, text=True
+        result = run_command(
+            hayabusa_command("-f", evtx_path, hayabusa_jsonl_output, hayabusa_html_output_file, event_filter),
+            job=job, env=TOOL_ENV
         )
+        add_child_rusage(result.rusage)
+        record_io(bytes_in=total_size(evtx_path), bytes_out=total_size(hayabusa_jsonl_output, hayabusa_html_output_file))
         # Log the subprocess output
         if result.stdout:
             logger.info(f"Hayabusa stdout: {result.stdout}")
@@ -170,15 +404,17 @@ def run_analysis(evtx_path: Path, ticket_number: str):
             logger.warning(f"Hayabusa stderr: {result.stderr}")
 
         logger.info(f"Hayabusa JSONL report at: {hayabusa_jsonl_output}")
-        logger.info(f"Hayabusa HTML report directory: {hayabusa_html_output_dir}")
+        logger.info(f"Hayabusa HTML report directory: {output_dir}")
 
         # Check if the expected output files were actually created
         if not hayabusa_jsonl_output.exists():
             logger.error(f"Expected JSONL output file not created: {hayabusa_jsonl_output}")
         if not hayabusa_html_output_file.exists():
             logger.error(f"Expected HTML output file not created: {hayabusa_html_output_file}")
+        return hayabusa_jsonl_output.exists() and hayabusa_html_output_file.exists()
 
     except subprocess.CalledProcessError as e:
+        add_child_rusage(e.rusage)
         logger.error(f"Hayabusa failed for {evtx_path.name}")
         logger.error(f"Return code: {e.returncode}")
         logger.error(f"Command: {e.cmd}")
@@ -188,54 +424,458 @@ def run_analysis(evtx_path: Path, ticket_number: str):
             logger.error(f"Stderr: {e.stderr}")
     except FileNotFoundError:
         logger.error("Error: 'hayabusa' command not found. Is it in the system's PATH?")
+    return False
 
-    # 3. Parse EVTX to JSONL
-    jsonl_output_file = RESULTS_DIR / ticket_number / file_stem / f"{file_stem}_dump.jsonl"
-    parse_evtx_to_jsonl(evtx_path, jsonl_output_file)
+@pipeline_metrics.measure("chainsaw")
+def run_chainsaw_batch(evtx_dir: Path, output_dirs: dict, work_dir: Path, job=None, event_filter: EventFilter = None) -> bool:
+    """Runs one Chainsaw hunt over every EVTX file in evtx_dir.
 
-    # 4. Copy all .json and .jsonl files to the JSONL directory
-    # Convert .json files to .jsonl format for Splunk ingestion
-    dest_dir = JSONL_DIR / ticket_number / file_stem
+    The combined report is split into a report per file in output_dirs
+    ({evtx file: its results directory}). Returns True on success.
+    """
+    report = work_dir / "chainsaw_report.json"
+    logger.info(f"Running Chainsaw on {len(output_dirs)} file(s) in {evtx_dir}...")
+    try:
+        result = run_command(chainsaw_command(evtx_dir, report, event_filter) + ["--extension", "evtx"], job=job, env=TOOL_ENV)
+        add_child_rusage(result.rusage)
+        scope_chainsaw_report(report, event_filter)
+        record_io(bytes_in=total_size(*output_dirs), bytes_out=total_size(report))
+        unattributed = split_chainsaw_report(
+            report, {f: output_dir / f"{f.stem}_chainsaw_report.json" for f, output_dir in output_dirs.items()}
+        )
+        if unattributed:
+            logger.warning(f"{unattributed} Chainsaw detection(s) could not be matched to an uploaded file")
+        logger.info(f"Chainsaw analysis complete for {len(output_dirs)} file(s)")
+        return True
+    except subprocess.CalledProcessError as e:
+        add_child_rusage(e.rusage)
+        logger.error(f"Chainsaw failed for {evtx_dir}: {e.stderr}")
+    except FileNotFoundError:
+        logger.error("Error: 'chainsaw' command not found. Is it in the system's PATH?")
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not filter or split the Chainsaw report for {evtx_dir}: {e}")
+    return False
+
+@pipeline_metrics.measure("hayabusa")
+def run_hayabusa_batch(evtx_dir: Path, output_dirs: dict, work_dir: Path, job=None, event_filter: EventFilter = None) -> bool:
+    """Runs one Hayabusa timeline over every EVTX file in evtx_dir.
+
+    The JSONL timeline is split per file by its EvtxFile field. The HTML
+    summary covers the whole upload, so every file gets a copy of it.
+    Returns True on success.
+    """
+    jsonl_report = work_dir / "hayabusa_report.jsonl"
+    html_report = work_dir / "index.html"
+    logger.info(f"Running Hayabusa on {len(output_dirs)} file(s) in {evtx_dir}...")
+    try:
+        result = run_command(
+            hayabusa_command("-d", evtx_dir, jsonl_report, html_report, event_filter) + ["-p", HAYABUSA_BATCH_PROFILE],
+            job=job, env=TOOL_ENV
+        )
+        add_child_rusage(result.rusage)
+        record_io(bytes_in=total_size(*output_dirs), bytes_out=total_size(jsonl_report, html_report))
+        if result.stderr:
+            logger.warning(f"Hayabusa stderr: {result.stderr}")
+        if not jsonl_report.exists() or not html_report.exists():
+            logger.error(f"Hayabusa did not create its reports for {evtx_dir}")
+            return False
+        unattributed = split_hayabusa_jsonl(
+            jsonl_report, {f: output_dir / f"{f.stem}_hayabusa_report.jsonl" for f, output_dir in output_dirs.items()}
+        )
+        if unattributed:
+            logger.warning(f"{unattributed} Hayabusa detection(s) could not be matched to an uploaded file")
+        for output_dir in output_dirs.values():
+            clone_file(html_report, output_dir / "index.html")
+        logger.info(f"Hayabusa analysis complete for {len(output_dirs)} file(s)")
+        return True
+    except subprocess.CalledProcessError as e:
+        add_child_rusage(e.rusage)
+        logger.error(f"Hayabusa failed for {evtx_dir}")
+        logger.error(f"Return code: {e.returncode}")
+        if e.stderr:
+            logger.error(f"Stderr: {e.stderr}")
+    except FileNotFoundError:
+        logger.error("Error: 'hayabusa' command not found. Is it in the system's PATH?")
+    except OSError as e:
+        logger.error(f"Could not split the Hayabusa report for {evtx_dir}: {e}")
+    return False
+
+def other_format(path: Path) -> Path:
+    """The gzipped name of an uncompressed report, or the plain name of a gzipped one."""
+    name = path.name
+    return path.with_name(name[:-len(GZIP_SUFFIX)] if name.endswith(GZIP_SUFFIX) else name + GZIP_SUFFIX)
+
+@pipeline_metrics.measure("mirror")
+def mirror_to_jsonl_dir(src_dir: Path, dest_dir: Path):
+    """Mirrors all .json and .jsonl reports into the JSONL directory.
+
+    .json files are converted to .jsonl format for Splunk ingestion, streamed so
+    that memory use does not grow with the report. .jsonl files are linked
+    rather than copied when the filesystem allows it. With ARTIFACT_COMPRESSION,
+    the converted files are gzipped too; a copy left by an earlier run in the
+    other format is removed so that nothing is ingested twice.
+    """
     dest_dir.mkdir(parents=True, exist_ok=True)
 
-    src_dir = RESULTS_DIR / ticket_number / file_stem
-
     # Handle .json files - convert to JSONL format
     for src_file in src_dir.glob("*.json"):
-        dest_file = dest_dir / f"{src_file.stem}.jsonl"
+        dest_file = dest_dir / f"{src_file.stem}.jsonl{GZIP_SUFFIX if ARTIFACT_LEVEL is not None else ''}"
         try:
-            with src_file.open('r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            with dest_file.open('w', encoding='utf-8') as f:
-                # If data is a list, write each item as a separate line
-                if isinstance(data, list):
-                    for item in data:
-                        f.write(json.dumps(item) + '\n')
-                # If data is a single object, write it as one line
-                elif isinstance(data, dict):
-                    f.write(json.dumps(data) + '\n')
-                else:
-                    # For other types, wrap in an object and write as one line
-                    f.write(json.dumps({"data": data}) + '\n')
-
-            logger.info(f"Converted JSON to JSONL: {src_file.name} -> {dest_file.name}")
+            # The results may be linked into dest_dir, so never write through an old link
+            dest_file.unlink(missing_ok=True)
+            other_format(dest_file).unlink(missing_ok=True)
+            lines = json_to_jsonl(src_file, dest_file, compress_level=ARTIFACT_LEVEL)
+            record_io(bytes_in=total_size(src_file), bytes_out=total_size(dest_file), records=lines)
+            logger.info(f"Converted JSON to JSONL: {src_file.name} -> {dest_file.name} ({lines} lines)")
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse JSON file {src_file}: {e}")
             # Copy the file as-is if it can't be parsed
-            shutil.copy2(src_file, dest_dir / src_file.name)
+            dest_file.unlink(missing_ok=True)
+            clone_file(src_file, dest_dir / src_file.name)
         except Exception as e:
             logger.error(f"Error converting {src_file} to JSONL: {e}")
             # Copy the file as-is if conversion fails
-            shutil.copy2(src_file, dest_dir / src_file.name)
+            dest_file.unlink(missing_ok=True)
+            clone_file(src_file, dest_dir / src_file.name)
+
+    # Handle .jsonl files - reflink or hard link on the same filesystem, copy otherwise
+    for src_file in [*src_dir.glob("*.jsonl"), *src_dir.glob(f"*.jsonl{GZIP_SUFFIX}")]:
+        other_format(dest_dir / src_file.name).unlink(missing_ok=True)
+        method = clone_file(src_file, dest_dir / src_file.name)
+        record_io(bytes_in=total_size(src_file), bytes_out=total_size(src_file))
+        logger.info(f"Mirrored JSONL file: {src_file.name} ({method})")
+
+def synced_rules_version():
+    """Version hash of the rule set synced at container start, or None outside the container."""
+    info = read_rules_version(RULES_VERSION_FILE)
+    return info.get("version") if info else None
+
+def current_rules_version() -> str:
+    """Fingerprint of the rule sets; cache entries made with other rules are dropped."""
+    global _rules_version
+    # Batch mode uses another Hayabusa profile, so its results are kept apart
+    version = fingerprint_paths(RULE_PATHS, salt=f"{ANALYSIS_MODE}:{synced_rules_version()}")
+    if version != _rules_version:
+        if _rules_version is not None:
+            logger.info(f"Rule sets changed ({_rules_version} -> {version}), invalidating cached results")
+        result_cache.invalidate(rules_version=version)
+        _rules_version = version
+    return version
+
+# (ticket, stem) of every results directory an analysis is writing to
+_active_stems = set()
+_active_stems_lock = threading.Lock()
+
+def claim_result_stem(evtx_path: Path, ticket_number: str) -> Path:
+    """Reserves a results directory for evtx_path that no other analysis in flight writes to.
+
+    Results go to RESULTS_DIR/<ticket>/<stem>, so files with the same stem
+    (host1/Security.evtx and host2/Security.evtx in one archive, or two
+    uploads for a ticket analysed at the same time) would share one. The first
+    keeps its stem; a later one is renamed, adding the folder it was in inside
+    the archive or else a number, so that every stage sees the new stem.
+    Returns the path to analyse; release it with release_result_stem.
+    """
+    try:
+        folders = evtx_path.relative_to(UPLOAD_DIR).parts[1:-1]
+    except ValueError:
+        folders = ()
+    candidates = itertools.chain(
+        ["_".join((evtx_path.stem, *folders))] if folders else [],
+        (f"{evtx_path.stem}_{n}" for n in itertools.count(2)),
+    )
+    with _active_stems_lock:
+        stem = evtx_path.stem
+        if (ticket_number, stem) in _active_stems:
+            stem = next(
+                stem for stem in candidates
+                if (ticket_number, stem) not in _active_stems and not evtx_path.with_stem(stem).exists()
+            )
+        _active_stems.add((ticket_number, stem))
+    if stem == evtx_path.stem:
+        return evtx_path
+    logger.warning(f"Results for {evtx_path.stem} are already being written for ticket {ticket_number}; "
+                   f"analysing {evtx_path.name} as {stem}")
+    try:
+        return evtx_path.rename(evtx_path.with_stem(stem))
+    except OSError:
+        release_result_stem(evtx_path.with_stem(stem), ticket_number)
+        raise
+
+def release_result_stem(evtx_path: Path, ticket_number: str):
+    with _active_stems_lock:
+        _active_stems.discard((ticket_number, evtx_path.stem))
+
+def start_analysis(evtx_path: Path, ticket_number: str, job=None, with_tools: bool = True,
+                   event_filter: EventFilter = None) -> list:
+    """Schedules Chainsaw, Hayabusa and the JSONL dump for a single file.
+
+    The three stages are independent, so they are handed to the stage scheduler
+    together and may run at the same time. Returns their futures. Without
+    with_tools only the JSONL dump is scheduled (batch mode runs the tools).
+    Every stage is limited to the records event_filter matches.
+    """
+    file_stem = evtx_path.stem  # e.g., "Security" from "Security.evtx"
+    logger.info(f"--- Starting analysis for {evtx_path.name} (Ticket: {ticket_number}) ---")
 
-    # Handle .jsonl files - copy as-is
-    for src_file in src_dir.glob("*.jsonl"):
-        shutil.copy2(src_file, dest_dir / src_file.name)
-        logger.info(f"Copied JSONL file: {src_file.name}")
+    output_dir = RESULTS_DIR / ticket_number / file_stem
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # Reports may be linked to the result cache, so replace rather than overwrite them
+    for old_report in output_dir.iterdir():
+        if old_report.is_file():
+            old_report.unlink()
+    jsonl_output_file = output_dir / f"{file_stem}_dump.jsonl{GZIP_SUFFIX if ARTIFACT_LEVEL is not None else ''}"
+    processes = parser_processes(evtx_path)
+
+    # The parser is the slowest stage, so it goes first in the queue
+    futures = [
+        stage_scheduler.submit(
+            parse_evtx_to_jsonl, evtx_path, jsonl_output_file, job, processes, event_filter, weight=processes, job=job
+        ),
+    ]
+    if with_tools:
+        futures += [
+            stage_scheduler.submit(run_chainsaw, evtx_path, output_dir, job, event_filter, weight=TOOL_THREADS, job=job),
+            stage_scheduler.submit(run_hayabusa, evtx_path, output_dir, job, event_filter, weight=TOOL_THREADS, job=job),
+        ]
+    return futures
+
+def restore_cached_analysis(evtx_path: Path, ticket_number: str, cache_key: str) -> bool:
+    """Fills in the results of a file from the result cache. Returns False on a miss."""
+    if cache_key is None:
+        return False
+    try:
+        return result_cache.restore(cache_key, evtx_path.stem, RESULTS_DIR / ticket_number / evtx_path.stem)
+    except OSError as e:
+        logger.error(f"Could not restore cached results for {evtx_path.name}: {e}")
+        return False
+
+def stray_results(output_dir: Path, file_stem: str) -> list:
+    """Names of the files in output_dir that were not written for file_stem."""
+    return sorted(
+        path.name for path in output_dir.iterdir()
+        if path.is_file() and path.name != "index.html" and not path.name.startswith(f"{file_stem}_")
+    )
 
+def finish_analysis(evtx_path: Path, ticket_number: str, cache_key: str = None, complete: bool = True):
+    """Mirrors the reports of a file whose stages have all finished.
+
+    With a cache_key, the reports are also added to the result cache, but only
+    if every stage succeeded (complete), the results directory is still
+    reserved for this file (see claim_result_stem) and it holds nothing
+    written for another file: the cache serves them again for every upload
+    of the same file.
+    """
+    file_stem = evtx_path.stem
+    output_dir = RESULTS_DIR / ticket_number / file_stem
+    # The parser indexes (and compresses) its output as it writes it; reports written by the tools get
+    # theirs now
+    for jsonl_report in output_dir.glob("*.jsonl"):
+        try:
+            if ARTIFACT_LEVEL is not None:
+                compress_lines(jsonl_report, other_format(jsonl_report), ARTIFACT_LEVEL)
+                jsonl_report.unlink()
+                index_path(jsonl_report).unlink(missing_ok=True)
+                logger.info(f"Compressed {jsonl_report.name} to {other_format(jsonl_report).name}")
+            else:
+                ensure_line_index(jsonl_report)
+        except OSError as e:
+            logger.error(f"Could not compress or index the lines of {jsonl_report.name}: {e}")
+    for jsonl_report in output_dir.glob(f"*.jsonl{GZIP_SUFFIX}"):
+        try:
+            ensure_line_index(jsonl_report)
+        except OSError as e:
+            logger.error(f"Could not index the lines of {jsonl_report.name}: {e}")
+    if cache_key is not None:
+        with _active_stems_lock:
+            claimed = (ticket_number, file_stem) in _active_stems
+        try:
+            stray = stray_results(output_dir, file_stem)
+            if not complete:
+                logger.warning(f"Not caching the results for {evtx_path.name}: not every stage succeeded")
+            elif not claimed or stray:
+                logger.error(f"Not caching the results for {evtx_path.name}: its results directory is shared"
+                             f"{' with ' + ', '.join(stray) if stray else ''}")
+            else:
+                result_cache.store(cache_key, file_stem, output_dir)
+        except OSError as e:
+            logger.error(f"Could not cache the results for {evtx_path.name}: {e}")
+    mirror_to_jsonl_dir(output_dir, JSONL_DIR / ticket_number / file_stem)
+    try:
+        results_index.update_stem(ticket_number, file_stem, output_dir)
+    except (OSError, sqlite3.Error) as e:
+        logger.error(f"Could not index the results for {evtx_path.name}: {e}")
+    try:
+        count = detection_store.ingest(
+            ticket_number,
+            file_stem,
+            find_artifact(output_dir / f"{file_stem}_chainsaw_report.json"),
+            find_artifact(output_dir / f"{file_stem}_hayabusa_report.jsonl"),
+        )
+        logger.info(f"Loaded {count} detection(s) for {evtx_path.name} into the detection store")
+    except sqlite3.Error as e:
+        logger.error(f"Could not load the detections for {evtx_path.name}: {e}")
     logger.info(f"--- Finished analysis for {evtx_path.name} (Ticket: {ticket_number}) ---")
 
+def forget_results(ticket_number: str, file_stem: str = None):
+    """Removes a file's results (or without file_stem, a ticket's) from the results index and the detection store."""
+    if file_stem is None:
+        results_index.remove_ticket(ticket_number)
+        detection_store.remove_ticket(ticket_number)
+    else:
+        results_index.remove_stem(ticket_number, file_stem)
+        detection_store.remove_stem(ticket_number, file_stem)
+
+def _stage_result(future) -> bool:
+    """Re-raises cancellation from a stage; anything else is logged and swallowed.
+
+    Returns whether the stage succeeded.
+    """
+    try:
+        return bool(future.result())
+    except JobCancelled:
+        raise
+    except Exception as e:
+        logger.error(f"Analysis stage failed: {e}")
+        return False
+
+def run_analysis(evtx_path: Path, ticket_number: str, job=None, event_filter: EventFilter = None):
+    """Runs Chainsaw, Hayabusa, and EVTX-to-JSONL parsing on a single file.
+
+    When called from a job, the external tools are killed and JobCancelled is
+    raised as soon as the job is cancelled.
+    """
+    evtx_path = claim_result_stem(evtx_path, ticket_number)
+    try:
+        for future in start_analysis(evtx_path, ticket_number, job, event_filter=event_filter):
+            _stage_result(future)
+        finish_analysis(evtx_path, ticket_number)
+    finally:
+        release_result_stem(evtx_path, ticket_number)
+
+def outside_window(evtx_path: Path, event_filter: EventFilter) -> bool:
+    """Whether no record of evtx_path was written in the time window of event_filter.
+
+    Files that cannot be read are not outside; the analysis reports their errors.
+    """
+    if event_filter is None or not event_filter.has_window:
+        return False
+    try:
+        return not file_in_window(evtx_path, event_filter)
+    except Exception as e:
+        logger.warning(f"Could not read the record times of {evtx_path.name}: {e}")
+        return False
+
+def analyze_files(evtx_files, ticket_number: str, job, batch_dir: Path = None, event_filter: EventFilter = None):
+    """Analyses (path, SHA-256) pairs as they arrive from evtx_files.
+
+    The stages of each file are scheduled as soon as the iterable yields it, so
+    analysis of early files overlaps with producing (e.g. extracting) later
+    ones. Each file is mirrored, and its input removed, as soon as its own
+    stages finish. Files with a known hash are looked up in the result cache
+    first, and successful analyses are added to it.
+
+    With a batch_dir (the directory holding all of evtx_files), Chainsaw and
+    Hayabusa run once over that directory after the last file has arrived,
+    instead of once per file.
+
+    With an event_filter, files without a record in its time window are
+    skipped before any stage opens them, and the stages of the others only
+    analyse the records it matches.
+
+    Every file gets a results directory of its own (see claim_result_stem).
+    """
+    rules_version = current_rules_version() if result_cache.enabled else None
+    claimed = set()
+    cache_keys = {}
+    stages_left = {}
+    stages_ok = {}
+    files_of = {}
+    pending = set()
+    batch_files = []
+    # Batch Chainsaw and Hayabusa each count as one more stage of every file
+    batch_stages = 2 if batch_dir is not None else 0
+
+    def collect(done):
+        for future in done:
+            ok = _stage_result(future)
+            for evtx_file in files_of[future]:
+                stages_ok[evtx_file] = ok and stages_ok[evtx_file]
+                stages_left[evtx_file] -= 1
+                if stages_left[evtx_file] == 0:
+                    # Only complete analyses are worth serving again
+                    finish_analysis(evtx_file, ticket_number, cache_keys[evtx_file], complete=stages_ok[evtx_file])
+                    claimed.discard(evtx_file)
+                    release_result_stem(evtx_file, ticket_number)
+                    # The upload copy is no longer needed; free the space for the next files
+                    evtx_file.unlink(missing_ok=True)
+                    job.file_done()
+
+    work_dir = None
+    try:
+        for evtx_file, file_hash in evtx_files:
+            if outside_window(evtx_file, event_filter):
+                logger.info(f"Skipping {evtx_file.name}: none of its records are in the time window ({event_filter})")
+                # Also keeps it out of the batch run over the directory
+                evtx_file.unlink(missing_ok=True)
+                job.file_done(skipped=True)
+                continue
+            if file_hash and event_filter:
+                # Filtered results are only served again for the same filter
+                file_hash = f"{file_hash}-{event_filter.key()}"
+            cache_key = ResultCache.key(file_hash, rules_version) if file_hash and rules_version else None
+            evtx_file = claim_result_stem(evtx_file, ticket_number)
+            claimed.add(evtx_file)
+            if restore_cached_analysis(evtx_file, ticket_number, cache_key):
+                finish_analysis(evtx_file, ticket_number)
+                claimed.discard(evtx_file)
+                release_result_stem(evtx_file, ticket_number)
+                # Also keeps it out of the batch run over the directory
+                evtx_file.unlink(missing_ok=True)
+                job.file_done(cached=True)
+                continue
+            cache_keys[evtx_file] = cache_key
+            futures = start_analysis(evtx_file, ticket_number, job, with_tools=batch_dir is None, event_filter=event_filter)
+            stages_left[evtx_file] = len(futures) + batch_stages
+            stages_ok[evtx_file] = True
+            for future in futures:
+                files_of[future] = [evtx_file]
+            pending.update(futures)
+            batch_files.append(evtx_file)
+            # Wrap up whatever finished while this file was being produced
+            done = {future for future in pending if future.done()}
+            pending -= done
+            collect(done)
+
+        if batch_stages and batch_files:
+            work_dir = UPLOAD_DIR / f"{batch_dir.name}.batch"
+            work_dir.mkdir(exist_ok=True)
+            output_dirs = {evtx_file: RESULTS_DIR / ticket_number / evtx_file.stem for evtx_file in batch_files}
+            for tool in (run_chainsaw_batch, run_hayabusa_batch):
+                future = stage_scheduler.submit(
+                    tool, batch_dir, output_dirs, work_dir, job, event_filter, weight=TOOL_THREADS, job=job
+                )
+                files_of[future] = batch_files
+                pending.add(future)
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+    except BaseException:
+        # Cancelled or failed: make sure stages that have not started yet never
+        # do, and let running ones stop before the caller removes their input files
+        job.cancel()
+        for future in files_of:
+            future.cancel()
+        wait(files_of)
+        raise
+    finally:
+        if work_dir is not None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        # Anything not wrapped up (after a failure or cancellation) no longer writes its results
+        for evtx_file in claimed:
+            release_result_stem(evtx_file, ticket_number)
+
 # --- API Endpoints ---
 @app.get("/", response_class=HTMLResponse)
 async def get_upload_form(request: Request):
@@ -243,27 +883,29 @@ async def get_upload_form(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 @app.get("/logs/stream")
-async def stream_logs():
-    """Stream log messages in real-time using Server-Sent Events."""
+async def stream_logs(request: Request, job_id: str = None):
+    """Stream log messages in real-time using Server-Sent Events.
+
+    With job_id, only that job's messages are sent. Recent messages are
+    replayed first; a reconnecting client (Last-Event-ID) only gets what it
+    missed.
+    """
+    if job_id is not None and job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    try:
+        last_event_id = int(request.headers.get("last-event-id", ""))
+    except ValueError:
+        last_event_id = None
+
     # Log that someone connected to the stream
     logger.info("Client connected to log stream")
-
-    async def log_generator():
-        # Send initial connection message
-        yield f"data: Connected to log stream...\n\n"
-
-        while True:
-            try:
-                # Try to get a log message from the queue (non-blocking)
-                log_message = log_queue.get_nowait()
-                yield f"data: {log_message}\n\n"
-            except queue.Empty:
-                # If no log message, send a heartbeat to keep connection alive
-                yield f"data: \n\n"
-                await asyncio.sleep(0.1)  # Wait 100ms before checking again
+    subscriber = log_broadcaster.subscribe(job_id, last_event_id=last_event_id)
+    greeting = None if last_event_id is not None else (
+        f"Connected to log stream of job {job_id}..." if job_id else "Connected to log stream..."
+    )
 
     return StreamingResponse(
-        log_generator(),
+        sse_stream(subscriber, LOG_HEARTBEAT_SECONDS, greeting),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -274,94 +916,488 @@ async def stream_logs():
         }
     )
 
+def measured_extraction(extractor: ZipExtractor, job):
+    """Yields the members of extractor as they are extracted, each extraction measured as an extract stage run."""
+    members = extractor.extract(job.raise_if_cancelled)
+    while True:
+        archive_size = extractor.zip_path.stat().st_size
+        with pipeline_metrics.stage("extract", job=job) as stage:
+            extracted = next(members, None)
+            if extracted is None:
+                stage.discard()
+                return
+            stage.target = extracted[0].name
+            # The archive is truncated behind every member, so what it lost was read for this one
+            stage.add_io(bytes_in=archive_size - extractor.zip_path.stat().st_size, bytes_out=total_size(extracted[0]))
+        yield extracted
+
+def process_upload(job, session_dir: Path, upload_path: Path, upload_hash: str = None, event_filter: EventFilter = None):
+    """Job body: extracts the saved upload and analyses every EVTX file in it.
+
+    upload_hash is the SHA-256 of the uploaded file, computed while it was saved.
+    Members of a zip archive are analysed as soon as each one is extracted.
+    With an event_filter, only the records it matches are analysed. The session
+    directory is removed by the job's on_finish callback (remove_session_dir).
+    """
+    # In batch mode the tools run once over everything in the session directory
+    batch_dir = session_dir if ANALYSIS_MODE == "batch" else None
+    job.rules_version = synced_rules_version()
+    if event_filter:
+        job.event_filter = {**event_filter.to_dict(), "not_applied": event_filter.not_applied()}
+        logger.info(f"Analysing only records matching: {event_filter}")
+        if event_filter.channels:
+            logger.warning("Hayabusa cannot filter by channel; its report covers every channel")
+    # Handle .zip archives
+    if upload_path.suffix.lower() == ".zip":
+        logger.info(f"Extracting zip archive: {upload_path}")
+        with ZipExtractor(upload_path, session_dir, ZIP_LIMITS) as extractor:
+            if not extractor.members:
+                # Handle case with no EVTX files (maybe bad zip or wrong file type)
+                logger.warning("No .evtx files found in the upload.")
+            else:
+                logger.info(f"Found {len(extractor.members)} EVTX file(s) to process")
+                job.set_progress(files_total=len(extractor.members))
+                analyze_files(measured_extraction(extractor, job), job.ticket_number, job, batch_dir, event_filter)
+            if extractor.skipped:
+                logger.warning(f"Skipped {len(extractor.skipped)} archive member(s) that were over the size limits or unreadable: {', '.join(extractor.skipped)}")
+                job.set_progress(files_total=len(extractor.members) - len(extractor.skipped))
+        upload_path.unlink() # Delete what is left of the zip file after extraction
+    elif upload_path.suffix.lower() == ".evtx":
+        job.set_progress(files_total=1)
+        analyze_files([(upload_path, upload_hash)], job.ticket_number, job, batch_dir, event_filter)
+    else:
+        logger.warning("No .evtx files found in the upload.")
+
+    logger.info(f"Analysis complete for job {job.id}")
+
+def remove_session_dir(session_dir: Path):
+    """Cleans up the temporary upload session directory of a finished job."""
+    logger.info("Cleaning up temporary files")
+    shutil.rmtree(session_dir, ignore_errors=True)
+
+def upload_event_filter(fields: dict):
+    """The EventFilter of an upload's optional form fields, or None if they are all empty.
+
+    "start" and "end" are ISO 8601 times (UTC unless they carry an offset),
+    "event_ids" and "channels" comma-separated lists.
+    """
+    bounds = {}
+    for name in ("start", "end"):
+        value = fields.get(name, "").strip()
+        bounds[name] = parse_timestamp(value) if value else None
+        if value and bounds[name] is None:
+            raise HTTPException(status_code=400, detail=f"{name} must be an ISO 8601 date and time")
+    try:
+        event_ids = [int(value) for value in fields.get("event_ids", "").split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="event_ids must be a comma-separated list of numbers")
+    channels = fields.get("channels", "").split(",")
+    try:
+        event_filter = EventFilter(bounds["start"], bounds["end"], event_ids, channels)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return event_filter or None
+
 @app.post("/evtx")
-async def handle_file_upload(file: UploadFile = File(...), ticket_number: str = Form(...)):
-    """Handles file upload, extraction, and triggers analysis."""
+async def handle_file_upload(request: Request):
+    """Handles file upload and queues the extraction and analysis as a background job.
+
+    Expects multipart/form-data with a "ticket_number" field and a "file" part.
+    The optional "start", "end", "event_ids" and "channels" fields limit the
+    analysis (see upload_event_filter). The file is streamed straight into the
+    upload session directory.
+    """
+    # Create a unique temporary directory for this upload session
+    session_id = str(uuid.uuid4())
+    session_dir:Path = UPLOAD_DIR / session_id
+    session_dir.mkdir()
+
+    save = pipeline_metrics.stage("save", threaded=False)
+    try:
+        with save:
+            upload = await stream_multipart_upload(request, session_dir)
+            save.target = upload.filename
+            save.add_io(bytes_in=upload.size, bytes_out=upload.size)
+    except UploadError as e:
+        shutil.rmtree(session_dir, ignore_errors=True)
+        logger.error(f"Rejected upload: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        shutil.rmtree(session_dir, ignore_errors=True)
+        raise
 
     # Validate ticket number (basic validation)
+    ticket_number = upload.fields.get("ticket_number", "")
     if not ticket_number or not ticket_number.strip():
+        shutil.rmtree(session_dir, ignore_errors=True)
         logger.error("Ticket number is required but was empty")
         return RedirectResponse(url="/?error=ticket_required", status_code=303)
 
     ticket_number = ticket_number.strip()
-    logger.info(f"Processing upload for ticket: {ticket_number}")
+    if upload.path is None:
+        shutil.rmtree(session_dir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail="No filename provided")
 
-    # Create a unique temporary directory for this upload session
-    session_id = str(uuid.uuid4())
-    session_dir:Path = UPLOAD_DIR / session_id
-    session_dir.mkdir()
+    try:
+        event_filter = upload_event_filter(upload.fields)
+    except HTTPException as e:
+        shutil.rmtree(session_dir, ignore_errors=True)
+        logger.error(f"Rejected upload: {e.detail}")
+        raise
+
+    logger.info(f"Saved uploaded file {upload.filename} ({upload.size / 1e6:.1f} MB) for ticket: {ticket_number}")
+
+    # The job owns the session directory from here on and removes it when done, even if it never starts
+    job = job_manager.submit(
+        process_upload, ticket_number, upload.filename, session_dir, upload.path, upload.sha256, event_filter,
+        on_finish=functools.partial(remove_session_dir, session_dir),
+    )
+    job.add_stage(save.result)
 
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="No filename provided")
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job.id, "status_url": f"/jobs/{job.id}"}
+    )
+
+# --- Resumable uploads ---
+# Form fields of POST /evtx that a resumable upload takes in its JSON body
+UPLOAD_FIELDS = ("ticket_number", "start", "end", "event_ids", "channels")
 
-    upload_path = session_dir / file.filename
+def upload_session_status(session) -> dict:
+    return {**session.to_dict(ttl_seconds=upload_sessions.ttl_seconds), "chunk_size": UPLOAD_CHUNK_MB * 1024 * 1024}
 
+async def json_body(request: Request, required: bool = True) -> dict:
+    """The JSON object in a request body; an empty body is {} unless required."""
+    raw = await request.body()
+    if not raw and not required:
+        return {}
     try:
-        # Save the uploaded file
-        logger.info(f"Saving uploaded file: {file.filename}")
-        with upload_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        # Handle .zip archives
-        if upload_path.suffix.lower() == ".zip":
-            logger.info(f"Extracting zip archive: {upload_path}")
-            with zipfile.ZipFile(upload_path, 'r') as zip_ref:
-                zip_ref.extractall(session_dir)
-            upload_path.unlink() # Delete the zip file after extraction
-
-        # Find all .evtx files in the session directory
-        evtx_files = list(session_dir.glob('**/*.evtx'))
-        if not evtx_files:
-            # Handle case with no EVTX files (maybe bad zip or wrong file type)
-            # For simplicity, we just redirect. A real app might show an error.
-            logger.warning("No .evtx files found in the upload.")
-        else:
-            logger.info(f"Found {len(evtx_files)} EVTX file(s) to process")
-            for evtx_file in evtx_files:
-                run_analysis(evtx_file, ticket_number)
+        body = json.loads(raw)
+    except ValueError:
+        body = None
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Expected a JSON object as the request body")
+    return body
+
+@app.post("/uploads")
+async def start_resumable_upload(request: Request):
+    """Starts a resumable upload of a large file, sent in byte ranges with PUT /uploads/{id}.
+
+    Expects a JSON body with "filename", "size" (bytes) and "ticket_number",
+    and optionally the "start", "end", "event_ids" and "channels" fields of
+    POST /evtx (lists may be given as JSON arrays). They are checked now, so
+    that a bad value fails before any data is sent. The space for the file is
+    allocated straight away.
+    """
+    body = await json_body(request)
+    fields = {
+        name: ",".join(str(item) for item in value) if isinstance(value, list) else str(value)
+        for name, value in body.items() if name in UPLOAD_FIELDS and value is not None
+    }
+    fields["ticket_number"] = fields.get("ticket_number", "").strip()
+    if not fields["ticket_number"]:
+        raise HTTPException(status_code=400, detail="ticket_number is required")
+    upload_event_filter(fields)
+    try:
+        size = int(body.get("size"))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="size must be the size of the file in bytes")
+    try:
+        session = await run_in_threadpool(upload_sessions.create, str(body.get("filename") or ""), size, fields)
+    except UploadError as e:
+        logger.error(f"Rejected resumable upload: {e}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return JSONResponse(
+        status_code=201,
+        content={**upload_session_status(session), "upload_url": f"/uploads/{session.id}"},
+    )
 
-    finally:
-        # Clean up the temporary upload session directory
-        logger.info("Cleaning up temporary files")
-        shutil.rmtree(session_dir)
+@app.get("/uploads/{upload_id}")
+async def get_resumable_upload(upload_id: str):
+    """The byte ranges of a resumable upload received so far, and those still missing."""
+    try:
+        return JSONResponse(content=upload_session_status(upload_sessions.get(upload_id)))
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
-    logger.info("Analysis complete - redirecting to results page")
-    # Redirect user to the results page
-    return RedirectResponse(url="/evtx-results", status_code=303)
+@app.put("/uploads/{upload_id}")
+async def upload_range(upload_id: str, request: Request):
+    """Receives one byte range of a resumable upload, given by the Content-Range header.
 
-@app.get("/evtx-results", response_class=HTMLResponse)
-async def show_results(request: Request):
-    results_by_ticket = {}
+    Ranges may be sent in any order and several at once; each is written at
+    its offset in the session file. Returns the upload's status.
+    """
+    try:
+        session = await upload_sessions.receive_range(upload_id, request.headers.get("content-range"), request.stream())
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return JSONResponse(content=upload_session_status(session))
+
+@app.post("/uploads/{upload_id}/finalize")
+async def finalize_resumable_upload(upload_id: str, request: Request):
+    """Completes a resumable upload and queues its analysis like POST /evtx.
+
+    Takes an optional JSON body with the "sha256" of the file, which has to
+    match what was received. Fails with 409 while ranges are missing.
+    """
+    body = await json_body(request, required=False)
+    session_id = str(uuid.uuid4())
+    session_dir: Path = UPLOAD_DIR / session_id
+    session_dir.mkdir()
+
+    save = pipeline_metrics.stage("save", threaded=False)
+    try:
+        session = upload_sessions.get(upload_id)
+        with save:
+            try:
+                upload_path, upload_hash = await upload_sessions.finish(upload_id, session_dir, body.get("sha256"))
+            except UploadError as e:
+                if e.status_code != 422:
+                    # Nothing was received wrong, e.g. ranges are still missing
+                    save.discard()
+                raise
+            save.target = session.filename
+            save.add_io(bytes_in=session.size, bytes_out=session.size)
+    except UploadError as e:
+        shutil.rmtree(session_dir, ignore_errors=True)
+        logger.error(f"Could not finalize upload {upload_id}: {e}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception:
+        shutil.rmtree(session_dir, ignore_errors=True)
+        raise
+
+    ticket_number = session.fields["ticket_number"]
+    logger.info(f"Received resumable upload {session.filename} ({session.size / 1e6:.1f} MB) for ticket: {ticket_number}")
+
+    # The job owns the session directory from here on and removes it when done, even if it never starts
+    job = job_manager.submit(
+        process_upload, ticket_number, session.filename, session_dir, upload_path, upload_hash,
+        upload_event_filter(session.fields), on_finish=functools.partial(remove_session_dir, session_dir),
+    )
+    job.add_stage(save.result)
 
-    # Now we have structure: RESULTS_DIR / {ticket_number} / {file_stem}
-    for ticket_dir in sorted(RESULTS_DIR.iterdir()):
-        if not ticket_dir.is_dir():
-            continue
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job.id, "status_url": f"/jobs/{job.id}", "sha256": upload_hash}
+    )
 
-        ticket_number = ticket_dir.name
-        results_by_ticket[ticket_number] = {}
+@app.delete("/uploads/{upload_id}")
+async def abort_resumable_upload(upload_id: str):
+    """Abandons a resumable upload and frees its space."""
+    if not await run_in_threadpool(upload_sessions.discard, upload_id):
+        raise HTTPException(status_code=404, detail=f"Upload session {upload_id} not found")
+    return JSONResponse(content={"message": f"Removed upload session {upload_id}"})
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics of the analysis stages: runs, durations, bytes, records, CPU time and peak memory."""
+    return PlainTextResponse(pipeline_metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/jobs")
+async def list_jobs():
+    """Lists known analysis jobs, newest first."""
+    return JSONResponse(content={"jobs": [job.to_dict() for job in job_manager.list()]})
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Returns the status and progress of a single analysis job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return JSONResponse(content=job.to_dict())
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancels a queued or running analysis job."""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return JSONResponse(content=job.to_dict())
+
+@app.get("/rules")
+async def get_rules_version():
+    """Version of the rule set the analyses run with, as recorded by the rule sync at startup."""
+    info = read_rules_version(RULES_VERSION_FILE)
+    if info is None:
+        raise HTTPException(status_code=404, detail="No rule-set version has been recorded")
+    return JSONResponse(content=info)
+
+@app.get("/cache")
+async def get_cache_stats():
+    """Size and hit counts of the result cache."""
+    stats = await run_in_threadpool(result_cache.stats)
+    stats["rules_version"] = _rules_version
+    return JSONResponse(content=stats)
+
+@app.delete("/cache")
+async def clear_cache():
+    """Drops every cached result, e.g. after changing rules in place."""
+    removed = await run_in_threadpool(result_cache.invalidate)
+    return JSONResponse(content={"message": f"Removed {removed} cached result(s)"})
+
+def results_page(query: str, page: int, per_page: int, sort: str) -> dict:
+    """One page of the results index, with links to the reports that exist."""
+    page = max(page, 1)
+    per_page = min(max(per_page, 1), 500)
+    total, tickets = results_index.list_tickets(query, offset=(page - 1) * per_page, limit=per_page, sort=sort)
+    for ticket in tickets:
+        for result in ticket["files"]:
+            for artifact in result["artifacts"]:
+                # Gzipped reports are linked under their plain name, see ArtifactFiles
+                name = artifact["name"].removesuffix(GZIP_SUFFIX) if artifact["kind"] else artifact["name"]
+                artifact["url"] = f"/static_results/{ticket['ticket']}/{result['stem']}/{name}"
+    return {
+        "query": query,
+        "sort": sort,
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "pages": max(1, -(-total // per_page)),
+        "tickets": tickets,
+    }
+
+@app.get("/results")
+async def list_results(q: str = "", page: int = 1, per_page: int = RESULTS_PAGE_SIZE, sort: str = "recent"):
+    """Lists analysed tickets and their reports from the results index, newest first.
+
+    q filters on any part of the ticket number or file name; sort=ticket
+    orders by ticket number instead.
+    """
+    return await run_in_threadpool(results_page, q, page, per_page, sort)
+
+def detection_filters(q, ticket, rule, level, computer, channel, event_id, since, until, source=None) -> dict:
+    """Filters for the detection store from query parameters; raises HTTPException on bad values."""
+    filters = {"q": q, "ticket": ticket, "rule": rule, "computer": computer, "channel": channel, "source": source}
+    if level:
+        filters["levels"] = [value.strip().lower() for value in level.split(",") if value.strip()]
+    if event_id:
+        try:
+            filters["event_ids"] = [int(value) for value in event_id.split(",") if value.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="event_id must be a comma-separated list of numbers")
+    for name, value in (("since", since), ("until", until)):
+        if value:
+            filters[name] = parse_timestamp(value)
+            if filters[name] is None:
+                raise HTTPException(status_code=400, detail=f"{name} must be an ISO 8601 timestamp")
+    return filters
+
+@app.get("/detections")
+async def search_detections(
+    q: str = None, ticket: str = None, rule: str = None, level: str = None, computer: str = None,
+    channel: str = None, event_id: str = None, since: str = None, until: str = None, source: str = None,
+    page: int = 1, per_page: int = 50,
+):
+    """Searches the detections of every ticket, newest first.
+
+    rule, computer, channel and ticket match exactly; level and event_id take
+    comma-separated lists; since/until bound the event time (ISO 8601); q is
+    full-text search over rule names, hosts, channels and event details.
+    """
+    filters = detection_filters(q, ticket, rule, level, computer, channel, event_id, since, until, source)
+    page = max(page, 1)
+    per_page = min(max(per_page, 1), 500)
+    try:
+        result = await run_in_threadpool(detection_store.search, filters, (page - 1) * per_page, per_page)
+    except sqlite3.OperationalError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid search: {e}")
+    return {"page": page, "per_page": per_page, **result}
+
+@app.get("/detections/summary")
+async def summarize_detections(
+    by: str = "ticket", q: str = None, ticket: str = None, rule: str = None, level: str = None,
+    computer: str = None, channel: str = None, event_id: str = None, since: str = None, until: str = None,
+    limit: int = 100,
+):
+    """Counts matching detections per ticket, rule, level, computer, channel or event_id.
+
+    E.g. /detections/summary?by=ticket&rule=... lists the tickets that hit a rule.
+    """
+    filters = detection_filters(q, ticket, rule, level, computer, channel, event_id, since, until)
+    try:
+        counts = await run_in_threadpool(detection_store.summary, by, filters, min(max(limit, 1), 1000))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except sqlite3.OperationalError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid search: {e}")
+    return {"by": by, "counts": counts}
+
+@app.get("/results/{ticket_number}/{file_stem}/{file_name}/records")
+async def read_result_records(
+    ticket_number: str, file_stem: str, file_name: str, start: int = 0, limit: int = 100,
+    event_id: str = None, where: list[str] = Query(default=[]),
+):
+    """Returns a page of records from a JSONL report, e.g. the parsed dump or the Hayabusa timeline.
+
+    Gzipped reports are read in place and may be named with or without .gz.
+
+    Pages start at any line (start; negative counts from the end) and are
+    reached with a seek through the file's line index. event_id (comma-separated)
+    and where=field=value (repeatable; dotted paths reach into nested objects)
+    filter the records. Lines of the parsed dump carry no EventID, so event_id
+    is refused for it. Filtered requests scan at most VIEWER_SCAN_LINES lines;
+    "next" is the line to continue from, or null at the end of the file.
+    """
+    path = find_artifact((RESULTS_DIR / ticket_number / file_stem / file_name).resolve())
+    if not path.is_relative_to(RESULTS_DIR.resolve()) or not file_name.removesuffix(GZIP_SUFFIX).endswith(".jsonl"):
+        raise HTTPException(status_code=400, detail="Only JSONL reports can be paged through")
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail=f"'{file_name}' not found in ticket '{ticket_number}'")
+    fields = []
+    for condition in where:
+        field, separator, value = condition.partition("=")
+        if not separator or not field:
+            raise HTTPException(status_code=400, detail=f"Filter '{condition}' is not of the form field=value")
+        fields.append((field, value))
+    try:
+        event_ids = [int(value) for value in event_id.split(",") if value.strip()] if event_id else []
+    except ValueError:
+        raise HTTPException(status_code=400, detail="event_id must be a comma-separated list of numbers")
+    if event_ids and path.name.removesuffix(GZIP_SUFFIX).endswith("_dump.jsonl"):
+        raise HTTPException(
+            status_code=400, detail="The parsed dump has no EventID field; filter it with where=field=value instead"
+        )
+    record_filter = RecordFilter(event_ids, fields)
+    limit = min(max(limit, 1), 1000)
+
+    def read():
+        index = ensure_line_index(path)
+        first = max(0, index.lines + start) if start < 0 else start
+        records, next_line = read_records(
+            path, index, first, limit, record_filter, max_scan=VIEWER_SCAN_LINES if record_filter else None
+        )
+        return {
+            "file": file_name,
+            "total_lines": index.lines,
+            "start": first,
+            "next": next_line,
+            "records": [{"line": line, "record": record} for line, record in records],
+        }
 
-        # Each ticket can have multiple file stems
-        for source_dir in sorted(ticket_dir.iterdir()):
-            if not source_dir.is_dir():
-                continue
+    return await run_in_threadpool(read)
 
-            stem = source_dir.name
-            jsonl      = source_dir / f"{stem}_dump.jsonl"
-            chainsaw   = source_dir / f"{stem}_chainsaw_report.json"
-            hay_jsonl  = source_dir / f"{stem}_hayabusa_report.jsonl"
-            html_index = source_dir / "index.html"
+@app.get("/evtx-results", response_class=HTMLResponse)
+async def show_results(request: Request, q: str = "", page: int = 1, per_page: int = RESULTS_PAGE_SIZE, sort: str = "recent"):
+    listing = await run_in_threadpool(results_page, q, page, per_page, sort)
+    results_by_ticket = {}
 
-            results_by_ticket[ticket_number][stem] = {
-                "jsonl":             f"/static_results/{ticket_number}/{stem}/{jsonl.name}"      if jsonl.exists()      else None,
-                "chainsaw":          f"/static_results/{ticket_number}/{stem}/{chainsaw.name}"   if chainsaw.exists()   else None,
-                "hayabusa_jsonl":    f"/static_results/{ticket_number}/{stem}/{hay_jsonl.name}"  if hay_jsonl.exists()  else None,
-                "hayabusa_html":     f"/static_results/{ticket_number}/{stem}/{html_index.name}" if html_index.exists() else None,
-            }
+    # Reports per ticket and file stem, as the template expects them
+    for ticket in listing["tickets"]:
+        ticket_number = ticket["ticket"]
+        results_by_ticket[ticket_number] = {}
+        for result in ticket["files"]:
+            reports = {"jsonl": None, "chainsaw": None, "hayabusa_jsonl": None, "hayabusa_html": None}
+            details = {}
+            for artifact in result["artifacts"]:
+                if artifact["kind"] in reports:
+                    reports[artifact["kind"]] = artifact["url"]
+                    details[artifact["kind"]] = artifact
+            reports["details"] = details
+            results_by_ticket[ticket_number][result["stem"]] = reports
 
     return templates.TemplateResponse(
         "results.html",
-        {"request": request, "results": results_by_ticket}
+        {"request": request, "results": results_by_ticket, "listing": listing}
     )
 
 @app.delete("/delete-results/{ticket_number}/{file_stem}")
@@ -375,6 +1411,8 @@ async def delete_results(ticket_number: str, file_stem: str):
         # Check if the directory exists
         if not results_dir_path.exists():
             logger.warning(f"Results directory not found: {results_dir_path}")
+            # Removed behind the app's back; the page should stop listing it
+            await run_in_threadpool(forget_results, ticket_number, file_stem)
             raise HTTPException(status_code=404, detail=f"Results directory for '{file_stem}' in ticket '{ticket_number}' not found")
 
         if not results_dir_path.is_dir():
@@ -383,6 +1421,7 @@ async def delete_results(ticket_number: str, file_stem: str):
 
         # Delete the entire directory and its contents
         shutil.rmtree(results_dir_path)
+        await run_in_threadpool(forget_results, ticket_number, file_stem)
         logger.info(f"Successfully deleted results directory: {results_dir_path}")
 
         # Also clean up the corresponding JSONL directory if it exists
@@ -438,6 +1477,9 @@ async def delete_ticket(ticket_number: str):
             logger.info(f"Successfully deleted ticket JSONL directory: {ticket_jsonl_dir}")
             deleted_something = True
 
+        # Also forget results whose directories have already gone
+        await run_in_threadpool(forget_results, ticket_number)
+
         if not deleted_something:
             logger.warning(f"No directories found for ticket: {ticket_number}")
             raise HTTPException(status_code=404, detail=f"No results found for ticket '{ticket_number}'")
@@ -0,0 +1,298 @@
+# evtx-analyzer/app/metrics.py
+"""Per-stage instrumentation of the analysis pipeline, exposed to Prometheus.
+
+Every run of a stage (saving an upload, extracting a zip member, Chainsaw,
+Hayabusa, parsing, mirroring into the JSONL directory) is measured by a
+StageTimer: wall time, bytes in and out, records, the CPU time of the thread
+that ran it and of its child processes, and the peak memory of those. Each run is added
+to the Prometheus metrics and to the record of the job it belongs to.
+
+A timer is bound to the thread running the stage, like the current job, so
+code deep inside a stage reports what it knows through record_io() and
+add_child_rusage() without passing the timer around. They do nothing outside
+a measured stage.
+"""
+import functools
+import threading
+import time
+from pathlib import Path
+
+from jobs import JobCancelled, current_job
+
+STAGES = ("save", "extract", "chainsaw", "hayabusa", "parse", "mirror")
+DURATION_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+RSS_BUCKETS = tuple(2 ** n * 1024 * 1024 for n in range(5, 15))  # 32 MB to 16 GB
+RATE_BUCKETS = (100, 1000, 5000, 10000, 25000, 50000, 100000, 250000, 1000000)
+
+# Thread-local holding the stage the current thread is working on
+_local = threading.local()
+
+
+def current_stage():
+    """Returns the StageTimer of the stage the calling thread is running, or None."""
+    return getattr(_local, "stage", None)
+
+
+def record_io(bytes_in: int = None, bytes_out: int = None, records: int = None):
+    """Adds to the byte and record counts of the current stage, if any."""
+    stage = current_stage()
+    if stage is not None:
+        stage.add_io(bytes_in, bytes_out, records)
+
+
+def add_child_usage(cpu_seconds: float, peak_rss: int):
+    """Adds the CPU time and peak memory (bytes) of child processes to the current stage, if any."""
+    stage = current_stage()
+    if stage is not None:
+        stage.add_child_usage(cpu_seconds, peak_rss)
+
+
+def add_child_rusage(rusage):
+    """Adds the resource usage of a reaped child process (os.wait4) to the current stage, if any."""
+    if rusage is not None:
+        # ru_maxrss is in kilobytes on Linux
+        add_child_usage(rusage.ru_utime + rusage.ru_stime, rusage.ru_maxrss * 1024)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A Prometheus counter with labels."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), lock=None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._lock = lock or threading.Lock()
+        self._values = {}
+
+    def inc(self, amount: float = 1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, label_values)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """A Prometheus histogram with labels and fixed buckets."""
+
+    def __init__(self, name: str, help_text: str, buckets: tuple, labels: tuple = (), lock=None):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.labels = labels
+        self._lock = lock or threading.Lock()
+        # label values -> [count per bucket, sum, count]
+        self._values = {}
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * len(self.buckets), 0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = f'le="{_number(bound)}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {_number(total)}")
+                lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+class StageTimer:
+    """Measures one run of a stage; use as a context manager.
+
+    The stage reports its bytes, records and child processes as it goes (see
+    record_io and add_child_rusage) and sets .ok to False if it failed without
+    raising. Peak memory is that of the child processes; stages that run
+    inside the app have none (None), since the app's high-water mark is shared
+    by every stage that ever ran. threaded=False is for stages run on the
+    event loop: they are not bound to the thread and their CPU time is not
+    measured.
+    """
+
+    def __init__(self, metrics, stage: str, target: str = None, job=None, threaded: bool = True):
+        self.metrics = metrics
+        self.stage = stage
+        self.target = target
+        self.job = job if job is not None or not threaded else current_job()
+        self.threaded = threaded
+        self.ok = True
+        self.bytes_in = None
+        self.bytes_out = None
+        self.records = None
+        self.child_cpu_seconds = None
+        self.child_peak_rss = None
+        self.result = None
+        self._discarded = False
+        self._lock = threading.Lock()
+
+    def discard(self):
+        """Records nothing for this run, e.g. when there turned out to be nothing to do."""
+        self._discarded = True
+
+    def add_io(self, bytes_in: int = None, bytes_out: int = None, records: int = None):
+        with self._lock:
+            if bytes_in is not None:
+                self.bytes_in = (self.bytes_in or 0) + bytes_in
+            if bytes_out is not None:
+                self.bytes_out = (self.bytes_out or 0) + bytes_out
+            if records is not None:
+                self.records = (self.records or 0) + records
+
+    def add_child_usage(self, cpu_seconds: float, peak_rss: int):
+        with self._lock:
+            self.child_cpu_seconds = (self.child_cpu_seconds or 0) + cpu_seconds
+            self.child_peak_rss = max(self.child_peak_rss or 0, peak_rss)
+
+    def __enter__(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        if self.threaded:
+            self._start_cpu = time.thread_time()
+            self._outer = current_stage()
+            _local.stage = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        cpu_seconds = None
+        if self.threaded:
+            cpu_seconds = time.thread_time() - self._start_cpu
+            _local.stage = self._outer
+        if self._discarded:
+            return False
+        if exc_type is None:
+            outcome = "ok" if self.ok else "failed"
+        elif issubclass(exc_type, JobCancelled):
+            outcome = "cancelled"
+        else:
+            outcome = "failed"
+        self.result = {
+            "stage": self.stage,
+            "target": self.target,
+            "outcome": outcome,
+            "started_at": self.started_at,
+            "seconds": round(seconds, 3),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "records": self.records,
+            "records_per_second": round(self.records / seconds, 1) if self.records and seconds > 0 else None,
+            "cpu_seconds": round(cpu_seconds, 3) if cpu_seconds is not None else None,
+            "child_cpu_seconds": round(self.child_cpu_seconds, 3) if self.child_cpu_seconds is not None else None,
+            "peak_rss_bytes": self.child_peak_rss,
+        }
+        self.metrics.observe(self.result, cpu_seconds)
+        if self.job is not None:
+            self.job.add_stage(self.result)
+        return False
+
+
+class PipelineMetrics:
+    """The metrics of every stage run since the app started."""
+
+    def __init__(self, prefix: str = "chayabusaw"):
+        lock = threading.Lock()
+        self.runs = Counter(
+            f"{prefix}_stage_runs_total", "Stage runs by outcome (ok, failed or cancelled).", ("stage", "outcome"), lock
+        )
+        self.duration = Histogram(
+            f"{prefix}_stage_duration_seconds", "Wall time of a stage run.", DURATION_BUCKETS, ("stage",), lock
+        )
+        self.bytes_in = Counter(f"{prefix}_stage_bytes_in_total", "Bytes read by stage runs.", ("stage",), lock)
+        self.bytes_out = Counter(f"{prefix}_stage_bytes_out_total", "Bytes written by stage runs.", ("stage",), lock)
+        self.records = Counter(f"{prefix}_stage_records_total", "Records processed by stage runs.", ("stage",), lock)
+        self.cpu = Counter(
+            f"{prefix}_stage_cpu_seconds_total",
+            "CPU time of stage runs, in the app (process=app) and in child processes (process=children).",
+            ("stage", "process"), lock,
+        )
+        self.peak_rss = Histogram(
+            f"{prefix}_stage_peak_rss_bytes", "Peak resident memory of the child processes of a stage run.",
+            RSS_BUCKETS, ("stage",), lock,
+        )
+        self.rate = Histogram(
+            f"{prefix}_stage_records_per_second", "Throughput of stage runs that process records.",
+            RATE_BUCKETS, ("stage",), lock,
+        )
+        self._metrics = (self.runs, self.duration, self.bytes_in, self.bytes_out, self.records, self.cpu,
+                         self.peak_rss, self.rate)
+
+    def stage(self, stage: str, target: str = None, job=None, threaded: bool = True) -> StageTimer:
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage '{stage}', expected one of {STAGES}")
+        return StageTimer(self, stage, target, job, threaded)
+
+    def measure(self, stage: str):
+        """Decorator timing every call of a stage function as one run.
+
+        The target is the name of the function's first argument (a file or
+        directory path); returning False counts as a failure.
+        """
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(target, *args, **kwargs):
+                with self.stage(stage, Path(target).name) as timer:
+                    result = fn(target, *args, **kwargs)
+                    timer.ok = result is not False
+                    return result
+            return wrapper
+        return decorate
+
+    def observe(self, result: dict, cpu_seconds: float = None):
+        stage = result["stage"]
+        self.runs.inc(1, stage, result["outcome"])
+        self.duration.observe(result["seconds"], stage)
+        if result["bytes_in"] is not None:
+            self.bytes_in.inc(result["bytes_in"], stage)
+        if result["bytes_out"] is not None:
+            self.bytes_out.inc(result["bytes_out"], stage)
+        if result["records"] is not None:
+            self.records.inc(result["records"], stage)
+        if result["records_per_second"] is not None:
+            self.rate.observe(result["records_per_second"], stage)
+        if cpu_seconds is not None:
+            self.cpu.inc(cpu_seconds, stage, "app")
+        if result["child_cpu_seconds"] is not None:
+            self.cpu.inc(result["child_cpu_seconds"], stage, "children")
+        if result["peak_rss_bytes"] is not None:
+            self.peak_rss.observe(result["peak_rss_bytes"], stage)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
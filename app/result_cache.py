@@ -0,0 +1,223 @@
+# evtx-analyzer/app/result_cache.py
+"""Content-addressed store of analysis results.
+
+Entries are keyed by the SHA-256 of an EVTX file plus the version of the rule
+sets it was analysed with, so the same log uploaded again (under any ticket or
+file name) is served from the store instead of being re-analysed.
+
+Layout: <cache_dir>/<key[:2]>/<key>/{meta.json, files/...}
+"""
+import errno
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+COPY_BUFFER = 1024 * 1024
+
+# ioctl that makes dst share the extents of src on CoW filesystems (btrfs, xfs)
+_FICLONE = 0x40049409
+
+
+def copy_and_hash(src, dst) -> str:
+    """Copies file object src to file object dst and returns the SHA-256 of the data."""
+    digest = hashlib.sha256()
+    while True:
+        block = src.read(COPY_BUFFER)
+        if not block:
+            break
+        digest.update(block)
+        dst.write(block)
+    return digest.hexdigest()
+
+
+def clone_file(src: Path, dst: Path) -> str:
+    """Makes dst a copy of src as cheaply as the filesystem allows.
+
+    Tries a reflink first, then a hard link, then a plain copy. Returns the
+    method that worked ("reflink", "hardlink" or "copy").
+    """
+    dst.unlink(missing_ok=True)
+    try:
+        with open(src, "rb") as f_src, open(dst, "wb") as f_dst:
+            fcntl.ioctl(f_dst.fileno(), _FICLONE, f_src.fileno())
+        shutil.copystat(src, dst)
+        return "reflink"
+    except OSError:
+        dst.unlink(missing_ok=True)
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+    shutil.copy2(src, dst)
+    return "copy"
+
+
+def fingerprint_paths(paths: list, salt: str = "") -> str:
+    """Hashes the names, sizes and modification times of every file under paths.
+
+    Cheap enough to run per upload, and changes whenever a rule is added,
+    removed or edited. salt is mixed in for settings that also change results.
+    """
+    digest = hashlib.sha256(salt.encode())
+    for root in paths:
+        root = Path(root)
+        digest.update(str(root).encode())
+        if root.is_file():
+            stat = root.stat()
+            digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                digest.update(f"{os.path.relpath(path, root)}\0{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+class ResultCache:
+    """Size-bounded, least-recently-used store of per-file analysis results."""
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(file_hash: str, rules_version: str) -> str:
+        return f"{file_hash}-{rules_version}"
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def _entries(self):
+        for meta_path in self.cache_dir.glob("*/*/meta.json"):
+            if meta_path.parent.name.startswith(".tmp-"):
+                continue
+            try:
+                yield meta_path.parent, json.loads(meta_path.read_text())
+            except (OSError, ValueError):
+                # Half-written or damaged entry
+                yield meta_path.parent, None
+
+    def restore(self, key: str, stem: str, output_dir: Path) -> bool:
+        """Links the stored results for key into output_dir, renamed for stem.
+
+        Returns False on a miss.
+        """
+        if not self.enabled:
+            return False
+        entry_dir = self._entry_dir(key)
+        meta_path = entry_dir / "meta.json"
+        with self._lock:
+            try:
+                meta = json.loads(meta_path.read_text())
+            except (OSError, ValueError):
+                return False
+            output_dir.mkdir(parents=True, exist_ok=True)
+            for name in meta["files"]:
+                clone_file(entry_dir / "files" / name, output_dir / _renamed(name, meta["stem"], stem))
+            meta["last_used"] = time.time()
+            meta["hits"] = meta.get("hits", 0) + 1
+            meta_path.write_text(json.dumps(meta))
+        logger.info(f"Result cache hit for {stem} ({key})")
+        return True
+
+    def store(self, key: str, stem: str, output_dir: Path):
+        """Adds the files in output_dir to the store under key, then evicts down to max_bytes."""
+        if not self.enabled:
+            return
+        entry_dir = self._entry_dir(key)
+        if entry_dir.exists():
+            return
+        # Build the entry next to its final place and rename it in, so readers
+        # never see a partial entry
+        staging = entry_dir.parent / f".tmp-{uuid.uuid4().hex}"
+        (staging / "files").mkdir(parents=True)
+        try:
+            files = sorted(p.name for p in output_dir.iterdir() if p.is_file())
+            size = 0
+            for name in files:
+                clone_file(output_dir / name, staging / "files" / name)
+                size += (staging / "files" / name).stat().st_size
+            now = time.time()
+            meta = {"key": key, "stem": stem, "files": files, "size": size, "created": now, "last_used": now, "hits": 0}
+            (staging / "meta.json").write_text(json.dumps(meta))
+            with self._lock:
+                try:
+                    staging.rename(entry_dir)
+                except OSError:
+                    # Another worker stored the same file first
+                    return
+            logger.info(f"Stored results for {stem} in the result cache ({key}, {size / 1e6:.1f} MB)")
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """Removes least recently used entries until the store fits in max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry_dir, meta in self._entries():
+                if meta is None:
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                    continue
+                entries.append((meta["last_used"], meta["size"], entry_dir))
+                total += meta["size"]
+            entries.sort()
+            for _, size, entry_dir in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+                logger.info(f"Evicted {entry_dir.name} from the result cache")
+
+    def invalidate(self, rules_version: str = None) -> int:
+        """Drops every entry, or only those not made with rules_version. Returns the number removed."""
+        removed = 0
+        with self._lock:
+            for entry_dir, meta in self._entries():
+                if rules_version is not None and meta is not None and meta["key"].endswith(f"-{rules_version}"):
+                    continue
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                removed += 1
+        if removed:
+            logger.info(f"Invalidated {removed} result cache entr{'y' if removed == 1 else 'ies'}")
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            metas = [meta for _, meta in self._entries() if meta is not None]
+        return {
+            "entries": len(metas),
+            "bytes": sum(meta["size"] for meta in metas),
+            "max_bytes": self.max_bytes,
+            "hits": sum(meta.get("hits", 0) for meta in metas),
+        }
+
+
+def _renamed(name: str, old_stem: str, new_stem: str) -> str:
+    # Reports are named after the file they came from, e.g. Security_dump.jsonl
+    if name.startswith(f"{old_stem}_"):
+        return f"{new_stem}_{name[len(old_stem) + 1:]}"
+    return name
@@ -0,0 +1,249 @@
+# evtx-analyzer/app/results_index.py
+"""SQLite index of the analysis results on disk.
+
+The results page and the /results API read from this index instead of
+walking RESULTS_DIR on every request, which gets slow with thousands of
+tickets on a network volume. The app updates an entry whenever the analysis
+of a file finishes and whenever results are deleted. An existing results
+volume is indexed with:
+
+    python3 results_index.py rebuild --db FILE RESULTS_DIR
+
+Every (ticket, stem) pair has one row in results, and every report file in
+its directory one row in artifacts, with its size, modification time and,
+for the detection reports, the number of detections (hits).
+"""
+import argparse
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+from jsonstream import iter_json_array
+from lineindex import GZIP_SUFFIX, INDEX_SUFFIX, open_artifact
+
+logger = logging.getLogger(__name__)
+
+COUNT_BUFFER = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    ticket  TEXT NOT NULL,
+    stem    TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (ticket, stem)
+);
+CREATE INDEX IF NOT EXISTS results_updated ON results (updated);
+CREATE TABLE IF NOT EXISTS artifacts (
+    ticket TEXT NOT NULL,
+    stem   TEXT NOT NULL,
+    name   TEXT NOT NULL,
+    kind   TEXT,
+    size   INTEGER NOT NULL,
+    mtime  REAL NOT NULL,
+    hits   INTEGER,
+    PRIMARY KEY (ticket, stem, name)
+);
+"""
+
+
+def artifact_kind(stem: str, name: str):
+    """The kind of report a file in the results directory of stem is (gzipped or not), or None."""
+    kinds = {
+        f"{stem}_dump.jsonl": "jsonl",
+        f"{stem}_chainsaw_report.json": "chainsaw",
+        f"{stem}_hayabusa_report.jsonl": "hayabusa_jsonl",
+        "index.html": "hayabusa_html",
+    }
+    return kinds.get(name[:-len(GZIP_SUFFIX)] if name.endswith(GZIP_SUFFIX) else name)
+
+
+def count_hits(path: Path, kind: str):
+    """Number of detections in a Chainsaw or Hayabusa report; None for other files."""
+    try:
+        if kind == "chainsaw":
+            with open_artifact(path, "r", encoding="utf-8") as f:
+                return sum(1 for _ in iter_json_array(f))
+        if kind == "hayabusa_jsonl":
+            lines = 0
+            with open_artifact(path) as f:
+                while True:
+                    block = f.read(COUNT_BUFFER)
+                    if not block:
+                        break
+                    lines += block.count(b"\n")
+            return lines
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not count the detections in {path}: {e}")
+    return None
+
+
+def scan_stem(stem_dir: Path) -> list:
+    """Returns the artifact rows (name, kind, size, mtime, hits) of one results directory."""
+    rows = []
+    stem = stem_dir.name
+    for path in sorted(stem_dir.iterdir()):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        # Line indexes of the JSONL reports are not reports themselves
+        if not path.is_file() or path.name.endswith(INDEX_SUFFIX):
+            continue
+        kind = artifact_kind(stem, path.name)
+        rows.append((path.name, kind, stat.st_size, stat.st_mtime, count_hits(path, kind)))
+    return rows
+
+
+class ResultsIndex:
+    """Thread-safe access to the results index database."""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.created = not self.db_path.exists()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def update_stem(self, ticket: str, stem: str, stem_dir: Path):
+        """Re-indexes the reports of one file after its analysis has finished."""
+        if not stem_dir.is_dir():
+            self.remove_stem(ticket, stem)
+            return
+        rows = scan_stem(stem_dir)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO results (ticket, stem, created, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (ticket, stem) DO UPDATE SET updated = excluded.updated",
+                (ticket, stem, now, now),
+            )
+            self._conn.execute("DELETE FROM artifacts WHERE ticket = ? AND stem = ?", (ticket, stem))
+            self._conn.executemany(
+                "INSERT INTO artifacts (ticket, stem, name, kind, size, mtime, hits) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(ticket, stem, *row) for row in rows],
+            )
+
+    def remove_stem(self, ticket: str, stem: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM results WHERE ticket = ? AND stem = ?", (ticket, stem))
+            self._conn.execute("DELETE FROM artifacts WHERE ticket = ? AND stem = ?", (ticket, stem))
+
+    def remove_ticket(self, ticket: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM results WHERE ticket = ?", (ticket,))
+            self._conn.execute("DELETE FROM artifacts WHERE ticket = ?", (ticket,))
+
+    def rebuild(self, results_dir: Path) -> int:
+        """Replaces the index with a scan of results_dir. Returns the number of files indexed."""
+        entries = []
+        for ticket_dir in sorted(Path(results_dir).iterdir()):
+            if not ticket_dir.is_dir():
+                continue
+            for stem_dir in sorted(ticket_dir.iterdir()):
+                if not stem_dir.is_dir():
+                    continue
+                rows = scan_stem(stem_dir)
+                # The newest report stands in for when the analysis finished
+                finished = max((row[3] for row in rows), default=stem_dir.stat().st_mtime)
+                entries.append((ticket_dir.name, stem_dir.name, finished, rows))
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM results")
+            self._conn.execute("DELETE FROM artifacts")
+            for ticket, stem, finished, rows in entries:
+                self._conn.execute(
+                    "INSERT INTO results (ticket, stem, created, updated) VALUES (?, ?, ?, ?)",
+                    (ticket, stem, finished, finished),
+                )
+                self._conn.executemany(
+                    "INSERT INTO artifacts (ticket, stem, name, kind, size, mtime, hits) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(ticket, stem, *row) for row in rows],
+                )
+        return len(entries)
+
+    def list_tickets(self, query: str = "", offset: int = 0, limit: int = 50, sort: str = "recent") -> tuple:
+        """Returns (total matching tickets, [ticket dicts]) for one page.
+
+        query matches any part of a ticket number or file stem. Tickets are
+        sorted by their latest analysis ("recent") or by ticket number
+        ("ticket"). Each ticket lists the files that matched, with their
+        artifacts.
+        """
+        match = ""
+        params = []
+        if query:
+            pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            match = "(ticket LIKE ? ESCAPE '\\' OR stem LIKE ? ESCAPE '\\')"
+            params = [pattern, pattern]
+        where = f"WHERE {match}" if match else ""
+        order = "ticket" if sort == "ticket" else "latest DESC, ticket"
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(DISTINCT ticket) FROM results {where}", params).fetchone()[0]
+            tickets = self._conn.execute(
+                f"SELECT ticket, MAX(updated) AS latest FROM results {where} "
+                f"GROUP BY ticket ORDER BY {order} LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+            names = [ticket["ticket"] for ticket in tickets]
+            in_page = f"ticket IN ({', '.join('?' * len(names))})"
+            stems = self._conn.execute(
+                f"SELECT ticket, stem, created, updated FROM results WHERE {in_page} "
+                f"{'AND ' + match if match else ''} ORDER BY stem",
+                names + params,
+            ).fetchall()
+            artifacts = self._conn.execute(
+                f"SELECT ticket, stem, name, kind, size, mtime, hits FROM artifacts WHERE {in_page} ORDER BY name",
+                names,
+            ).fetchall()
+
+        artifacts_of = {}
+        for artifact in artifacts:
+            artifacts_of.setdefault((artifact["ticket"], artifact["stem"]), []).append({
+                key: artifact[key] for key in ("name", "kind", "size", "mtime", "hits")
+            })
+        files_of = {}
+        for stem in stems:
+            files_of.setdefault(stem["ticket"], []).append({
+                "stem": stem["stem"],
+                "created": stem["created"],
+                "updated": stem["updated"],
+                "artifacts": artifacts_of.get((stem["ticket"], stem["stem"]), []),
+            })
+        page = [
+            {"ticket": ticket["ticket"], "updated": ticket["latest"], "files": files_of.get(ticket["ticket"], [])}
+            for ticket in tickets
+        ]
+        return total, page
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Results index maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild = commands.add_parser("rebuild", help="re-index an existing results volume")
+    rebuild.add_argument("--db", type=Path, required=True)
+    rebuild.add_argument("results_dir", type=Path)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    start = time.perf_counter()
+    index = ResultsIndex(args.db)
+    try:
+        count = index.rebuild(args.results_dir)
+    finally:
+        index.close()
+    logger.info(f"Indexed {count} result set(s) from {args.results_dir} ({time.perf_counter() - start:.2f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+# evtx-analyzer/app/rulesync.py
+"""Incremental, manifest-based sync of the rule directories.
+
+Run by entrypoint.sh at container start instead of full recursive copies:
+
+    python3 rulesync.py merge  SRC DST   # add SRC's files to DST, never touching the user's own files
+    python3 rulesync.py mirror SRC DST   # make DST an exact copy of SRC
+    python3 rulesync.py version --output FILE DIR [DIR ...]
+
+Every destination has a manifest (kept in --state-dir, outside the rule
+trees) with the size, mtime and SHA-256 of each file, and for files the sync
+placed there, the source file they came from. Files are only copied when the
+source has changed, files that disappeared from the source are pruned, and
+files in a merge destination that the sync did not place (or that the user
+edited since) are left alone.
+
+The version command hashes the synced trees into a rule-set version that the
+app reports and uses to key cached results.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_DIR = "/var/lib/chayabusaw"
+HASH_BUFFER = 1024 * 1024
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(HASH_BUFFER)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _walk(root: Path) -> dict:
+    """Returns {relative path: (size, mtime_ns)} of the regular files under root."""
+    files = {}
+    if not root.is_dir():
+        return files
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files[os.path.relpath(path, root)] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def manifest_path(state_dir: Path, dst: Path) -> Path:
+    name = str(dst.resolve()).strip("/").replace("/", "_") or "root"
+    return Path(state_dir) / "rulesync" / f"{name}.json"
+
+
+def load_manifest(state_dir: Path, dst: Path) -> dict:
+    try:
+        return json.loads(manifest_path(state_dir, dst).read_text())["files"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def save_manifest(state_dir: Path, dst: Path, files: dict):
+    path = manifest_path(state_dir, dst)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"dst": str(dst), "files": files}))
+    os.replace(tmp, path)
+
+
+def _same_content(a: Path, b: Path) -> bool:
+    return a.stat().st_size == b.stat().st_size and _file_sha256(a) == _file_sha256(b)
+
+
+def sync_tree(src: Path, dst: Path, state_dir: Path, mirror: bool) -> dict:
+    """Brings dst up to date with src; see the module docstring. Returns counters."""
+    src, dst = Path(src), Path(dst)
+    old = load_manifest(state_dir, dst)
+    src_files = _walk(src)
+    dst_files = _walk(dst)
+    files = {}
+    stats = {"copied": 0, "unchanged": 0, "pruned": 0, "kept": 0}
+
+    def record(rel, source_sig):
+        stat = os.stat(dst / rel)
+        entry = old.get(rel)
+        if entry and (entry["size"], entry["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+            sha = entry["sha256"]
+        else:
+            sha = _file_sha256(dst / rel)
+        files[rel] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha, "source": source_sig}
+
+    def copy(rel, source_sig):
+        target = dst / rel
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.rulesync")
+        shutil.copy2(src / rel, tmp)
+        os.replace(tmp, target)
+        old.pop(rel, None)
+        record(rel, list(source_sig))
+        stats["copied"] += 1
+
+    for rel, src_sig in src_files.items():
+        entry = old.get(rel)
+        dst_sig = dst_files.get(rel)
+        placed_by_us = entry is not None and entry["source"] is not None \
+            and dst_sig == (entry["size"], entry["mtime_ns"])
+        if dst_sig is None:
+            copy(rel, src_sig)
+        elif placed_by_us:
+            if tuple(entry["source"]) != src_sig:
+                copy(rel, src_sig)
+            else:
+                files[rel] = entry
+                stats["unchanged"] += 1
+        elif mirror:
+            if dst_sig == src_sig:
+                record(rel, list(src_sig))
+                stats["unchanged"] += 1
+            else:
+                copy(rel, src_sig)
+        elif entry is None and _same_content(src / rel, dst / rel):
+            # Left behind by an earlier plain copy: adopt it, so it gets updated from now on
+            record(rel, list(src_sig))
+            stats["unchanged"] += 1
+        else:
+            # The user's own (or edited) file wins
+            record(rel, None)
+            stats["kept"] += 1
+
+    pruned_dirs = set()
+    for rel, dst_sig in dst_files.items():
+        if rel in src_files:
+            continue
+        entry = old.get(rel)
+        placed_by_us = entry is not None and entry["source"] is not None \
+            and dst_sig == (entry["size"], entry["mtime_ns"])
+        if mirror or placed_by_us:
+            (dst / rel).unlink()
+            pruned_dirs.add((dst / rel).parent)
+            stats["pruned"] += 1
+        else:
+            record(rel, None)
+            stats["kept"] += 1
+
+    # Remove directories emptied by pruning, deepest first
+    for directory in sorted(pruned_dirs, key=lambda p: len(p.parts), reverse=True):
+        while directory != dst and directory.is_dir() and not any(directory.iterdir()):
+            directory.rmdir()
+            directory = directory.parent
+
+    save_manifest(state_dir, dst, files)
+    return stats
+
+
+def tree_version(root: Path, state_dir: Path) -> str:
+    """Content hash of every file under root, reusing the hashes in its manifest where still valid."""
+    root = Path(root)
+    known = load_manifest(state_dir, root)
+    digest = hashlib.sha256()
+    for rel, (size, mtime_ns) in sorted(_walk(root).items()):
+        entry = known.get(rel)
+        if entry and (entry["size"], entry["mtime_ns"]) == (size, mtime_ns):
+            sha = entry["sha256"]
+        else:
+            sha = _file_sha256(root / rel)
+        digest.update(f"{rel}\0{sha}\n".encode())
+    return digest.hexdigest()
+
+
+def write_rules_version(output: Path, roots: list, state_dir: Path) -> dict:
+    trees = {str(root): tree_version(root, state_dir) for root in roots}
+    combined = hashlib.sha256("".join(f"{root}\0{version}\n" for root, version in trees.items()).encode())
+    info = {
+        "version": combined.hexdigest()[:16],
+        "trees": trees,
+        "synced_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output.with_suffix(".tmp")
+    tmp.write_text(json.dumps(info, indent=2))
+    os.replace(tmp, output)
+    return info
+
+
+def read_rules_version(path: Path):
+    """Returns the rule-set version written at startup, or None if there is none."""
+    try:
+        return json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incremental rule directory sync")
+    parser.add_argument("--state-dir", type=Path, default=Path(os.environ.get("STATE_DIR", DEFAULT_STATE_DIR)))
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("merge", "mirror"):
+        command = commands.add_parser(name)
+        command.add_argument("src", type=Path)
+        command.add_argument("dst", type=Path)
+    version = commands.add_parser("version")
+    version.add_argument("--output", type=Path, required=True)
+    version.add_argument("roots", type=Path, nargs="+")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    start = time.perf_counter()
+    if args.command == "version":
+        info = write_rules_version(args.output, args.roots, args.state_dir)
+        logger.info(f"Rule set version {info['version']} ({time.perf_counter() - start:.2f}s)")
+    else:
+        args.dst.mkdir(parents=True, exist_ok=True)
+        stats = sync_tree(args.src, args.dst, args.state_dir, mirror=args.command == "mirror")
+        logger.info(
+            f"{args.command} {args.src} -> {args.dst}: {stats['copied']} copied, {stats['pruned']} pruned, "
+            f"{stats['unchanged']} unchanged, {stats['kept']} kept ({time.perf_counter() - start:.2f}s)"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+# evtx-analyzer/app/scheduler.py
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from jobs import set_current_job
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus() -> int:
+    """Number of CPUs this process may run on (respects container CPU pinning)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class StageScheduler:
+    """Runs analysis stages in parallel under a shared CPU budget.
+
+    Every stage is submitted with a weight: roughly the number of cores it keeps
+    busy. A stage only starts once enough of the budget is free, so the
+    multi-threaded Rust tools and the Python parser never oversubscribe the box,
+    no matter how many jobs or files are in flight. Waiting stages are admitted
+    in submission order, so heavy stages are not starved by light ones.
+    """
+
+    def __init__(self, cpu_budget: int):
+        self.capacity = max(1, cpu_budget)
+        self._available = self.capacity
+        self._waiters = deque()
+        self._cond = threading.Condition()
+        # One thread per unit of budget is enough: every stage costs at least one unit
+        self._executor = ThreadPoolExecutor(max_workers=self.capacity, thread_name_prefix="stage-worker")
+
+    def submit(self, fn, *args, weight: int = 1, job=None):
+        """Schedules fn(*args) and returns a Future for its result."""
+        weight = min(max(1, weight), self.capacity)
+        return self._executor.submit(self._run, fn, args, weight, job)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _acquire(self, weight: int):
+        ticket = object()
+        with self._cond:
+            self._waiters.append(ticket)
+            while self._waiters[0] is not ticket or self._available < weight:
+                self._cond.wait()
+            self._waiters.popleft()
+            self._available -= weight
+            # The next waiter may fit into what is left
+            self._cond.notify_all()
+
+    def _release(self, weight: int):
+        with self._cond:
+            self._available += weight
+            self._cond.notify_all()
+
+    def _run(self, fn, args, weight, job):
+        if job is not None:
+            job.raise_if_cancelled()
+        self._acquire(weight)
+        set_current_job(job)
+        try:
+            if job is not None:
+                job.raise_if_cancelled()
+            return fn(*args)
+        finally:
+            set_current_job(None)
+            self._release(weight)
@@ -0,0 +1,598 @@
+# evtx-analyzer/app/uploads.py
+"""Receiving uploads and unpacking zip archives without extra passes over the data.
+
+* stream_multipart_upload writes the file part of a multipart request straight
+  to its final place in large blocks, hashing it on the way, instead of letting
+  the framework spool it to a temporary file that is then copied again.
+* UploadSessions receives large files as byte ranges (resumable uploads):
+  ranges may arrive in any order and in parallel, are written straight to
+  their offset in the session file, and an interrupted upload continues with
+  the ranges that are still missing.
+* ZipExtractor extracts the .evtx members of an archive one at a time, so each
+  can be analysed as soon as it is complete, truncating the archive behind it
+  as it goes and enforcing size and compression ratio limits.
+"""
+import errno
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+import zlib
+from pathlib import Path
+
+from fastapi.concurrency import run_in_threadpool
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+logger = logging.getLogger(__name__)
+
+# Upload data is written to disk in blocks of this size
+UPLOAD_BLOCK = 8 * 1024 * 1024
+# Zip members are read in blocks of this size
+EXTRACT_BLOCK = 1024 * 1024
+# Form fields other than the file are small; anything larger is rejected
+MAX_FIELD_BYTES = 64 * 1024
+
+
+class UploadError(Exception):
+    """Raised when an upload request is malformed or exceeds a limit.
+
+    status_code is the HTTP status to answer with.
+    """
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class StreamedUpload:
+    """A multipart upload whose file part has been written to disk."""
+
+    def __init__(self):
+        self.fields = {}
+        self.filename = None
+        self.path = None
+        self.sha256 = None
+        self.size = 0
+
+
+class _MultipartReceiver:
+    """Collects parser callbacks; the file part is written by flush() outside the callbacks."""
+
+    def __init__(self, dest_dir: Path, file_field: str):
+        self.dest_dir = dest_dir
+        self.file_field = file_field
+        self.upload = StreamedUpload()
+        self._digest = hashlib.sha256()
+        self._file = None
+        self._buffer = bytearray()
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._part_name = None
+        self._part_is_file = False
+        self._field_value = bytearray()
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._part_name = None
+        self._part_is_file = False
+        self._field_value = bytearray()
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._part_name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        if filename is not None and self._part_name == self.file_field:
+            if self._file is not None:
+                raise UploadError("Only one file may be uploaded per request")
+            # Keep only the last path component of whatever the client sent
+            name = Path(filename.decode("utf-8", "replace").replace("\\", "/")).name
+            if not name:
+                raise UploadError("No filename provided")
+            self._part_is_file = True
+            self.upload.filename = name
+            self.upload.path = self.dest_dir / name
+            self._file = open(self.upload.path, "wb")
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._part_is_file:
+            self._buffer += data[start:end]
+        elif self._part_name is not None:
+            self._field_value += data[start:end]
+            if len(self._field_value) > MAX_FIELD_BYTES:
+                raise UploadError(f"Form field '{self._part_name}' is too large")
+
+    def on_part_end(self):
+        if not self._part_is_file and self._part_name is not None:
+            self.upload.fields[self._part_name] = self._field_value.decode("utf-8", "replace")
+
+    def _write(self, block: bytes):
+        self._digest.update(block)
+        self._file.write(block)
+
+    async def flush(self, final: bool = False):
+        if self._buffer and (final or len(self._buffer) >= UPLOAD_BLOCK):
+            block = bytes(self._buffer)
+            self._buffer.clear()
+            self.upload.size += len(block)
+            await run_in_threadpool(self._write, block)
+        if final and self._file is not None:
+            self._file.close()
+            self._file = None
+            self.upload.sha256 = self._digest.hexdigest()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+async def stream_multipart_upload(request, dest_dir: Path, file_field: str = "file") -> StreamedUpload:
+    """Reads a multipart/form-data request, writing the file_field part into dest_dir.
+
+    Other fields are returned in .fields. Raises UploadError for malformed
+    requests; the caller owns dest_dir and removes it on failure.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise UploadError("Expected a multipart/form-data request")
+
+    receiver = _MultipartReceiver(dest_dir, file_field)
+    parser = MultipartParser(options[b"boundary"], receiver.callbacks())
+    try:
+        async for data in request.stream():
+            parser.write(data)
+            await receiver.flush()
+        parser.finalize()
+        await receiver.flush(final=True)
+    except UploadError:
+        raise
+    except Exception as e:
+        raise UploadError(f"Malformed upload: {e}") from e
+    finally:
+        receiver.close()
+    return receiver.upload
+
+
+# --- Resumable uploads ---
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)$")
+# Analysable upload types
+UPLOAD_SUFFIXES = (".evtx", ".zip")
+
+
+def upload_filename(name: str) -> str:
+    """The last path component of a client-supplied file name."""
+    return Path(name.replace("\\", "/")).name
+
+
+def parse_content_range(header: str, size: int) -> tuple:
+    """Returns the (start, end) byte offsets, end exclusive, of a Content-Range header for a file of size bytes."""
+    match = _CONTENT_RANGE.match((header or "").strip())
+    if match is None:
+        raise UploadError("Expected a Content-Range header like 'bytes 0-1048575/6442450944'")
+    start, last, total = match.groups()
+    start, end = int(start), int(last) + 1
+    if total != "*" and int(total) != size:
+        raise UploadError(f"Content-Range gives a total of {total} bytes, the upload has {size}", 416)
+    if start >= end or end > size:
+        raise UploadError(f"Range {start}-{end - 1} is outside the upload's {size} bytes", 416)
+    return start, end
+
+
+def _pwrite_all(fd: int, data: bytes, offset: int):
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(UPLOAD_BLOCK)
+            if not block:
+                return digest.hexdigest()
+            digest.update(block)
+
+
+class UploadSession:
+    """A resumable upload: its declared file, the byte ranges received so far, and form fields.
+
+    received is a sorted list of disjoint [start, end) ranges.
+    """
+
+    def __init__(self, session_id: str, directory: Path, filename: str, size: int, fields: dict,
+                 created_at: float = None, updated_at: float = None, received=None):
+        self.id = session_id
+        self.directory = directory
+        self.filename = filename
+        self.size = size
+        self.fields = fields
+        self.created_at = created_at or time.time()
+        self.updated_at = updated_at or self.created_at
+        self.received = [list(r) for r in received or ()]
+        # Range uploads in progress; the session is not finalized or collected meanwhile
+        self.writers = 0
+        self.finalizing = False
+
+    @property
+    def data_path(self) -> Path:
+        return self.directory / "data"
+
+    @property
+    def received_bytes(self) -> int:
+        return sum(end - start for start, end in self.received)
+
+    @property
+    def complete(self) -> bool:
+        return self.received == [[0, self.size]]
+
+    def missing(self) -> list:
+        gaps = []
+        position = 0
+        for start, end in self.received:
+            if start > position:
+                gaps.append([position, start])
+            position = end
+        if position < self.size:
+            gaps.append([position, self.size])
+        return gaps
+
+    def add_range(self, start: int, end: int):
+        """Records [start, end) as received, merging it with the ranges it touches."""
+        merged = []
+        for range_start, range_end in self.received:
+            if range_end < start or range_start > end:
+                merged.append([range_start, range_end])
+            else:
+                start, end = min(start, range_start), max(end, range_end)
+        merged.append([start, end])
+        self.received = sorted(merged)
+
+    def to_dict(self, ttl_seconds: float = None) -> dict:
+        return {
+            "upload_id": self.id,
+            "filename": self.filename,
+            "ticket_number": self.fields.get("ticket_number"),
+            "size": self.size,
+            "received": [list(r) for r in self.received],
+            "received_bytes": self.received_bytes,
+            "missing": self.missing(),
+            "complete": self.complete,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "expires_at": self.updated_at + ttl_seconds if ttl_seconds else None,
+        }
+
+    def save(self):
+        """Writes the session's state next to its data, so it survives a restart."""
+        meta = {
+            "id": self.id,
+            "filename": self.filename,
+            "size": self.size,
+            "fields": self.fields,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "received": self.received,
+        }
+        tmp_path = self.directory / "meta.json.tmp"
+        tmp_path.write_text(json.dumps(meta))
+        os.replace(tmp_path, self.directory / "meta.json")
+
+
+class UploadSessions:
+    """The resumable uploads in progress, one directory per session under root.
+
+    The session file is allocated in full when the session is created, and
+    every range is written at its offset with pwrite, so nothing has to be
+    reassembled. Sessions untouched for ttl_seconds are removed by
+    collect_garbage(). Their state is kept on disk, so sessions continue
+    after a restart.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, ttl_seconds: float):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        for directory in self.root.iterdir():
+            try:
+                meta = json.loads((directory / "meta.json").read_text())
+                session = UploadSession(
+                    meta["id"], directory, meta["filename"], meta["size"], meta["fields"],
+                    meta["created_at"], meta["updated_at"], meta["received"],
+                )
+            except (OSError, ValueError, KeyError) as e:
+                # Also left behind by a restart while a session was being created
+                logger.warning(f"Removing unreadable upload session {directory.name}: {e}")
+                shutil.rmtree(directory, ignore_errors=True)
+                continue
+            self._sessions[session.id] = session
+        if self._sessions:
+            logger.info(f"Resuming {len(self._sessions)} unfinished upload session(s)")
+
+    def create(self, filename: str, size: int, fields: dict) -> UploadSession:
+        """Starts a session for a file of size bytes, allocating its space up front."""
+        filename = upload_filename(filename or "")
+        if not filename:
+            raise UploadError("No filename provided")
+        if not filename.lower().endswith(UPLOAD_SUFFIXES):
+            raise UploadError(f"Only {' and '.join(UPLOAD_SUFFIXES)} files can be analysed")
+        if size < 1:
+            raise UploadError("The upload is empty")
+        if size > self.max_bytes:
+            raise UploadError(f"The upload is larger than {self.max_bytes} bytes", 413)
+        self.collect_garbage()
+
+        session = UploadSession(uuid.uuid4().hex, None, filename, size, fields)
+        session.directory = self.root / session.id
+        session.directory.mkdir()
+        try:
+            fd = os.open(session.data_path, os.O_WRONLY | os.O_CREAT, 0o600)
+            try:
+                # Reserve the space now, so a full volume fails the upload before any data is sent
+                os.posix_fallocate(fd, 0, size)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    raise UploadError(f"Not enough disk space for {size} bytes", 507) from e
+                # Filesystems without fallocate get a sparse file
+                os.ftruncate(fd, size)
+            finally:
+                os.close(fd)
+            session.save()
+        except BaseException:
+            shutil.rmtree(session.directory, ignore_errors=True)
+            raise
+        with self._lock:
+            self._sessions[session.id] = session
+        logger.info(f"Started resumable upload {session.id} for {filename} ({size / 1e6:.1f} MB)")
+        return session
+
+    def get(self, session_id: str) -> UploadSession:
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            raise UploadError(f"Upload session {session_id} not found", 404)
+        return session
+
+    async def receive_range(self, session_id: str, content_range: str, stream) -> UploadSession:
+        """Writes the body stream of a range request at its offset in the session file.
+
+        If the body breaks off, the part that arrived is recorded and only the
+        rest has to be sent again.
+        """
+        session = self.get(session_id)
+        start, end = parse_content_range(content_range, session.size)
+        with self._lock:
+            if self._sessions.get(session.id) is not session:
+                raise UploadError(f"Upload session {session_id} not found", 404)
+            if session.finalizing:
+                raise UploadError("The upload is being finalized", 409)
+            session.writers += 1
+        written = 0
+        fd = None
+        try:
+            fd = os.open(session.data_path, os.O_WRONLY)
+            buffer = bytearray()
+            async for data in stream:
+                if start + written + len(buffer) + len(data) > end:
+                    raise UploadError("The body is longer than its Content-Range")
+                buffer += data
+                if len(buffer) >= UPLOAD_BLOCK:
+                    await run_in_threadpool(_pwrite_all, fd, bytes(buffer), start + written)
+                    written += len(buffer)
+                    buffer.clear()
+            if buffer:
+                await run_in_threadpool(_pwrite_all, fd, bytes(buffer), start + written)
+                written += len(buffer)
+            if start + written != end:
+                raise UploadError(f"The body ended after {written} of {end - start} bytes")
+        finally:
+            if fd is not None:
+                os.close(fd)
+            with self._lock:
+                session.writers -= 1
+                if written:
+                    session.add_range(start, start + written)
+                    session.updated_at = time.time()
+                # Nothing to save if the session was deleted meanwhile
+                current = self._sessions.get(session.id) is session
+            if written and current:
+                try:
+                    await run_in_threadpool(session.save)
+                except OSError as e:
+                    logger.error(f"Could not save the state of upload session {session.id}: {e}")
+        return session
+
+    async def finish(self, session_id: str, dest_dir: Path, sha256: str = None) -> tuple:
+        """Checks that the whole file arrived and moves it into dest_dir (on the same volume).
+
+        The file's SHA-256 must match sha256, if given. After a mismatch every
+        range has to be sent again. Returns (path, SHA-256); the session is gone.
+        """
+        session = self.get(session_id)
+        with self._lock:
+            if session.finalizing:
+                raise UploadError("The upload is already being finalized", 409)
+            if session.writers:
+                raise UploadError("Ranges of the upload are still being written", 409)
+            if not session.complete:
+                missing = session.size - session.received_bytes
+                raise UploadError(f"{missing} byte(s) of the upload have not been received", 409)
+            session.finalizing = True
+        try:
+            digest = await run_in_threadpool(file_sha256, session.data_path)
+            if sha256 and digest != sha256.strip().lower():
+                session.received = []
+                await run_in_threadpool(session.save)
+                raise UploadError(
+                    f"Checksum mismatch: the received file has SHA-256 {digest}; send all of it again", 422
+                )
+            path = dest_dir / session.filename
+            os.replace(session.data_path, path)
+        except BaseException:
+            session.finalizing = False
+            raise
+        self.discard(session.id)
+        return path, digest
+
+    def discard(self, session_id: str) -> bool:
+        """Removes a session and its data. Returns False if there was no such session."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        shutil.rmtree(session.directory, ignore_errors=True)
+        return True
+
+    def collect_garbage(self, now: float = None) -> int:
+        """Removes sessions untouched for ttl_seconds. Returns the number removed."""
+        cutoff = (now or time.time()) - self.ttl_seconds
+        with self._lock:
+            expired = [
+                session for session in self._sessions.values()
+                if session.updated_at < cutoff and not session.writers and not session.finalizing
+            ]
+            for session in expired:
+                del self._sessions[session.id]
+        for session in expired:
+            logger.info(f"Removing abandoned upload session {session.id} ({session.filename}, "
+                        f"{session.received_bytes} of {session.size} bytes received)")
+            shutil.rmtree(session.directory, ignore_errors=True)
+        return len(expired)
+
+
+# --- Zip extraction ---
+class ZipLimits:
+    """Limits that keep a zip bomb from filling the volume."""
+
+    def __init__(self, max_member_bytes: int, max_total_bytes: int, max_ratio: float, ratio_grace_bytes: int = 64 * 1024 * 1024):
+        self.max_member_bytes = max_member_bytes
+        self.max_total_bytes = max_total_bytes
+        self.max_ratio = max_ratio
+        # Small members may compress extremely well (e.g. mostly empty logs)
+        self.ratio_grace_bytes = ratio_grace_bytes
+
+    def check(self, name: str, written: int, compressed: int, total: int):
+        if written > self.max_member_bytes:
+            raise UploadError(f"{name} is larger than {self.max_member_bytes} bytes")
+        if total > self.max_total_bytes:
+            raise UploadError(f"Archive expands to more than {self.max_total_bytes} bytes")
+        if written > self.ratio_grace_bytes and written > self.max_ratio * max(compressed, 1):
+            raise UploadError(f"{name} expands more than {self.max_ratio:g} times")
+
+
+def _member_path(dest_dir: Path, member_name: str) -> Path:
+    """Where a zip member is extracted to; absolute paths and '..' are dropped like ZipFile.extract does."""
+    parts = [part for part in Path(member_name.replace("\\", "/")).parts if part not in ("", ".", "..", "/")]
+    return dest_dir.joinpath(*parts)
+
+
+class ZipExtractor:
+    """Extracts the .evtx members of a zip archive one by one.
+
+    Members are extracted from the end of the archive towards the start, and
+    after each one the archive is truncated to where that member began, so the
+    archive shrinks while its contents are unpacked and disk usage peaks at
+    roughly the archive size rather than archive + contents.
+    """
+
+    def __init__(self, zip_path: Path, dest_dir: Path, limits: ZipLimits):
+        self.zip_path = zip_path
+        self.dest_dir = dest_dir
+        self.limits = limits
+        self.skipped = []
+        self._zip = zipfile.ZipFile(zip_path, "r")
+        self.members = sorted(
+            (m for m in self._zip.infolist() if not m.is_dir() and m.filename.lower().endswith(".evtx")),
+            key=lambda m: m.header_offset,
+            reverse=True,
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._zip.close()
+
+    def extract(self, check_cancelled=None):
+        """Yields (path, SHA-256) for every member as soon as it has been written.
+
+        Members that break a limit or cannot be read (corrupt data, bad CRC)
+        are skipped and listed in .skipped.
+        """
+        total = 0
+        for member in self.members:
+            if check_cancelled is not None:
+                check_cancelled()
+            target = _member_path(self.dest_dir, member.filename)
+            try:
+                # Refuse on the declared sizes before reading anything
+                self.limits.check(member.filename, member.file_size, member.compress_size, total + member.file_size)
+                written, file_hash = self._extract_member(member, target, total, check_cancelled)
+            except (UploadError, zipfile.BadZipFile, zlib.error, EOFError, OSError) as e:
+                logger.error(f"Skipping {member.filename}: {e}")
+                target.unlink(missing_ok=True)
+                self.skipped.append(member.filename)
+                continue
+            finally:
+                # Everything from this member on has been dealt with
+                os.truncate(self.zip_path, member.header_offset)
+            total += written
+            yield target, file_hash
+
+    def _extract_member(self, member, target: Path, total: int, check_cancelled) -> tuple:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        written = 0
+        with self._zip.open(member) as src, target.open("wb") as dst:
+            while True:
+                block = src.read(EXTRACT_BLOCK)
+                if not block:
+                    break
+                written += len(block)
+                # Declared sizes can lie, so the limits are enforced on what is actually written
+                self.limits.check(member.filename, written, member.compress_size, total + written)
+                digest.update(block)
+                dst.write(block)
+                if check_cancelled is not None and written % (64 * EXTRACT_BLOCK) == 0:
+                    check_cancelled()
+        return written, digest.hexdigest()
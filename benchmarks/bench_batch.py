@@ -0,0 +1,109 @@
+# chayabusaw/benchmarks/bench_batch.py
+"""Compares batch mode (one Chainsaw/Hayabusa run per upload) with per-file mode.
+
+Builds a zip of synthetic EVTX files, runs it through the app's upload job in
+both ANALYSIS_MODEs with the stub tools in benchmarks/stubs, and reports the
+wall time of each. STUB_STARTUP_SECONDS sets the simulated rule loading time
+of every tool run.
+
+Usage:
+    python bench_batch.py [--files 20] [--records 500] [--startup 1.0]
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+STUBS_DIR = BENCH_DIR / "stubs"
+
+
+def setup_environment(work_dir: Path, startup: float):
+    """Points the app at temporary directories and the stub tools; must run before importing main."""
+    for name in ("UPLOAD_DIR", "RESULTS_DIR", "JSONL_DIR", "LOG_DIR", "STATE_DIR"):
+        path = work_dir / name.lower()
+        path.mkdir()
+        os.environ[name] = str(path)
+    os.environ["CHAINSAW_BIN"] = str(STUBS_DIR / "chainsaw")
+    os.environ["HAYABUSA_BIN"] = str(STUBS_DIR / "hayabusa")
+    os.environ["STUB_STARTUP_SECONDS"] = str(startup)
+    os.environ["RESULT_CACHE_MAX_GB"] = "0"
+    sys.path.insert(0, str(BENCH_DIR.parent / "app"))
+
+
+def build_zip(path: Path, files: int, records: int):
+    import evtx_synth
+    kinds = [kind for kinds in evtx_synth.EVENT_KINDS.values() for kind in kinds]
+    with tempfile.TemporaryDirectory() as tmp:
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for i in range(files):
+                evtx_path = Path(tmp) / f"Log{i:03d}.evtx"
+                evtx_synth.write_evtx(evtx_path, records, kinds, seed=i)
+                archive.write(evtx_path, f"collection/{evtx_path.name}")
+
+
+def run_upload(main, jobs, zip_path: Path, ticket: str) -> float:
+    session_dir = main.UPLOAD_DIR / ticket
+    session_dir.mkdir()
+    upload_path = session_dir / zip_path.name
+    shutil.copy(zip_path, upload_path)
+    job = jobs.Job(ticket, zip_path.name)
+    start = time.perf_counter()
+    try:
+        main.process_upload(job, session_dir, upload_path)
+    finally:
+        main.remove_session_dir(session_dir)
+    return time.perf_counter() - start
+
+
+def report_summary(results_dir: Path) -> dict:
+    """Detections per stem, to check both modes produce the same layout."""
+    summary = {}
+    for stem_dir in sorted(results_dir.iterdir()):
+        chainsaw = json.loads((stem_dir / f"{stem_dir.name}_chainsaw_report.json").read_text())
+        with open(stem_dir / f"{stem_dir.name}_hayabusa_report.jsonl") as f:
+            hayabusa = sum(1 for _ in f)
+        summary[stem_dir.name] = (len(chainsaw), hayabusa, (stem_dir / "index.html").exists())
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=20, help="EVTX files in the upload")
+    parser.add_argument("--records", type=int, default=500, help="records per EVTX file")
+    parser.add_argument("--startup", type=float, default=1.0, help="simulated rule loading time per tool run (seconds)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        setup_environment(work_dir, args.startup)
+        sys.path.insert(0, str(BENCH_DIR))
+        zip_path = work_dir / "collection.zip"
+        build_zip(zip_path, args.files, args.records)
+
+        import main as app_main
+        import jobs
+        logging.getLogger().setLevel(logging.ERROR)
+        print(f"{args.files} files x {args.records} records, {args.startup:g}s rule loading per tool run, "
+              f"CPU budget {app_main.CPU_BUDGET}")
+        summaries = {}
+        for mode in app_main.ANALYSIS_MODES:
+            app_main.ANALYSIS_MODE = mode
+            elapsed = run_upload(app_main, jobs, zip_path, f"bench-{mode}")
+            summaries[mode] = report_summary(app_main.RESULTS_DIR / f"bench-{mode}")
+            print(f"  {mode:<9} {elapsed:8.2f} s")
+        identical = summaries["per-file"] == summaries["batch"]
+        print(f"  same per-file report layout and detection counts: {identical}")
+        app_main.job_manager.shutdown()
+        app_main.stage_scheduler.shutdown()
+    sys.exit(0 if identical else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# chayabusaw/benchmarks/bench_parser.py
+"""Compares the "xml" and "native" EVTX-to-JSONL parsers.
+
+Runs both parser modes on the same file, reports records/sec for each and
+checks that they wrote byte-identical JSONL. With --processes, the native
+parser is also run chunk-parallel on that many processes.
+
+Usage:
+    python bench_parser.py [FILE.evtx ...] [--records 20000] [--repeat 1] [--processes N ...]
+
+Without files, a synthetic EVTX file with --records records is generated.
+"""
+import argparse
+import filecmp
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "app"))
+
+import evtx_synth  # noqa: E402
+from evtx_jsonl import PARSER_MODES, convert_evtx_to_jsonl  # noqa: E402
+
+
+def run(label: str, evtx_path: Path, output: Path, repeat: int, **kwargs):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stats = convert_evtx_to_jsonl(evtx_path, output, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  {label:<11} {stats['records']:>9} records  {best:8.2f} s  {stats['records'] / best:>10.0f} records/s"
+          f"  (fallbacks: {stats['fallbacks']}, skipped: {stats['skipped']})")
+
+
+def bench_file(evtx_path: Path, work_dir: Path, repeat: int, processes: list, skip_xml: bool) -> bool:
+    outputs = {}
+    print(f"{evtx_path.name} ({evtx_path.stat().st_size / 1e6:.1f} MB)")
+    for mode in PARSER_MODES:
+        if mode == "xml" and skip_xml:
+            continue
+        outputs[mode] = work_dir / f"{evtx_path.stem}_{mode}.jsonl"
+        run(mode, evtx_path, outputs[mode], repeat, mode=mode)
+    for count in processes:
+        label = f"native x{count}"
+        outputs[label] = work_dir / f"{evtx_path.stem}_native_{count}.jsonl"
+        run(label, evtx_path, outputs[label], repeat, mode="native", processes=count)
+
+    identical = all(filecmp.cmp(outputs["native"], output, shallow=False) for output in outputs.values())
+    print(f"  output identical: {identical}")
+    return identical
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", type=Path)
+    parser.add_argument("--records", type=int, default=20000, help="size of the synthetic file if no files are given")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per mode; the best time is reported")
+    parser.add_argument("--processes", type=int, nargs="*", default=[], help="also run the parallel parser with these process counts")
+    parser.add_argument("--skip-xml", action="store_true", help="do not run the (slow) xml parser")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        files = args.files
+        if not files:
+            synthetic = work_dir / "synthetic.evtx"
+            kinds = [kind for kinds in evtx_synth.EVENT_KINDS.values() for kind in kinds]
+            evtx_synth.write_evtx(synthetic, args.records, kinds)
+            files = [synthetic]
+        results = [bench_file(path, work_dir, args.repeat, args.processes, args.skip_xml) for path in files]
+
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+# chayabusaw/benchmarks/bench_suite.py
+"""End-to-end throughput benchmarks of the pipeline, with saved baselines.
+
+Generates a synthetic corpus offline (EVTX files of a chosen size and channel
+mix, a large Chainsaw report and a large results tree), then runs each
+scenario in a fresh process so its memory and CPU figures are its own:
+
+    parse         parse_evtx_to_jsonl over every corpus file
+    mirror        the step-4 JSON-to-JSONL conversion of a Chainsaw report
+    show_results  the results page (/evtx-results) over the results tree
+    upload        a zip of the corpus through POST /evtx until the job is done,
+                  with the stub Chainsaw/Hayabusa binaries in benchmarks/stubs
+
+Each scenario reports its throughput (records, detections or requests per
+second), latency, peak RSS and CPU time. --save writes the results to a
+baseline file; --baseline compares against one and exits with status 1 when a
+figure got worse by more than --tolerance.
+
+Usage:
+    python bench_suite.py [--scenario parse ...] [--files 4] [--records 20000]
+                          [--mix security=6,sysmon=3,powershell=1] [--size-mb 64]
+                          [--save baselines/NAME.json] [--baseline baselines/NAME.json]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+STUBS_DIR = BENCH_DIR / "stubs"
+SCENARIOS = ("parse", "mirror", "show_results", "upload")
+# Figures compared against a baseline, and whether more is better
+COMPARED = {"rate": True, "seconds": False, "p95_ms": False, "peak_rss_mb": False}
+RESULT_PREFIX = "BENCH-RESULT "
+
+
+# --- Corpus ---
+def build_corpus(work_dir: Path, args) -> dict:
+    """Writes everything the scenarios read; returns the spec handed to them."""
+    import evtx_synth
+    kinds, weights = evtx_synth.parse_mix(args.mix)
+    evtx_dir = work_dir / "corpus"
+    evtx_dir.mkdir()
+    max_bytes = int(args.size_mb * 1024 * 1024) if args.size_mb else None
+    # With a size limit, the record count is only an upper bound
+    records = max(args.records, max_bytes or 0)
+    corpus = evtx_synth.write_corpus(evtx_dir, args.files, records, kinds, weights, max_bytes, seed=args.seed)
+
+    zip_path = work_dir / "corpus.zip"
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for path, _ in corpus:
+            archive.write(path, f"collection/{path.name}")
+
+    report_dir = work_dir / "chainsaw"
+    report_dir.mkdir()
+    write_chainsaw_report(report_dir / "Log000_chainsaw_report.json", args.detections)
+
+    results_dir = work_dir / "results_tree"
+    write_results_tree(results_dir, args.tickets, args.files_per_ticket)
+
+    return {
+        "evtx_files": [[str(path), count] for path, count in corpus],
+        "zip": str(zip_path),
+        "report_dir": str(report_dir),
+        "detections": args.detections,
+        "results_dir": str(results_dir),
+        "results": args.tickets * args.files_per_ticket,
+        "requests": args.requests,
+        "processes": args.processes,
+    }
+
+
+def write_chainsaw_report(path: Path, detections: int):
+    """A Chainsaw hunt report with the given number of detections, written as a stream."""
+    with open(path, "w") as f:
+        f.write("[")
+        for i in range(detections):
+            detection = {
+                "group": "Sigma",
+                "kind": "individual",
+                "document": {"kind": "evtx", "path": "C:\\collection\\Log000.evtx", "data": {"Event": {
+                    "System": {"EventID": 4688, "EventRecordID": i + 1, "Computer": "WIN10-00.corp.local",
+                               "Channel": "Security", "TimeCreated_attributes": {"SystemTime": "2024-01-01T00:00:00Z"}},
+                    "EventData": {"CommandLine": f"powershell.exe -enc {i:08x}" * 4, "ParentProcessName": "cmd.exe"},
+                }}},
+                "name": f"Suspicious Encoded PowerShell {i % 50}",
+                "timestamp": "2024-01-01T00:00:00+00:00",
+                "level": ("low", "medium", "high", "critical")[i % 4],
+                "source": "sigma",
+            }
+            f.write(("," if i else "") + json.dumps(detection))
+        f.write("]")
+
+
+def write_results_tree(results_dir: Path, tickets: int, files_per_ticket: int):
+    """A results directory as analyses leave it: every file with its four reports."""
+    dump_line = json.dumps({"EventRecordID": 1, "CommandLine": "cmd.exe /c whoami"}) + "\n"
+    hayabusa_line = json.dumps({"Timestamp": "2024-01-01 00:00:00.000 +00:00", "RuleTitle": "Stub", "Level": "med"}) + "\n"
+    chainsaw = json.dumps([{"name": "Stub", "level": "medium", "timestamp": "2024-01-01T00:00:00+00:00"}] * 3)
+    for ticket in range(tickets):
+        for i in range(files_per_ticket):
+            stem = f"Log{i:03d}"
+            stem_dir = results_dir / f"INC{ticket:06d}" / stem
+            stem_dir.mkdir(parents=True)
+            (stem_dir / f"{stem}_dump.jsonl").write_text(dump_line * 20)
+            (stem_dir / f"{stem}_chainsaw_report.json").write_text(chainsaw)
+            (stem_dir / f"{stem}_hayabusa_report.jsonl").write_text(hayabusa_line * 5)
+            (stem_dir / "index.html").write_text("<html></html>")
+
+
+# --- Scenarios (run in a child process) ---
+def setup_environment(work_dir: Path, args) -> dict:
+    """Environment of a scenario process: temporary app directories and the stub tools."""
+    env = dict(os.environ)
+    for name in ("UPLOAD_DIR", "RESULTS_DIR", "JSONL_DIR", "LOG_DIR", "STATE_DIR", "RESULT_CACHE_DIR"):
+        path = work_dir / name.lower()
+        path.mkdir()
+        env[name] = str(path)
+    env["CHAINSAW_BIN"] = str(STUBS_DIR / "chainsaw")
+    env["HAYABUSA_BIN"] = str(STUBS_DIR / "hayabusa")
+    env["STUB_STARTUP_SECONDS"] = str(args.tool_startup)
+    env["STUB_SECONDS_PER_MB"] = str(args.tool_seconds_per_mb)
+    env["STUB_DETECTIONS"] = str(args.tool_detections)
+    env["RESULT_CACHE_MAX_GB"] = "0"
+    env["PYTHONPATH"] = os.pathsep.join([str(BENCH_DIR.parent / "app"), str(BENCH_DIR)])
+    return env
+
+
+def scenario_parse(main, spec: dict) -> dict:
+    out_dir = Path(main.RESULTS_DIR)
+    records = 0
+    size = 0
+    start = time.perf_counter()
+    for path, count in spec["evtx_files"]:
+        path = Path(path)
+        if not main.parse_evtx_to_jsonl(path, out_dir / f"{path.stem}_dump.jsonl", processes=spec["processes"]):
+            raise RuntimeError(f"Parsing {path.name} failed")
+        records += count
+        size += path.stat().st_size
+    seconds = time.perf_counter() - start
+    return {"unit": "records", "count": records, "seconds": seconds, "mb_per_second": size / 1e6 / seconds}
+
+
+def scenario_mirror(main, spec: dict) -> dict:
+    start = time.perf_counter()
+    main.mirror_to_jsonl_dir(Path(spec["report_dir"]), Path(main.JSONL_DIR) / "bench")
+    seconds = time.perf_counter() - start
+    return {"unit": "detections", "count": spec["detections"], "seconds": seconds}
+
+
+def scenario_show_results(main, spec: dict) -> dict:
+    from fastapi.testclient import TestClient
+    # The tree is read from where the corpus put it; the index starts empty
+    main.RESULTS_DIR = Path(spec["results_dir"])
+    start = time.perf_counter()
+    main.results_index.rebuild(main.RESULTS_DIR)
+    index_seconds = time.perf_counter() - start
+
+    # Without the context manager no startup handlers run, so nothing rebuilds the index again
+    client = TestClient(main.app)
+    pages = max(1, spec["results"] // main.RESULTS_PAGE_SIZE)
+    queries = [{}, {"page": pages // 2}, {"page": pages}, {"q": "INC0000"}, {"q": "Log001", "sort": "ticket"}]
+    latencies = []
+    start = time.perf_counter()
+    for i in range(spec["requests"]):
+        request_start = time.perf_counter()
+        response = client.get("/evtx-results", params=queries[i % len(queries)])
+        latencies.append(time.perf_counter() - request_start)
+        if response.status_code != 200:
+            raise RuntimeError(f"/evtx-results returned {response.status_code}")
+    seconds = time.perf_counter() - start
+    return {"unit": "requests", "count": len(latencies), "seconds": seconds, "index_seconds": index_seconds,
+            **latency_figures(latencies)}
+
+
+def scenario_upload(main, spec: dict) -> dict:
+    from fastapi.testclient import TestClient
+    records = sum(count for _, count in spec["evtx_files"])
+    with TestClient(main.app) as client:
+        start = time.perf_counter()
+        with open(spec["zip"], "rb") as f:
+            response = client.post("/evtx", data={"ticket_number": "BENCH"}, files={"file": ("corpus.zip", f)})
+        accepted = time.perf_counter() - start
+        if response.status_code != 202:
+            raise RuntimeError(f"/evtx returned {response.status_code}: {response.text}")
+        job_id = response.json()["job_id"]
+        while True:
+            job = client.get(f"/jobs/{job_id}").json()
+            if job["status"] in ("completed", "failed", "cancelled"):
+                break
+            time.sleep(0.05)
+        seconds = time.perf_counter() - start
+    if job["status"] != "completed":
+        raise RuntimeError(f"Upload job {job['status']}: {job['error']}")
+    stages = {}
+    for run in job["stages"]:
+        stage = stages.setdefault(run["stage"], {"runs": 0, "seconds": 0.0})
+        stage["runs"] += 1
+        stage["seconds"] += run["seconds"]
+    return {"unit": "records", "count": records, "seconds": seconds, "accepted_ms": accepted * 1000, "stages": stages}
+
+
+def latency_figures(latencies: list) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def run_child(scenario: str, spec_path: Path):
+    """Runs one scenario in this (fresh) process and prints its result as JSON."""
+    spec = json.loads(spec_path.read_text())
+    import main
+    logging.getLogger().setLevel(logging.ERROR)
+    try:
+        result = globals()[f"scenario_{scenario}"](main, spec)
+    finally:
+        main.job_manager.shutdown()
+        main.stage_scheduler.shutdown()
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    result["rate"] = result["count"] / result["seconds"]
+    # ru_maxrss is in kilobytes on Linux
+    result["peak_rss_mb"] = own.ru_maxrss / 1024
+    result["children_peak_rss_mb"] = children.ru_maxrss / 1024
+    result["cpu_seconds"] = own.ru_utime + own.ru_stime
+    result["children_cpu_seconds"] = children.ru_utime + children.ru_stime
+    print(RESULT_PREFIX + json.dumps(result), flush=True)
+
+
+def run_scenario(scenario: str, spec: dict, work_dir: Path, args, attempt: int) -> dict:
+    scenario_dir = work_dir / f"{scenario}-{attempt}"
+    scenario_dir.mkdir()
+    spec_path = scenario_dir / "spec.json"
+    spec_path.write_text(json.dumps(spec))
+    proc = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), "--child", scenario, str(spec_path)],
+        env=setup_environment(scenario_dir, args), capture_output=True, text=True, cwd=scenario_dir,
+    )
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"Scenario {scenario} failed (exit {proc.returncode}):\n{proc.stderr[-4000:]}")
+
+
+# --- Reporting ---
+def print_results(results: dict):
+    print(f"  {'scenario':<13} {'count':>9} {'unit':<10} {'seconds':>8} {'rate/s':>10} {'p50 ms':>8} {'p95 ms':>8}"
+          f" {'RSS MB':>7} {'CPU s':>7}")
+    for scenario, result in results.items():
+        p50 = f"{result['p50_ms']:8.1f}" if "p50_ms" in result else f"{'-':>8}"
+        p95 = f"{result['p95_ms']:8.1f}" if "p95_ms" in result else f"{'-':>8}"
+        cpu = result["cpu_seconds"] + result["children_cpu_seconds"]
+        print(f"  {scenario:<13} {result['count']:>9} {result['unit']:<10} {result['seconds']:8.2f} {result['rate']:10.0f}"
+              f" {p50} {p95} {result['peak_rss_mb']:7.0f} {cpu:7.2f}")
+        if "stages" in result:
+            stages = ", ".join(f"{name} {stage['seconds']:.2f}s/{stage['runs']}" for name, stage in result["stages"].items())
+            print(f"  {'':<13} stages: {stages}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Prints every compared figure next to the baseline; returns the regressions."""
+    if baseline.get("params") != results.get("params"):
+        print("  note: the baseline was made with other parameters, so the figures are not comparable")
+    regressions = []
+    print(f"  {'scenario':<13} {'figure':<12} {'baseline':>10} {'now':>10} {'change':>8}")
+    for scenario, result in results["results"].items():
+        before = baseline.get("results", {}).get(scenario)
+        if before is None:
+            continue
+        for figure, more_is_better in COMPARED.items():
+            if figure not in result or not before.get(figure):
+                continue
+            change = result[figure] / before[figure] - 1
+            worse = -change if more_is_better else change
+            flag = "  REGRESSION" if worse > tolerance else ""
+            if flag:
+                regressions.append(f"{scenario} {figure}")
+            print(f"  {scenario:<13} {figure:<12} {before[figure]:10.1f} {result[figure]:10.1f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        run_child(sys.argv[2], Path(sys.argv[3]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append", help="scenarios to run (repeatable, default: all)")
+    parser.add_argument("--files", type=int, default=4, help="EVTX files in the corpus")
+    parser.add_argument("--records", type=int, default=20000, help="records per EVTX file")
+    parser.add_argument("--size-mb", type=float, help="size of every EVTX file instead of --records")
+    parser.add_argument("--mix", default="security=6,sysmon=3,system=1,powershell=1", help="channel mix of the corpus")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--processes", type=int, default=1, help="parser processes per file in the parse scenario")
+    parser.add_argument("--detections", type=int, default=200000, help="detections in the Chainsaw report to mirror")
+    parser.add_argument("--tickets", type=int, default=1000, help="tickets in the results tree")
+    parser.add_argument("--files-per-ticket", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=200, help="results page requests")
+    parser.add_argument("--tool-startup", type=float, default=0.5, help="stub tools: rule loading time (seconds)")
+    parser.add_argument("--tool-seconds-per-mb", type=float, default=0.05, help="stub tools: scanning time per MB")
+    parser.add_argument("--tool-detections", type=int, default=100, help="stub tools: detections per file")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per scenario; the fastest is kept")
+    parser.add_argument("--save", type=Path, help="write the results to this baseline file")
+    parser.add_argument("--baseline", type=Path, help="compare with this baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    params = {key: value for key, value in vars(args).items()
+              if key not in ("scenario", "repeat", "save", "baseline", "tolerance")}
+    scenarios = args.scenario or list(SCENARIOS)
+    sys.path.insert(0, str(BENCH_DIR))
+    with tempfile.TemporaryDirectory(prefix="bench-suite-") as tmp:
+        work_dir = Path(tmp)
+        start = time.perf_counter()
+        spec = build_corpus(work_dir, args)
+        records = sum(count for _, count in spec["evtx_files"])
+        print(f"Corpus: {args.files} EVTX file(s), {records} records ({args.mix}), {args.detections} detections, "
+              f"{spec['results']} results; built in {time.perf_counter() - start:.1f} s")
+        results = {}
+        for scenario in scenarios:
+            runs = [run_scenario(scenario, spec, work_dir, args, attempt) for attempt in range(args.repeat)]
+            results[scenario] = min(runs, key=lambda result: result["seconds"])
+    print_results(results)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "params": params,
+        "results": results,
+    }
+    regressions = []
+    if args.baseline:
+        print(f"Compared with {args.baseline}:")
+        regressions = compare(report, json.loads(args.baseline.read_text()), args.tolerance)
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Saved baseline to {args.save}")
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
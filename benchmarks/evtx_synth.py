@@ -0,0 +1,461 @@
+# chayabusaw/benchmarks/evtx_synth.py
+"""Synthetic EVTX writer used to produce benchmark corpora offline.
+
+Writes real EVTX files (file header, 64 KB chunks, string and template tables,
+BinXML templates with substitutions) that python-evtx, Chainsaw and Hayabusa
+can all read. Every event kind becomes one template per chunk; later records in
+the chunk reference it, as Windows does.
+
+Usage:
+    python evtx_synth.py OUTPUT.evtx --records 100000 [--seed 1]
+    python evtx_synth.py OUTPUT.evtx --size-mb 256 --mix security=6,sysmon=3,powershell=1
+"""
+import argparse
+import binascii
+import random
+import struct
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+CHUNK_SIZE = 0x10000
+CHUNK_HEADER_SIZE = 0x200
+FILE_HEADER_SIZE = 0x1000
+EVENT_NS = "http://schemas.microsoft.com/win/2004/08/events/event"
+
+# BinXML value types
+T_NULL = 0x00
+T_WSTRING = 0x01
+T_UINT8 = 0x04
+T_UINT16 = 0x06
+T_UINT32 = 0x08
+T_UINT64 = 0x0A
+T_GUID = 0x0F
+T_FILETIME = 0x11
+T_SID = 0x13
+T_HEX64 = 0x15
+
+
+# --- Template description ---
+class Sub:
+    """A substitution slot in a template."""
+
+    def __init__(self, index: int, value_type: int, optional: bool = False):
+        self.index = index
+        self.value_type = value_type
+        self.optional = optional
+
+
+class Element:
+    """A template element: attributes are (name, Sub|str), children are Element|Sub|str."""
+
+    def __init__(self, name: str, attributes=(), children=()):
+        self.name = name
+        self.attributes = list(attributes)
+        self.children = list(children)
+
+
+def filetime(dt: datetime) -> int:
+    return int((dt - datetime(1601, 1, 1, tzinfo=timezone.utc)).total_seconds() * 10_000_000)
+
+
+def encode_value(value_type: int, value) -> bytes:
+    """Encodes a substitution value the way it is stored after the substitution array."""
+    if value is None or value_type == T_NULL:
+        return b""
+    if value_type == T_WSTRING:
+        return (value + "\x00").encode("utf-16-le")
+    if value_type == T_UINT8:
+        return struct.pack("<B", value)
+    if value_type == T_UINT16:
+        return struct.pack("<H", value)
+    if value_type == T_UINT32:
+        return struct.pack("<I", value)
+    if value_type in (T_UINT64, T_HEX64):
+        return struct.pack("<Q", value)
+    if value_type == T_FILETIME:
+        return struct.pack("<Q", filetime(value))
+    if value_type == T_GUID:
+        return value.bytes_le
+    if value_type == T_SID:
+        # value is "S-1-5-21-..."
+        parts = value.split("-")
+        revision, authority, subs = int(parts[1]), int(parts[2]), [int(p) for p in parts[3:]]
+        return struct.pack("<BB", revision, len(subs)) + authority.to_bytes(6, "big") + b"".join(struct.pack("<I", s) for s in subs)
+    raise ValueError(f"Unsupported value type {value_type:#x}")
+
+
+def name_hash(name: str) -> int:
+    h = 0
+    for ch in name:
+        h = (h * 65599 + ord(ch)) & 0xFFFFFFFF
+    return h & 0xFFFF
+
+
+# --- Chunk assembly ---
+class ChunkBuilder:
+    """Accumulates records for one 64 KB chunk."""
+
+    def __init__(self):
+        self.data = bytearray(CHUNK_HEADER_SIZE)
+        self.strings = {}                  # name -> chunk offset
+        self.string_buckets = [0] * 64
+        self.templates = {}                # template key -> chunk offset
+        self.template_buckets = [0] * 32
+        self.first_record = None
+        self.last_record = None
+        self.last_record_offset = 0
+
+    # BinXML encoding; all offsets are chunk-relative, so encoding happens in place
+    def _name(self, out: bytearray, base: int, name: str):
+        """Writes a name reference, defining the string inline the first time it is used."""
+        if name in self.strings:
+            out += struct.pack("<I", self.strings[name])
+            return
+        offset = base + len(out) + 4
+        out += struct.pack("<I", offset)
+        bucket = name_hash(name) % 64
+        out += struct.pack("<IHH", self.string_buckets[bucket], name_hash(name), len(name))
+        out += name.encode("utf-16-le") + b"\x00\x00"
+        self.string_buckets[bucket] = offset
+        self.strings[name] = offset
+
+    def _content(self, out: bytearray, base: int, item):
+        if isinstance(item, Sub):
+            out += struct.pack("<BHB", 0x0E if item.optional else 0x0D, item.index, item.value_type)
+        elif isinstance(item, str):
+            out += struct.pack("<BBH", 0x05, T_WSTRING, len(item)) + item.encode("utf-16-le")
+        else:
+            self._element(out, base, item)
+
+    def _element(self, out: bytearray, base: int, element: Element):
+        start = len(out)
+        out += struct.pack("<BHI", 0x41 if element.attributes else 0x01, 0xFFFF, 0)
+        self._name(out, base, element.name)
+        if element.attributes:
+            attr_list_pos = len(out)
+            out += b"\x00\x00\x00\x00"
+            for i, (attr_name, attr_value) in enumerate(element.attributes):
+                more = i < len(element.attributes) - 1
+                out += struct.pack("<B", 0x46 if more else 0x06)
+                self._name(out, base, attr_name)
+                self._content(out, base, attr_value)
+            struct.pack_into("<I", out, attr_list_pos, len(out) - attr_list_pos - 4)
+        if element.children:
+            out += b"\x02"
+            for child in element.children:
+                self._content(out, base, child)
+            out += b"\x04"
+        else:
+            out += b"\x03"
+        # Data size covers everything after the size field itself
+        struct.pack_into("<I", out, start + 3, len(out) - start - 7)
+
+    def _template_instance(self, out: bytearray, base: int, key, guid: uuid.UUID, root: Element):
+        template_id = struct.unpack_from("<I", guid.bytes_le)[0]
+        if key in self.templates:
+            out += struct.pack("<BBII", 0x0C, 0x01, template_id, self.templates[key])
+            return
+        template_offset = base + len(out) + 10
+        out += struct.pack("<BBII", 0x0C, 0x01, template_id, template_offset)
+        bucket = template_id % 32
+        header_pos = len(out)
+        out += struct.pack("<I", self.template_buckets[bucket]) + guid.bytes_le + b"\x00\x00\x00\x00"
+        body_start = len(out)
+        out += b"\x0f\x01\x01\x00"
+        self._element(out, base, root)
+        out += b"\x00"
+        struct.pack_into("<I", out, header_pos + 20, len(out) - body_start)
+        self.template_buckets[bucket] = template_offset
+        self.templates[key] = template_offset
+
+    def add_record(self, record_number: int, timestamp: datetime, kind, values: list) -> bool:
+        """Appends a record; returns False (leaving the chunk untouched) if it does not fit."""
+        snapshot = (dict(self.strings), list(self.string_buckets), dict(self.templates), list(self.template_buckets))
+        base = len(self.data)
+        out = bytearray(struct.pack("<IIQQ", 0x2A2A, 0, record_number, filetime(timestamp)))
+        out += b"\x0f\x01\x01\x00"
+        self._template_instance(out, base, kind.key, kind.guid, kind.root)
+        encoded = [encode_value(value_type, value) for value_type, value in zip(kind.types, values)]
+        out += struct.pack("<I", len(encoded))
+        for value_type, data in zip(kind.types, encoded):
+            out += struct.pack("<HBB", len(data), value_type if data else T_NULL, 0)
+        for data in encoded:
+            out += data
+        size = len(out) + 4
+        out += struct.pack("<I", size)
+        struct.pack_into("<I", out, 4, size)
+
+        if base + len(out) > CHUNK_SIZE:
+            self.strings, self.string_buckets, self.templates, self.template_buckets = snapshot
+            return False
+        self.data += out
+        self.last_record_offset = base
+        if self.first_record is None:
+            self.first_record = record_number
+        self.last_record = record_number
+        return True
+
+    def finish(self) -> bytes:
+        data = self.data
+        next_record_offset = len(data)
+        data += b"\x00" * (CHUNK_SIZE - len(data))
+        struct.pack_into("<8sQQQQIIII", data, 0, b"ElfChnk\x00",
+                         self.first_record, self.last_record, self.first_record, self.last_record,
+                         0x80, self.last_record_offset, next_record_offset,
+                         binascii.crc32(bytes(data[CHUNK_HEADER_SIZE:next_record_offset])) & 0xFFFFFFFF)
+        struct.pack_into("<64I", data, 0x80, *self.string_buckets)
+        struct.pack_into("<32I", data, 0x180, *self.template_buckets)
+        header_checksum = binascii.crc32(bytes(data[0:0x78]) + bytes(data[0x80:0x200])) & 0xFFFFFFFF
+        struct.pack_into("<I", data, 0x7C, header_checksum)
+        return bytes(data)
+
+
+def file_header(chunk_count: int, next_record_number: int) -> bytes:
+    header = bytearray(FILE_HEADER_SIZE)
+    struct.pack_into("<8sQQQIHHHH", header, 0, b"ElfFile\x00", 0, max(0, chunk_count - 1),
+                     next_record_number, 0x80, 1, 3, FILE_HEADER_SIZE, chunk_count)
+    struct.pack_into("<I", header, 0x7C, binascii.crc32(bytes(header[0:0x78])) & 0xFFFFFFFF)
+    return bytes(header)
+
+
+# --- Event kinds ---
+SYSTEM_TYPES = [T_WSTRING, T_GUID, T_UINT16, T_UINT8, T_UINT8, T_UINT16, T_UINT8, T_HEX64,
+                T_FILETIME, T_UINT64, T_UINT32, T_UINT32, T_WSTRING, T_WSTRING, T_SID]
+
+
+def system_element() -> Element:
+    """The <System> block shared by every event; uses substitutions 0-14."""
+    return Element("System", children=[
+        Element("Provider", [("Name", Sub(0, T_WSTRING, True)), ("Guid", Sub(1, T_GUID, True))]),
+        Element("EventID", children=[Sub(2, T_UINT16)]),
+        Element("Version", children=[Sub(3, T_UINT8)]),
+        Element("Level", children=[Sub(4, T_UINT8)]),
+        Element("Task", children=[Sub(5, T_UINT16)]),
+        Element("Opcode", children=[Sub(6, T_UINT8)]),
+        Element("Keywords", children=[Sub(7, T_HEX64)]),
+        Element("TimeCreated", [("SystemTime", Sub(8, T_FILETIME, True))]),
+        Element("EventRecordID", children=[Sub(9, T_UINT64)]),
+        Element("Correlation"),
+        Element("Execution", [("ProcessID", Sub(10, T_UINT32)), ("ThreadID", Sub(11, T_UINT32))]),
+        Element("Channel", children=[Sub(12, T_WSTRING)]),
+        Element("Computer", children=[Sub(13, T_WSTRING)]),
+        Element("Security", [("UserID", Sub(14, T_SID, True))]),
+    ])
+
+
+class EventKind:
+    """One event type: a template plus generators for its EventData values."""
+
+    def __init__(self, provider: str, channel: str, event_id: int, fields: list, user_data: str = None):
+        self.provider = provider
+        self.provider_guid = uuid.uuid5(uuid.NAMESPACE_URL, provider)
+        self.channel = channel
+        self.event_id = event_id
+        self.fields = fields
+        self.key = (provider, event_id)
+        self.guid = uuid.uuid5(uuid.NAMESPACE_URL, f"{provider}/{event_id}")
+        self.types = SYSTEM_TYPES + [T_WSTRING] * len(fields)
+        first = len(SYSTEM_TYPES)
+        if user_data:
+            # Events without <EventData>, e.g. log-cleared records
+            payload = Element("UserData", children=[Element(user_data, children=[
+                Element(name, children=[Sub(first + i, T_WSTRING)]) for i, (name, _) in enumerate(fields)
+            ])])
+        else:
+            payload = Element("EventData", children=[
+                Element("Data", [("Name", name)], [Sub(first + i, T_WSTRING)]) for i, (name, _) in enumerate(fields)
+            ])
+        self.root = Element("Event", [("xmlns", EVENT_NS)], [system_element(), payload])
+
+    def values(self, rng: random.Random, record_number: int, timestamp: datetime, computer: str) -> list:
+        system = [self.provider, self.provider_guid, self.event_id, 0, 0, 0, 0, 0x8020000000000000,
+                  timestamp, record_number, rng.randint(4, 9000), rng.randint(4, 9000), self.channel, computer, None]
+        return system + [generate(rng) for _, generate in self.fields]
+
+
+def _user(rng):
+    return rng.choice(["SYSTEM", "Administrator", "jdoe", "asmith", "svc_backup", "WIN10-01$", "DWM-1"])
+
+
+def _sid(rng):
+    return f"S-1-5-21-{rng.randint(1000000, 4000000000)}-{rng.randint(1000000, 4000000000)}-{rng.randint(1000, 9999)}"
+
+
+def _hex(rng):
+    return f"0x{rng.getrandbits(32):x}"
+
+
+def _ip(rng):
+    return f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+
+
+def _image(rng):
+    return rng.choice([r"C:\Windows\System32\svchost.exe", r"C:\Windows\System32\cmd.exe",
+                       r"C:\Windows\System32\WindowsPowerShell\v1.0\powershell.exe",
+                       r"C:\Program Files\Mozilla Firefox\firefox.exe", r"C:\Windows\explorer.exe"])
+
+
+def _command_line(rng):
+    return f"{_image(rng)} -NoProfile -Command \"Get-Process | Where-Object {{ $_.Id -eq {rng.randint(1, 65535)} }}\""
+
+
+def _script(rng):
+    return "\r\n".join(f"$v{i} = Get-Item 'HKLM:\\Software\\Key{rng.randint(0, 999)}' # <&> \u00e9" for i in range(rng.randint(1, 8)))
+
+
+EVENT_KINDS = {
+    "security": [
+        EventKind("Microsoft-Windows-Security-Auditing", "Security", 4624, [
+            ("SubjectUserSid", lambda r: "S-1-5-18"), ("SubjectUserName", _user), ("SubjectDomainName", lambda r: "CORP"),
+            ("SubjectLogonId", _hex), ("TargetUserSid", _sid), ("TargetUserName", _user), ("TargetDomainName", lambda r: "CORP"),
+            ("TargetLogonId", _hex), ("LogonType", lambda r: str(r.choice([2, 3, 5, 10]))), ("LogonProcessName", lambda r: "User32 "),
+            ("AuthenticationPackageName", lambda r: "Negotiate"), ("WorkstationName", lambda r: "WIN10-01"),
+            ("LogonGuid", lambda r: "{" + str(uuid.UUID(int=r.getrandbits(128))) + "}"), ("TransmittedServices", lambda r: "-"),
+            ("LmPackageName", lambda r: "-"), ("KeyLength", lambda r: "0"), ("ProcessId", _hex), ("ProcessName", _image),
+            ("IpAddress", _ip), ("IpPort", lambda r: str(r.randint(1024, 65535))), ("ImpersonationLevel", lambda r: "%%1833"),
+        ]),
+        EventKind("Microsoft-Windows-Security-Auditing", "Security", 4688, [
+            ("SubjectUserSid", _sid), ("SubjectUserName", _user), ("SubjectDomainName", lambda r: "CORP"), ("SubjectLogonId", _hex),
+            ("NewProcessId", _hex), ("NewProcessName", _image), ("TokenElevationType", lambda r: "%%1936"), ("ProcessId", _hex),
+            ("CommandLine", _command_line), ("TargetUserSid", lambda r: "S-1-0-0"), ("TargetUserName", lambda r: "-"),
+            ("TargetDomainName", lambda r: "-"), ("TargetLogonId", lambda r: "0x0"), ("ParentProcessName", _image),
+            ("MandatoryLabel", lambda r: "S-1-16-12288"),
+        ]),
+        EventKind("Microsoft-Windows-Eventlog", "Security", 1102, [
+            ("SubjectUserSid", _sid), ("SubjectUserName", _user), ("SubjectDomainName", lambda r: "CORP"), ("SubjectLogonId", _hex),
+        ], user_data="LogFileCleared"),
+    ],
+    "system": [
+        EventKind("Service Control Manager", "System", 7045, [
+            ("ServiceName", lambda r: f"svc{r.randint(0, 500)}"), ("ImagePath", _command_line), ("ServiceType", lambda r: "user mode service"),
+            ("StartType", lambda r: "demand start"), ("AccountName", lambda r: "LocalSystem"),
+        ]),
+        EventKind("Service Control Manager", "System", 7036, [
+            ("param1", lambda r: f"svc{r.randint(0, 500)}"), ("param2", lambda r: r.choice(["running", "stopped"])),
+        ]),
+    ],
+    "sysmon": [
+        EventKind("Microsoft-Windows-Sysmon", "Microsoft-Windows-Sysmon/Operational", 1, [
+            ("RuleName", lambda r: "-"), ("UtcTime", lambda r: "2024-01-01 00:00:00.000"),
+            ("ProcessGuid", lambda r: "{" + str(uuid.UUID(int=r.getrandbits(128))) + "}"), ("ProcessId", lambda r: str(r.randint(4, 9000))),
+            ("Image", _image), ("FileVersion", lambda r: "10.0.19041.1"), ("Description", lambda r: "Windows Command Processor"),
+            ("Product", lambda r: "Microsoft\u00ae Windows\u00ae Operating System"), ("Company", lambda r: "Microsoft Corporation"),
+            ("OriginalFileName", lambda r: "Cmd.Exe"), ("CommandLine", _command_line), ("CurrentDirectory", lambda r: "C:\\Windows\\system32\\"),
+            ("User", lambda r: f"CORP\\{_user(r)}"), ("LogonGuid", lambda r: "{" + str(uuid.UUID(int=r.getrandbits(128))) + "}"),
+            ("LogonId", _hex), ("TerminalSessionId", lambda r: "1"), ("IntegrityLevel", lambda r: "High"),
+            ("Hashes", lambda r: f"SHA256={r.getrandbits(256):064X}"), ("ParentProcessGuid", lambda r: "{" + str(uuid.UUID(int=r.getrandbits(128))) + "}"),
+            ("ParentProcessId", lambda r: str(r.randint(4, 9000))), ("ParentImage", _image), ("ParentCommandLine", _command_line),
+            ("ParentUser", lambda r: "NT AUTHORITY\\SYSTEM"),
+        ]),
+        EventKind("Microsoft-Windows-Sysmon", "Microsoft-Windows-Sysmon/Operational", 3, [
+            ("RuleName", lambda r: "-"), ("UtcTime", lambda r: "2024-01-01 00:00:00.000"), ("Image", _image),
+            ("Protocol", lambda r: "tcp"), ("SourceIp", _ip), ("SourcePort", lambda r: str(r.randint(1024, 65535))),
+            ("DestinationIp", _ip), ("DestinationPort", lambda r: str(r.choice([80, 443, 445, 3389]))),
+        ]),
+    ],
+    "powershell": [
+        EventKind("Microsoft-Windows-PowerShell", "Microsoft-Windows-PowerShell/Operational", 4104, [
+            ("MessageNumber", lambda r: "1"), ("MessageTotal", lambda r: "1"), ("ScriptBlockText", _script),
+            ("ScriptBlockId", lambda r: str(uuid.UUID(int=r.getrandbits(128)))), ("Path", lambda r: ""),
+        ]),
+    ],
+}
+
+
+def parse_mix(mix: str) -> tuple:
+    """Event kinds and their weights for a channel mix such as "security=6,sysmon=3,system=1".
+
+    A channel's share is split evenly between its event kinds; a channel
+    without a share counts as 1.
+    """
+    kinds = []
+    weights = []
+    for part in mix.split(","):
+        channel, _, share = part.partition("=")
+        channel = channel.strip()
+        if channel not in EVENT_KINDS:
+            raise ValueError(f"Unknown channel '{channel}', expected one of {sorted(EVENT_KINDS)}")
+        for kind in EVENT_KINDS[channel]:
+            kinds.append(kind)
+            weights.append(float(share or 1) / len(EVENT_KINDS[channel]))
+    return kinds, weights
+
+
+def write_evtx(path, records: int, kinds: list, seed: int = 1, computer: str = "WIN10-01.corp.local",
+               start: datetime = datetime(2024, 1, 1, tzinfo=timezone.utc), interval_seconds: float = 1.0,
+               weights: list = None, max_bytes: int = None) -> tuple:
+    """Writes an EVTX file with up to the given number of records drawn from kinds.
+
+    weights makes some kinds more frequent than others (see parse_mix). With
+    max_bytes, writing stops at the last full chunk that keeps the file within
+    that size. Returns (chunks, records) written.
+    """
+    rng = random.Random(seed)
+    chunks = []
+    chunk = ChunkBuilder()
+    written = 0
+    for record_number in range(1, records + 1):
+        kind = rng.choices(kinds, weights)[0] if weights else rng.choice(kinds)
+        timestamp = start + timedelta(seconds=interval_seconds * (record_number - 1))
+        values = kind.values(rng, record_number, timestamp, computer)
+        if not chunk.add_record(record_number, timestamp, kind, values):
+            chunks.append(chunk.finish())
+            chunk = ChunkBuilder()
+            if max_bytes is not None and FILE_HEADER_SIZE + (len(chunks) + 1) * CHUNK_SIZE > max_bytes:
+                break
+            if not chunk.add_record(record_number, timestamp, kind, values):
+                raise ValueError("Record does not fit into an empty chunk")
+        written = record_number
+    if chunk.first_record is not None:
+        chunks.append(chunk.finish())
+
+    with open(path, "wb") as f:
+        f.write(file_header(len(chunks), written + 1))
+        for data in chunks:
+            f.write(data)
+    return len(chunks), written
+
+
+def write_corpus(directory, files: int, records: int, kinds: list, weights: list = None, max_bytes: int = None,
+                 seed: int = 1) -> list:
+    """Writes files EVTX files (Log000.evtx, ...) into directory, each from its own seed and host.
+
+    Returns [(path, records)].
+    """
+    corpus = []
+    for i in range(files):
+        path = Path(directory) / f"Log{i:03d}.evtx"
+        _, written = write_evtx(path, records, kinds, seed=seed + i, computer=f"WIN10-{i:02d}.corp.local",
+                                weights=weights, max_bytes=max_bytes)
+        corpus.append((path, written))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic EVTX file")
+    parser.add_argument("output")
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--size-mb", type=float, help="Stop at this file size instead (with --records as the upper bound)")
+    parser.add_argument("--channel", choices=sorted(EVENT_KINDS), action="append",
+                        help="Event kinds to draw from (repeatable, default: all)")
+    parser.add_argument("--mix", help="Weighted channels instead, e.g. security=6,sysmon=3,powershell=1")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    weights = None
+    if args.mix:
+        kinds, weights = parse_mix(args.mix)
+    else:
+        kinds = [kind for channel in (args.channel or sorted(EVENT_KINDS)) for kind in EVENT_KINDS[channel]]
+    records = args.records
+    max_bytes = None
+    if args.size_mb:
+        max_bytes = int(args.size_mb * 1024 * 1024)
+        records = max(records, max_bytes)  # far more than fit, so the size decides
+    chunk_count, written = write_evtx(args.output, records, kinds, seed=args.seed, weights=weights, max_bytes=max_bytes)
+    print(f"Wrote {written} records in {chunk_count} chunks to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
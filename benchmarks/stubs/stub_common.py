@@ -0,0 +1,19 @@
+# chayabusaw/benchmarks/stubs/stub_common.py
+"""Shared helpers of the stub Chainsaw and Hayabusa binaries."""
+import os
+import time
+from pathlib import Path
+
+
+def evtx_targets(target: Path) -> list:
+    if target.is_dir():
+        return sorted(p for p in target.rglob("*") if p.suffix.lower() == ".evtx")
+    return [target]
+
+
+def simulate_work(files: list):
+    """Sleeps for the simulated rule loading plus the per-MB scanning time."""
+    startup = float(os.environ.get("STUB_STARTUP_SECONDS", "1.0"))
+    per_mb = float(os.environ.get("STUB_SECONDS_PER_MB", "0.05"))
+    size_mb = sum(p.stat().st_size for p in files) / (1024 * 1024)
+    time.sleep(startup + per_mb * size_mb)
@@ -1,18 +1,24 @@
 #!/bin/sh
 set -e
 
+# Rule directories are synced incrementally: rulesync.py keeps a manifest per
+# destination (in $STATE_DIR), only copies added or changed files and prunes
+# files that were removed from their source. Files the user added to or edited
+# in the custom rule volumes are never overwritten or removed.
+RULESYNC="python3 /app/rulesync.py"
+
 # 1: Sigma Merge default in, but don’t overwrite any custom rules
-cp -Rn /opt/sigma/default/rules/* /opt/sigma/custom/rules/
+$RULESYNC merge /opt/sigma/default/rules /opt/sigma/custom/rules
 
 # 2: Expose a unified view at /sigma
-mkdir -p /sigma
-# cp -a /opt/sigma/custom/rules /sigma
-cp -r --no-preserve=mode,ownership /opt/sigma/custom/rules /sigma
-# cp -an /opt/sigma/default/rules/* /sigma/
-cp -rn --no-preserve=mode,ownership /opt/sigma/default/rules/* /sigma/
+#    (custom rules, which now include the defaults, win over the defaults)
+$RULESYNC mirror /opt/sigma/custom/rules /sigma
 
 # 3: Chainsaw: merge default -> /chainsaw-rules
 #    (host volume at /chainsaw-rules can override/add)
-cp -Rn /opt/chainsaw/rules/* /chainsaw-rules/
+$RULESYNC merge /opt/chainsaw/rules /chainsaw-rules
+
+# 4: Record the rule-set version, reported by the app and used to key cached results
+$RULESYNC version --output "${RULES_VERSION_FILE:-/var/lib/chayabusaw/rules_version.json}" /sigma /chainsaw-rules
 
-exec "$@"
\ No newline at end of file
+exec "$@"
@@ -0,0 +1,72 @@
+# chayabusaw/tests/conftest.py
+"""Shared fixtures: synthetic EVTX files and the app, pointed at temporary directories.
+
+The app reads its configuration when main is imported, so the environment is
+set up here, before any test module imports it. Chainsaw and Hayabusa are the
+stub binaries in benchmarks/stubs.
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+import evtx_synth
+
+STUBS_DIR = Path(__file__).resolve().parent.parent / "benchmarks" / "stubs"
+
+_work_dir = Path(tempfile.mkdtemp(prefix="chayabusaw-tests-"))
+for _name in ("UPLOAD_DIR", "RESULTS_DIR", "JSONL_DIR", "LOG_DIR", "STATE_DIR", "RESULT_CACHE_DIR"):
+    (_work_dir / _name.lower()).mkdir()
+    os.environ[_name] = str(_work_dir / _name.lower())
+os.environ["CHAINSAW_BIN"] = str(STUBS_DIR / "chainsaw")
+os.environ["HAYABUSA_BIN"] = str(STUBS_DIR / "hayabusa")
+os.environ["STUB_STARTUP_SECONDS"] = "0"
+os.environ["STUB_SECONDS_PER_MB"] = "0"
+os.environ["RESULT_CACHE_MAX_GB"] = "0"
+os.environ["CPU_BUDGET"] = "4"
+
+# Every event kind of the generator, evenly mixed
+KINDS = [kind for kinds in evtx_synth.EVENT_KINDS.values() for kind in kinds]
+
+
+@pytest.fixture
+def synthetic_evtx(tmp_path):
+    """Factory writing a synthetic EVTX file into tmp_path; returns its path."""
+    def write(name: str = "Security.evtx", records: int = 300, seed: int = 1, **kwargs) -> Path:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        evtx_synth.write_evtx(path, records, KINDS, seed=seed, **kwargs)
+        return path
+    return write
+
+
+@pytest.fixture(scope="session")
+def main():
+    import main as app_main
+    yield app_main
+    app_main.job_manager.shutdown()
+    app_main.stage_scheduler.shutdown()
+
+
+@pytest.fixture
+def client(main):
+    from fastapi.testclient import TestClient
+    # Not entered as a context manager: the shutdown handlers would stop the app's shared job pool
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def wait_for_job(client):
+    """Polls GET /jobs/{id} until the job has finished; returns its last status."""
+    def wait(job_id: str, timeout: float = 60) -> dict:
+        deadline = time.monotonic() + timeout
+        while True:
+            job = client.get(f"/jobs/{job_id}").json()
+            if job["status"] in ("completed", "failed", "cancelled"):
+                return job
+            if time.monotonic() > deadline:
+                raise AssertionError(f"Job {job_id} did not finish within {timeout} s: {job}")
+            time.sleep(0.05)
+    return wait
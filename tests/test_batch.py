@@ -0,0 +1,68 @@
+# chayabusaw/tests/test_batch.py
+import json
+
+import pytest
+
+from batch import split_chainsaw_report, split_hayabusa_jsonl
+
+
+@pytest.fixture
+def evtx_files(tmp_path):
+    files = [tmp_path / "upload" / "host1" / "Security.evtx", tmp_path / "upload" / "host2" / "Security.evtx",
+             tmp_path / "upload" / "System.evtx"]
+    for path in files:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+    return files
+
+
+def test_split_chainsaw_report(tmp_path, evtx_files):
+    host1, host2, system = evtx_files
+    report = tmp_path / "batch.json"
+    report.write_text(json.dumps([
+        {"name": "one", "document": {"path": str(host1)}},
+        {"name": "two", "document": {"path": str(host2)}},
+        # Only the name is known, and it is unique
+        {"name": "by name", "document": {"path": "C:\\collection\\System.evtx"}},
+        # Ambiguous by name, and unknown
+        {"name": "ambiguous", "document": {"path": "/elsewhere/Security.evtx"}},
+        {"name": "unknown", "document": {}},
+        {"name": "aggregate", "documents": [{"path": str(host1)}, {"path": str(system)}, {"path": str(host1)}]},
+    ]))
+    outputs = {evtx_file: tmp_path / f"out{i}.json" for i, evtx_file in enumerate(evtx_files)}
+
+    assert split_chainsaw_report(report, outputs) == 2
+    reports = {evtx_file: json.loads(path.read_text()) for evtx_file, path in outputs.items()}
+    assert [d["name"] for d in reports[host1]] == ["one", "aggregate"]
+    assert reports[host1][1]["documents"] == [{"path": str(host1)}, {"path": str(host1)}]
+    assert [d["name"] for d in reports[host2]] == ["two"]
+    assert [d["name"] for d in reports[system]] == ["by name", "aggregate"]
+    assert reports[system][1]["documents"] == [{"path": str(system)}]
+
+
+def test_every_file_gets_a_chainsaw_report(tmp_path, evtx_files):
+    report = tmp_path / "batch.json"
+    report.write_text("[]")
+    outputs = {evtx_file: tmp_path / f"out{i}.json" for i, evtx_file in enumerate(evtx_files)}
+    assert split_chainsaw_report(report, outputs) == 0
+    assert all(json.loads(path.read_text()) == [] for path in outputs.values())
+
+
+def test_split_hayabusa_jsonl(tmp_path, evtx_files):
+    host1, host2, system = evtx_files
+    report = tmp_path / "batch.jsonl"
+    lines = [
+        {"RuleTitle": "one", "EvtxFile": str(host1)},
+        {"RuleTitle": "two", "EvtxFile": str(host2)},
+        {"RuleTitle": "three", "EvtxFile": str(system)},
+        {"RuleTitle": "unknown"},
+    ]
+    report.write_text("\n".join(json.dumps(line) for line in lines) + "\n\nnot json")
+    outputs = {evtx_file: tmp_path / f"out{i}.jsonl" for i, evtx_file in enumerate(evtx_files)}
+
+    assert split_hayabusa_jsonl(report, outputs) == 2
+    titles = {
+        evtx_file: [json.loads(line)["RuleTitle"] for line in path.read_text().splitlines()]
+        for evtx_file, path in outputs.items()
+    }
+    assert titles == {host1: ["one"], host2: ["two"], system: ["three"]}
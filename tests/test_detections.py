@@ -0,0 +1,106 @@
+# chayabusaw/tests/test_detections.py
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from detections import DetectionStore, parse_timestamp
+
+NEW_YEAR = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+def chainsaw_detection(name: str, event_id: int, computer: str = "WIN10-01", level: str = "high") -> dict:
+    system = {"EventID": event_id, "Channel": "Security", "Computer": computer, "EventRecordID": 7}
+    return {
+        "name": name,
+        "level": level,
+        "timestamp": "2024-01-01T10:00:00.123456789Z",
+        "document": {"path": "Security.evtx", "data": {"Event": {"System": system, "EventData": {"User": "alice"}}}},
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DetectionStore(tmp_path / "detections.db")
+
+
+@pytest.fixture
+def reports(tmp_path):
+    stem_dir = tmp_path / "results" / "T1" / "Security"
+    stem_dir.mkdir(parents=True)
+    chainsaw = stem_dir / "Security_chainsaw_report.json"
+    chainsaw.write_text(json.dumps([
+        chainsaw_detection("Mimikatz Logon", 4624),
+        chainsaw_detection("Suspicious Process", 4688, computer="WIN10-02", level="medium"),
+        {"name": "Brute Force", "level": "low", "timestamp": "2024-01-01T11:00:00Z",
+         "documents": [{"data": {"Event": {"System": {"EventID": 4625}}}}] * 3},
+    ]))
+    hayabusa = stem_dir / "Security_hayabusa_report.jsonl"
+    hayabusa.write_text("\n".join(json.dumps(line) for line in [
+        {"RuleTitle": "Logon Failure", "Level": "med", "Timestamp": "2024-01-01 12:00:00.000 +01:00",
+         "Computer": "WIN10-01", "Channel": "Sec", "EventID": 4625, "RecordID": 9, "Details": {"User": "bob"}},
+        {"RuleTitle": "Log Cleared", "Level": "crit", "Timestamp": "2024-01-02 00:00:00.000 +00:00",
+         "Computer": "WIN10-01", "Channel": "Sec", "EventID": 1102, "RecordID": 10},
+    ]) + "\nnot json\n")
+    return chainsaw, hayabusa
+
+
+def test_parse_timestamp():
+    assert parse_timestamp("2024-01-01T00:00:00Z") == NEW_YEAR
+    assert parse_timestamp("2024-01-01T00:00:00.123456789Z") == pytest.approx(NEW_YEAR + 0.123456)
+    assert parse_timestamp("2024-01-01 01:00:00.000 +01:00") == NEW_YEAR
+    assert parse_timestamp("2024-01-01 00:00:00") == NEW_YEAR
+    assert parse_timestamp("yesterday") is None
+    assert parse_timestamp(None) is None
+
+
+def test_ingest_and_search(store, reports):
+    assert store.ingest("T1", "Security", *reports) == 7
+
+    result = store.search({"ticket": "T1"})
+    assert result["total"] == 7 and result["total_exact"]
+    assert store.search({"rule": "Brute Force"})["total"] == 3
+    assert store.search({"levels": ["critical", "medium"]})["total"] == 3
+    assert store.search({"event_ids": [4625]})["total"] == 4
+    assert store.search({"computer": "win10-02"})["total"] == 1
+    assert store.search({"source": "hayabusa", "since": NEW_YEAR + 86400})["detections"][0]["rule"] == "Log Cleared"
+    assert store.search({"q": "mimi"})["detections"][0]["rule"] == "Mimikatz Logon"
+    assert store.search({"q": "alice"})["total"] == 2
+
+    page = store.search({}, offset=2, limit=2)["detections"]
+    newest_first = [d["ts"] for d in store.search({})["detections"]]
+    assert [d["ts"] for d in page] == newest_first[2:4]
+    assert newest_first == sorted(newest_first, reverse=True)
+
+
+def test_summary(store, reports):
+    store.ingest("T1", "Security", *reports)
+    by_level = {row["value"]: row["count"] for row in store.summary("level", {})}
+    assert by_level == {"high": 1, "medium": 2, "low": 3, "critical": 1}
+    with pytest.raises(ValueError):
+        store.summary("details; DROP TABLE detections", {})
+
+
+def test_ingest_replaces_and_remove(store, reports):
+    chainsaw, hayabusa = reports
+    store.ingest("T1", "Security", chainsaw, hayabusa)
+    assert store.ingest("T1", "Security", None, hayabusa) == 2
+    assert store.search({"ticket": "T1"})["total"] == 2
+    store.ingest("T2", "Security", chainsaw)
+    store.remove_stem("T1", "Security")
+    assert store.search({"ticket": "T1"})["total"] == 0
+    store.remove_ticket("T2")
+    assert store.search({})["total"] == 0
+
+
+def test_rebuild(store, reports, tmp_path):
+    assert store.rebuild(tmp_path / "results") == 7
+    assert store.summary("ticket", {})[0]["value"] == "T1"
+
+
+def test_close_checkpoints_the_log(store, reports, tmp_path):
+    store.ingest("T1", "Security", *reports)
+    store.close()
+    wal = tmp_path / "detections.db-wal"
+    assert not wal.exists() or wal.stat().st_size == 0
+    assert store.search({"ticket": "T1"})["total"] == 7
@@ -0,0 +1,100 @@
+# chayabusaw/tests/test_eventfilter.py
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from eventfilter import EventFilter, filter_chainsaw_report, to_filetime
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+def document(event_id, channel, path: str = "C:\\logs\\Security.evtx") -> dict:
+    system = {"EventID": event_id, "Channel": channel, "Computer": "WIN10-01"}
+    return {"kind": "evtx", "path": path, "data": {"Event": {"System": system}}}
+
+
+def test_time_window():
+    event_filter = EventFilter(start=START, end=START + 60)
+    assert event_filter and event_filter.has_window and not event_filter.checks_content
+    assert event_filter.matches_time(to_filetime(START))
+    assert event_filter.matches_time(to_filetime(START + 60))
+    assert not event_filter.matches_time(to_filetime(START - 1))
+    assert not event_filter.matches_time(to_filetime(START + 61))
+    assert EventFilter(start=START).matches_time(to_filetime(START + 10 ** 6))
+    with pytest.raises(ValueError):
+        EventFilter(start=START + 1, end=START)
+
+
+def test_content():
+    event_filter = EventFilter(event_ids=["4624", 4688], channels=[" Security ", ""])
+    assert event_filter.checks_content and not event_filter.has_window
+    assert event_filter.matches_content("4624", "SECURITY")
+    assert event_filter.matches_content(4688, "security")
+    assert not event_filter.matches_content(4625, "Security")
+    assert not event_filter.matches_content(4624, "System")
+    assert not event_filter.matches_content(None, "Security")
+    assert not event_filter.matches_content(4624, None)
+    assert not EventFilter()
+    assert EventFilter().matches_content(None, None)
+
+
+def test_matches_chainsaw_documents():
+    event_filter = EventFilter(event_ids=[4624], channels=["Security"])
+    assert event_filter.matches_document(document(4624, "Security"))
+    # Values parsed from XML attributes come as objects
+    assert event_filter.matches_document(document({"#text": 4624, "Qualifiers": ""}, "Security"))
+    assert not event_filter.matches_document(document(4625, "Security"))
+    assert not event_filter.matches_document({"data": {}})
+    assert not event_filter.matches_document(None)
+
+
+def test_tool_options_and_description():
+    event_filter = EventFilter(start=START, end=START + 3600, event_ids=[4688, 4624], channels=["Security"])
+    assert event_filter.chainsaw_args() == ["--from", "2024-01-01T00:00:00", "--to", "2024-01-01T01:00:00"]
+    assert event_filter.hayabusa_args() == [
+        "--timeline-start", "2024-01-01 00:00:00 +00:00", "--timeline-end", "2024-01-01 01:00:00 +00:00",
+        "--include-eid", "4624,4688",
+    ]
+    assert event_filter.not_applied() == {"hayabusa_report": ["channels"]}
+    assert EventFilter(event_ids=[4624]).not_applied() == {}
+    assert event_filter.to_dict()["event_ids"] == [4624, 4688]
+    assert event_filter.key() == EventFilter(start=START, end=START + 3600, event_ids=[4624, 4688],
+                                             channels=["SECURITY"]).key()
+    assert event_filter.key() != EventFilter(event_ids=[4624]).key()
+    assert "EventID 4624, 4688" in str(event_filter)
+
+
+def test_filter_chainsaw_report(tmp_path):
+    report = tmp_path / "Security_chainsaw_report.json"
+    detections = [
+        {"name": "logon", "document": document(4624, "Security")},
+        {"name": "process", "document": document(4688, "Security")},
+        {"name": "service", "document": document(7045, "System")},
+        {"name": "aggregate", "documents": [document(4624, "Security"), document(4688, "Security")]},
+        {"name": "aggregate elsewhere", "documents": [document(7045, "System")]},
+    ]
+    report.write_text(json.dumps(detections))
+
+    dropped = filter_chainsaw_report(report, EventFilter(event_ids=[4624], channels=["security"]))
+    kept = json.loads(report.read_text())
+    assert dropped == 3
+    assert [detection["name"] for detection in kept] == ["logon", "aggregate"]
+    assert kept[1]["documents"] == [document(4624, "Security")]
+    assert list(tmp_path.iterdir()) == [report]
+
+
+def test_filter_chainsaw_report_without_content_filter(tmp_path):
+    report = tmp_path / "report.json"
+    report.write_text("not even json")
+    assert filter_chainsaw_report(report, EventFilter(start=START)) == 0
+    assert report.read_text() == "not even json"
+
+
+def test_filter_chainsaw_report_leaves_a_broken_report(tmp_path):
+    report = tmp_path / "report.json"
+    report.write_text('[{"document": {}}, {')
+    with pytest.raises(ValueError):
+        filter_chainsaw_report(report, EventFilter(event_ids=[4624]))
+    assert report.read_text() == '[{"document": {}}, {'
+    assert list(tmp_path.iterdir()) == [report]
@@ -0,0 +1,116 @@
+# chayabusaw/tests/test_evtx_jsonl.py
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import evtx_jsonl
+import evtx_synth
+from eventfilter import EventFilter
+from evtx_jsonl import convert_evtx_to_jsonl, file_in_window
+from jobs import JobCancelled
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+def read_lines(path) -> list:
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def record_ids(path) -> list:
+    return [int(json.loads(line)["EventRecordID"]) for line in read_lines(path)]
+
+
+def write_overlapping_evtx(path, source):
+    """Writes every chunk of source twice, so the record ranges of the chunks overlap."""
+    data = source.read_bytes()
+    chunks = data[evtx_synth.FILE_HEADER_SIZE:]
+    chunk_count = len(chunks) // evtx_synth.CHUNK_SIZE
+    next_record = int.from_bytes(data[24:32], "little")
+    path.write_bytes(evtx_synth.file_header(2 * chunk_count, next_record) + chunks + chunks)
+    return path
+
+
+@pytest.mark.parametrize("event_filter", [
+    None,
+    EventFilter(event_ids=[4624, 4688]),
+    EventFilter(channels=["Security"]),
+    EventFilter(start=START + 49, end=START + 148),
+], ids=["everything", "event_ids", "channels", "window"])
+def test_native_matches_xml(synthetic_evtx, tmp_path, event_filter):
+    evtx_path = synthetic_evtx(records=200, seed=3)
+    native_stats = convert_evtx_to_jsonl(evtx_path, tmp_path / "native.jsonl", "native", event_filter=event_filter)
+    xml_stats = convert_evtx_to_jsonl(evtx_path, tmp_path / "xml.jsonl", "xml", event_filter=event_filter)
+
+    assert native_stats["fallbacks"] == 0
+    assert read_lines(tmp_path / "native.jsonl") == read_lines(tmp_path / "xml.jsonl")
+    assert native_stats["records"] == xml_stats["records"] > 0
+    assert native_stats["filtered"] == xml_stats["filtered"]
+    assert native_stats["records"] + native_stats["filtered"] == 200
+    if event_filter is None:
+        assert native_stats["filtered"] == 0
+
+
+def test_time_window_keeps_records_in_window(synthetic_evtx, tmp_path):
+    evtx_path = synthetic_evtx(records=500)
+    # Records are written one second apart from START, so record n is at START + n - 1
+    event_filter = EventFilter(start=START + 99, end=START + 198)
+    stats = convert_evtx_to_jsonl(evtx_path, tmp_path / "out.jsonl", event_filter=event_filter)
+
+    assert record_ids(tmp_path / "out.jsonl") == list(range(100, 200))
+    assert stats["filtered"] == 400
+    assert file_in_window(evtx_path, event_filter)
+    assert not file_in_window(evtx_path, EventFilter(start=START + 1000))
+
+
+def test_parallel_matches_sequential(synthetic_evtx, tmp_path, monkeypatch):
+    evtx_path = synthetic_evtx(records=2000)
+    # Several parts, so they have to be appended in order
+    monkeypatch.setattr(evtx_jsonl, "PARALLEL_TASK_CHUNKS", 4)
+    sequential = convert_evtx_to_jsonl(evtx_path, tmp_path / "sequential.jsonl")
+    parallel = convert_evtx_to_jsonl(evtx_path, tmp_path / "parallel.jsonl", processes=2)
+
+    assert read_lines(tmp_path / "parallel.jsonl") == read_lines(tmp_path / "sequential.jsonl")
+    assert parallel["records"] == sequential["records"] == 2000
+    assert parallel["worker_cpu_seconds"] > 0
+    assert parallel["worker_peak_rss"] > 0
+    assert not list(tmp_path.glob(".parts-*"))
+
+
+def test_parallel_merges_overlapping_chunks(synthetic_evtx, tmp_path, monkeypatch):
+    evtx_path = write_overlapping_evtx(tmp_path / "Overlapping.evtx", synthetic_evtx(records=1000))
+    monkeypatch.setattr(evtx_jsonl, "PARALLEL_TASK_CHUNKS", 3)
+    convert_evtx_to_jsonl(evtx_path, tmp_path / "sequential.jsonl")
+    stats = convert_evtx_to_jsonl(evtx_path, tmp_path / "parallel.jsonl", processes=2)
+
+    ids = record_ids(tmp_path / "parallel.jsonl")
+    assert stats["records"] == 2000
+    assert ids == sorted(ids)
+    assert sorted(read_lines(tmp_path / "parallel.jsonl")) == sorted(read_lines(tmp_path / "sequential.jsonl"))
+
+
+def test_parallel_applies_event_filter(synthetic_evtx, tmp_path, monkeypatch):
+    evtx_path = synthetic_evtx(records=1000)
+    monkeypatch.setattr(evtx_jsonl, "PARALLEL_TASK_CHUNKS", 4)
+    event_filter = EventFilter(event_ids=[4104])
+    sequential = convert_evtx_to_jsonl(evtx_path, tmp_path / "sequential.jsonl", event_filter=event_filter)
+    parallel = convert_evtx_to_jsonl(evtx_path, tmp_path / "parallel.jsonl", processes=2, event_filter=event_filter)
+
+    assert read_lines(tmp_path / "parallel.jsonl") == read_lines(tmp_path / "sequential.jsonl")
+    assert parallel["filtered"] == sequential["filtered"] > 0
+
+
+def test_cancelling_while_every_record_is_filtered(synthetic_evtx, tmp_path):
+    evtx_path = synthetic_evtx(records=3000)
+    checks = []
+
+    def check_cancelled():
+        checks.append(True)
+        if len(checks) > 1:
+            raise JobCancelled("cancelled")
+
+    with pytest.raises(JobCancelled):
+        convert_evtx_to_jsonl(evtx_path, tmp_path / "out.jsonl", check_cancelled=check_cancelled,
+                              event_filter=EventFilter(event_ids=[99999]))
+    assert len(checks) == 2
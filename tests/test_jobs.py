@@ -0,0 +1,157 @@
+# chayabusaw/tests/test_jobs.py
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from jobs import CANCELLED, COMPLETED, FAILED, QUEUED, Job, JobCancelled, JobManager, current_job, run_command
+
+
+def wait_until(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(max_workers=1)
+    yield manager
+    manager.shutdown()
+
+
+@pytest.fixture
+def blocker(manager):
+    """Keeps the only worker busy until set."""
+    release = threading.Event()
+    job = manager.submit(lambda job: release.wait(10), "T0", "blocker")
+    wait_until(lambda: job.status != QUEUED)
+    yield release
+    release.set()
+
+
+def test_job_runs_and_cleans_up(manager):
+    finished = []
+    job = manager.submit(lambda job, value: setattr(job, "seen", (value, current_job())), "T1", "a.evtx", 42,
+                         on_finish=lambda: finished.append(True))
+    wait_until(lambda: job.status == COMPLETED)
+    assert job.seen == (42, job)
+    assert finished == [True]
+    assert job.started_at is not None and job.finished_at >= job.started_at
+
+
+def test_failed_job_cleans_up(manager):
+    finished = []
+
+    def fail(job):
+        raise RuntimeError("broken")
+
+    job = manager.submit(fail, "T1", "a.evtx", on_finish=lambda: finished.append(True))
+    wait_until(lambda: job.status == FAILED)
+    assert job.error == "broken"
+    assert finished == [True]
+
+
+def test_cancelling_a_queued_job_cleans_up_at_once(manager, blocker):
+    finished = []
+    ran = []
+    job = manager.submit(lambda job: ran.append(True), "T1", "a.evtx", on_finish=lambda: finished.append(True))
+    assert job.status == QUEUED
+
+    manager.cancel(job.id)
+    # Cleaned up straight away, not when the worker gets to it
+    assert job.status == CANCELLED
+    assert finished == [True]
+
+    blocker.set()
+    time.sleep(0.1)
+    assert ran == []
+    assert finished == [True]
+    assert job.started_at is None
+
+
+def test_shutdown_cleans_up_queued_jobs():
+    manager = JobManager(max_workers=1)
+    release = threading.Event()
+    running = manager.submit(lambda job: release.wait(10), "T0", "running")
+    wait_until(lambda: running.status != QUEUED)
+    finished = []
+    queued = manager.submit(lambda job: None, "T1", "a.evtx", on_finish=lambda: finished.append(True))
+
+    manager.shutdown()
+    assert queued.status == CANCELLED
+    assert finished == [True]
+    assert running.cancelled
+    release.set()
+    wait_until(lambda: running.status == COMPLETED)
+
+
+def test_cleanup_failure_does_not_fail_the_job(manager):
+    def cleanup():
+        raise OSError("gone")
+
+    job = manager.submit(lambda job: None, "T1", "a.evtx", on_finish=cleanup)
+    wait_until(lambda: job.status == COMPLETED)
+
+
+def test_finished_jobs_are_pruned():
+    manager = JobManager(max_workers=1, max_finished=2)
+    try:
+        jobs = []
+        for i in range(4):
+            jobs.append(manager.submit(lambda job: None, "T1", f"{i}.evtx"))
+            wait_until(lambda: jobs[-1].status == COMPLETED)
+        manager.submit(lambda job: None, "T1", "last.evtx")
+        assert manager.get(jobs[0].id) is None
+        assert manager.get(jobs[-1].id) is not None
+    finally:
+        manager.shutdown()
+
+
+# --- run_command ---
+def test_run_command_returns_output_and_usage():
+    completed = run_command([sys.executable, "-c", "import sys; print('out'); print('err', file=sys.stderr)"])
+    assert completed.returncode == 0
+    assert completed.stdout == "out\n"
+    assert completed.stderr == "err\n"
+    assert completed.rusage.ru_utime + completed.rusage.ru_stime > 0
+
+
+def test_run_command_raises_on_failure():
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        run_command([sys.executable, "-c", "import sys; print('bad input', file=sys.stderr); sys.exit(3)"])
+    assert error.value.returncode == 3
+    assert error.value.stderr == "bad input\n"
+    assert error.value.rusage is not None
+
+
+def test_run_command_kills_a_cancelled_job(manager):
+    outcome = {}
+
+    def body(job):
+        started = time.monotonic()
+        try:
+            # The tool starts a child of its own; the whole process group is killed
+            run_command([sys.executable, "-c", "import subprocess, sys, time; "
+                         "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)']); time.sleep(60)"],
+                        job, poll_interval=0.05)
+        finally:
+            outcome["seconds"] = time.monotonic() - started
+
+    job = manager.submit(body, "T1", "a.evtx")
+    wait_until(lambda: job.status != QUEUED)
+    time.sleep(0.3)
+    manager.cancel(job.id)
+    wait_until(lambda: job.status == CANCELLED)
+    assert outcome["seconds"] < 5
+
+
+def test_run_command_refuses_a_cancelled_job():
+    job = Job("T1", "a.evtx")
+    job.cancel()
+    with pytest.raises(JobCancelled):
+        run_command([sys.executable, "-c", "pass"], job)
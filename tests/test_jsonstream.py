@@ -0,0 +1,70 @@
+# chayabusaw/tests/test_jsonstream.py
+import gzip
+import io
+import json
+
+import pytest
+
+from jsonstream import JsonArrayWriter, iter_json_array, json_to_jsonl
+
+ITEMS = [
+    {"name": "a", "values": [1, 2.5, -3e-7], "nested": {"text": "with \"quotes\", [brackets] and ]"}},
+    12345678901234567890,
+    "plain string",
+    None,
+    {"unicode": "é" * 100},
+]
+
+
+@pytest.mark.parametrize("read_size", [1, 7, 1024 * 1024])
+def test_iter_json_array(read_size):
+    text = json.dumps(ITEMS, indent=2)
+    assert list(iter_json_array(io.StringIO(text), read_size=read_size)) == ITEMS
+
+
+def test_numbers_split_across_reads():
+    text = "[1234567, 89, 1.5e10]"
+    for read_size in range(1, len(text) + 1):
+        assert list(iter_json_array(io.StringIO(text), read_size=read_size)) == [1234567, 89, 1.5e10]
+
+
+@pytest.mark.parametrize("text", ["[]", " [ ] \n"])
+def test_empty_array(text):
+    assert list(iter_json_array(io.StringIO(text))) == []
+
+
+@pytest.mark.parametrize("text", ["", '{"a": 1}', "[1, 2", "[1 2]", "[1, 2] 3", '[{"a": ]'])
+def test_malformed(text):
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(io.StringIO(text), read_size=2))
+
+
+def test_writer_round_trip():
+    f = io.StringIO()
+    writer = JsonArrayWriter(f)
+    for item in ITEMS:
+        writer.write(item)
+    writer.close()
+    assert json.loads(f.getvalue()) == ITEMS
+    assert writer.count == len(ITEMS)
+
+
+def test_json_to_jsonl(tmp_path):
+    src = tmp_path / "report.json"
+    src.write_text(json.dumps(ITEMS))
+    assert json_to_jsonl(src, tmp_path / "report.jsonl") == len(ITEMS)
+    assert [json.loads(line) for line in (tmp_path / "report.jsonl").read_text().splitlines()] == ITEMS
+
+    assert json_to_jsonl(src, tmp_path / "report.jsonl.gz", compress_level=1) == len(ITEMS)
+    with gzip.open(tmp_path / "report.jsonl.gz", "rt") as f:
+        assert [json.loads(line) for line in f] == ITEMS
+
+
+def test_json_to_jsonl_single_values(tmp_path):
+    src = tmp_path / "report.json"
+    src.write_text('{"summary": 1}')
+    assert json_to_jsonl(src, tmp_path / "out.jsonl") == 1
+    assert json.loads((tmp_path / "out.jsonl").read_text()) == {"summary": 1}
+    src.write_text("42")
+    json_to_jsonl(src, tmp_path / "out.jsonl")
+    assert json.loads((tmp_path / "out.jsonl").read_text()) == {"data": 42}
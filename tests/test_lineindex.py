@@ -0,0 +1,175 @@
+# chayabusaw/tests/test_lineindex.py
+import gzip
+import json
+import os
+
+import pytest
+
+from lineindex import (
+    GzipLineWriter, IndexingWriter, LineIndexBuilder, RecordFilter, build_line_index, compress_lines,
+    ensure_line_index, index_path, load_line_index, read_records,
+)
+
+LINES = 2500
+STRIDE = 100
+
+
+def record(n: int) -> dict:
+    return {
+        "EventID": 4624 if n % 3 == 0 else str(4688),
+        "RecordID": n,
+        "Computer": f"WIN10-{n % 5:02d}",
+        "Details": {"User": f"user{n % 7}", "Path": f"C:\\Temp\\{n}.exe"},
+    }
+
+
+def lines() -> list:
+    return [json.dumps(record(n)) + "\n" for n in range(LINES)]
+
+
+@pytest.fixture
+def plain(tmp_path):
+    path = tmp_path / "Security_hayabusa_report.jsonl"
+    builder = LineIndexBuilder(STRIDE)
+    with open(path, "w") as f:
+        IndexingWriter(f, builder).writelines(lines())
+    builder.save(path)
+    return path
+
+
+@pytest.fixture
+def compressed(tmp_path):
+    path = tmp_path / "Security_hayabusa_report.jsonl.gz"
+    with open(path, "wb") as f:
+        writer = GzipLineWriter(f, stride=STRIDE, level=1)
+        writer.writelines(lines())
+        writer.close()
+    writer.save(path)
+    return path
+
+
+def line_numbers(records: list) -> list:
+    return [line for line, _ in records]
+
+
+@pytest.mark.parametrize("artifact", ["plain", "compressed"])
+def test_pages_from_any_line(artifact, request):
+    path = request.getfixturevalue(artifact)
+    index = load_line_index(path)
+    assert index is not None and index.lines == LINES
+
+    for start in (0, 99, 100, 1234, LINES - 3):
+        records, next_line = read_records(path, index, start, 10)
+        expected = list(range(start, min(start + 10, LINES)))
+        assert line_numbers(records) == expected
+        assert [r["RecordID"] for _, r in records] == expected
+        assert next_line == (start + 10 if start + 10 <= LINES else None)
+
+
+def test_written_index_matches_a_rebuilt_one(plain):
+    written = load_line_index(plain)
+    build_line_index(plain, stride=STRIDE)
+    rebuilt = load_line_index(plain)
+    assert (rebuilt.lines, list(rebuilt.offsets)) == (written.lines, list(written.offsets))
+
+
+def test_gzip_output_is_a_normal_gzip_file(compressed):
+    with gzip.open(compressed, "rt") as f:
+        assert f.readlines() == lines()
+
+
+def test_compress_lines(plain, tmp_path):
+    dest = tmp_path / "copy.jsonl.gz"
+    compress_lines(plain, dest)
+    index = load_line_index(dest)
+    assert index.lines == LINES
+    records, _ = read_records(dest, index, 2001, 2)
+    assert line_numbers(records) == [2001, 2002]
+
+
+def test_gzip_without_restart_points_is_read_from_the_start(tmp_path):
+    path = tmp_path / "other.jsonl.gz"
+    with gzip.open(path, "wt") as f:
+        f.writelines(lines())
+    index = ensure_line_index(path)
+    assert index.lines == LINES
+    records, _ = read_records(path, index, 1500, 3)
+    assert line_numbers(records) == [1500, 1501, 1502]
+
+
+def test_stale_index_is_rebuilt(plain):
+    with open(plain, "a") as f:
+        f.write(json.dumps(record(LINES)) + "\n")
+    assert load_line_index(plain) is None
+    assert ensure_line_index(plain).lines == LINES + 1
+    assert index_path(plain).exists()
+
+
+def test_last_line_without_newline_counts(tmp_path):
+    path = tmp_path / "report.jsonl"
+    path.write_text('{"a": 1}\n{"a": 2}')
+    index = ensure_line_index(path)
+    assert index.lines == 2
+    records, next_line = read_records(path, index, 1, 10)
+    assert records == [(1, {"a": 2})] and next_line is None
+
+
+def test_unparsable_lines_are_returned_raw(tmp_path):
+    path = tmp_path / "report.jsonl"
+    path.write_text('{"a": 1}\nnot json\n')
+    records, _ = read_records(path, ensure_line_index(path), 0, 10)
+    assert records == [(0, {"a": 1}), (1, {"_raw": "not json"})]
+
+
+# --- RecordFilter ---
+def test_record_filter_matches_event_ids_and_fields():
+    assert not RecordFilter()
+    by_event_id = RecordFilter(event_ids=[4624])
+    assert by_event_id.match(json.dumps(record(3)).encode())["RecordID"] == 3
+    assert by_event_id.match(json.dumps(record(4)).encode()) is None
+    # Quoted EventIDs match too
+    assert RecordFilter(event_ids=[4688]).match(json.dumps(record(4)).encode()) is not None
+    # The parsed dump has no EventID key; its records never match
+    assert by_event_id.match(b'{"EventRecordID": "1", "EventID": null}') is None
+    assert by_event_id.match(b'{"EventRecordID": "1", "TargetUserName": "4624"}') is None
+
+    # A plain name is also found one level down, a dotted one only at its path
+    assert RecordFilter(fields=[("User", "user3")]).match(json.dumps(record(3)).encode()) is not None
+    assert RecordFilter(fields=[("Details.User", "user3")]).match(json.dumps(record(3)).encode()) is not None
+    assert RecordFilter(fields=[("Details.User", "user4")]).match(json.dumps(record(3)).encode()) is None
+    assert RecordFilter(fields=[("Path", "C:\\Temp\\3.exe")]).match(json.dumps(record(3)).encode()) is not None
+    assert RecordFilter(fields=[("RecordID", "3")]).match(json.dumps(record(3)).encode()) is not None
+
+
+@pytest.mark.parametrize("artifact", ["plain", "compressed"])
+def test_filtered_pages_continue_where_they_stopped(artifact, request):
+    path = request.getfixturevalue(artifact)
+    index = load_line_index(path)
+    record_filter = RecordFilter(event_ids=[4624], fields=[("Computer", "WIN10-00")])
+    expected = [n for n in range(LINES) if n % 3 == 0 and n % 5 == 0]
+
+    found = []
+    start = 0
+    while start is not None:
+        records, start = read_records(path, index, start, 7, record_filter)
+        found.extend(line_numbers(records))
+    assert found == expected
+
+    # With a scan limit, a page may come back short; next says where to go on from
+    records, next_line = read_records(path, index, 1, 100, record_filter, max_scan=50)
+    assert line_numbers(records) == [n for n in expected if 1 <= n < 51]
+    assert next_line == 51
+
+
+def test_offsets_of_non_ascii_lines(tmp_path):
+    path = tmp_path / "report.jsonl"
+    builder = LineIndexBuilder(2)
+    with open(path, "w", encoding="utf-8") as f:
+        writer = IndexingWriter(f, builder)
+        for n in range(7):
+            writer.write(json.dumps({"n": n, "text": "é" * n}, ensure_ascii=False) + "\n")
+    builder.save(path)
+    index = load_line_index(path)
+    records, _ = read_records(path, index, 5, 1)
+    assert records == [(5, {"n": 5, "text": "é" * 5})]
+    assert os.path.getsize(path) == index.offsets[-1] + len(path.read_bytes().splitlines(True)[6])
@@ -0,0 +1,124 @@
+# chayabusaw/tests/test_logstream.py
+import asyncio
+import threading
+
+from logstream import LogBroadcaster, sse_stream
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_subscribers_get_their_channel():
+    async def scenario():
+        broadcaster = LogBroadcaster()
+        everything = broadcaster.subscribe()
+        job = broadcaster.subscribe("job1")
+        broadcaster.publish("global")
+        broadcaster.publish("for job1", channel="job1")
+        broadcaster.publish("for job2", channel="job2")
+        return await everything.next_batch(1), await job.next_batch(1)
+
+    (everything, dropped), (job, job_dropped) = run(scenario())
+    assert [message for _, message in everything] == ["global", "for job1", "for job2"]
+    assert [message for _, message in job] == ["for job1"]
+    assert dropped == job_dropped == 0
+
+
+def test_replay_and_resume():
+    async def scenario():
+        broadcaster = LogBroadcaster(replay_lines=3)
+        for i in range(5):
+            broadcaster.publish(f"line {i}")
+        replayed, _ = await broadcaster.subscribe().next_batch(1)
+        resumed, _ = await broadcaster.subscribe(last_event_id=replayed[1][0]).next_batch(1)
+        fresh, _ = await broadcaster.subscribe(replay=False).next_batch(0.01)
+        return replayed, resumed, fresh
+
+    replayed, resumed, fresh = run(scenario())
+    assert [message for _, message in replayed] == ["line 2", "line 3", "line 4"]
+    assert [message for _, message in resumed] == ["line 4"]
+    assert fresh == []
+
+
+def test_slow_subscriber_loses_oldest_lines():
+    async def scenario():
+        broadcaster = LogBroadcaster(subscriber_buffer=3)
+        subscriber = broadcaster.subscribe()
+        for i in range(10):
+            broadcaster.publish(f"line {i}")
+        return await subscriber.next_batch(1)
+
+    lines, dropped = run(scenario())
+    assert [message for _, message in lines] == ["line 7", "line 8", "line 9"]
+    assert dropped == 7
+
+
+def test_publishing_from_threads():
+    async def scenario():
+        broadcaster = LogBroadcaster(subscriber_buffer=1000)
+        subscriber = broadcaster.subscribe()
+        threads = [
+            threading.Thread(target=lambda n=n: [broadcaster.publish(f"{n}-{i}") for i in range(50)])
+            for n in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        received = []
+        while len(received) < 200:
+            lines, _ = await subscriber.next_batch(5)
+            assert lines
+            received.extend(lines)
+        for thread in threads:
+            thread.join()
+        return received
+
+    received = run(scenario())
+    ids = [line_id for line_id, _ in received]
+    assert ids == sorted(ids) and len(set(ids)) == 200
+
+
+def test_subscribers_of_a_closed_loop_are_dropped():
+    broadcaster = LogBroadcaster()
+
+    async def subscribe():
+        broadcaster.subscribe("job1")
+
+    run(subscribe())
+    assert broadcaster.subscriber_count() == 1
+    # The loop is gone (e.g. at shutdown); publishing must neither fail nor keep the subscriber
+    broadcaster.publish("first", channel="job1")
+    broadcaster.publish("second", channel="job1")
+    assert broadcaster.subscriber_count() == 0
+
+
+def test_old_job_channels_are_forgotten():
+    broadcaster = LogBroadcaster(max_channels=3)
+    for n in range(5):
+        broadcaster.publish("line", channel=f"job{n}")
+
+    async def replay(channel):
+        return await broadcaster.subscribe(channel).next_batch(0.01)
+
+    assert run(replay("job0")) == ([], 0)
+    assert [message for _, message in run(replay("job4"))[0]] == ["line"]
+
+
+def test_sse_stream():
+    async def scenario():
+        broadcaster = LogBroadcaster(subscriber_buffer=2)
+        subscriber = broadcaster.subscribe()
+        stream = sse_stream(subscriber, heartbeat_seconds=0.01, greeting="hello")
+        events = [await anext(stream)]
+        events.append(await anext(stream))
+        for message in ("a", "b", "two\nlines"):
+            broadcaster.publish(message)
+        events.append(await anext(stream))
+        await stream.aclose()
+        return broadcaster, events
+
+    broadcaster, events = run(scenario())
+    assert events[0] == "data: hello\n\n"
+    assert events[1] == ": heartbeat\n\n"
+    assert events[2] == "event: dropped\ndata: 1\n\nid: 2\ndata: b\n\nid: 3\ndata: two\ndata: lines\n\n"
+    assert broadcaster.subscriber_count() == 0
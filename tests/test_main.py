@@ -0,0 +1,257 @@
+# chayabusaw/tests/test_main.py
+"""End-to-end tests of the app, with the stub Chainsaw and Hayabusa (see conftest.py)."""
+import hashlib
+import io
+import json
+import threading
+import uuid
+import zipfile
+
+import pytest
+
+from jobs import Job, JobManager, QUEUED
+from result_cache import ResultCache
+
+RECORDS = 300
+
+
+@pytest.fixture
+def ticket() -> str:
+    return f"T-{uuid.uuid4().hex[:8]}"
+
+
+def zip_of(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, path in members.items():
+            archive.write(path, name)
+    return buffer.getvalue()
+
+
+def upload(client, ticket: str, filename: str, data: bytes, **fields) -> dict:
+    response = client.post("/evtx", data={"ticket_number": ticket, **fields}, files={"file": (filename, data)})
+    assert response.status_code == 202, response.text
+    return response.json()
+
+
+def dump_lines(main, ticket: str, stem: str) -> list:
+    return (main.RESULTS_DIR / ticket / stem / f"{stem}_dump.jsonl").read_text().splitlines()
+
+
+def upload_dirs(main) -> set:
+    return {path.name for path in main.UPLOAD_DIR.iterdir() if path.name != "sessions"}
+
+
+@pytest.mark.parametrize("mode", ["per-file", "batch"])
+def test_same_stem_in_one_archive(main, client, wait_for_job, synthetic_evtx, ticket, mode, monkeypatch):
+    monkeypatch.setattr(main, "ANALYSIS_MODE", mode)
+    data = zip_of({
+        "host1/Security.evtx": synthetic_evtx("a/Security.evtx", RECORDS, seed=1, computer="HOST1"),
+        "host2/Security.evtx": synthetic_evtx("b/Security.evtx", RECORDS, seed=2, computer="HOST2"),
+    })
+    job = wait_for_job(upload(client, ticket, "collection.zip", data)["job_id"])
+
+    assert job["status"] == "completed", job
+    assert job["progress"]["files_done"] == 2
+    stems = sorted(path.name for path in (main.RESULTS_DIR / ticket).iterdir())
+    assert stems == ["Security", "Security_host1"]
+    first, second = (dump_lines(main, ticket, stem) for stem in stems)
+    assert len(first) == len(second) == RECORDS
+    assert first != second
+    for stem in stems:
+        # Every report was written for its own file, nothing for the other one
+        stem_dir = main.RESULTS_DIR / ticket / stem
+        assert main.stray_results(stem_dir, stem) == []
+        assert len(json.loads((stem_dir / f"{stem}_chainsaw_report.json").read_text())) == 4
+    assert not main._active_stems
+
+
+def test_cancelling_a_queued_upload_removes_it(main, client, synthetic_evtx, ticket, monkeypatch):
+    manager = JobManager(max_workers=1)
+    monkeypatch.setattr(main, "job_manager", manager)
+    release = threading.Event()
+    blocker = manager.submit(lambda job: release.wait(30), "T0", "blocker")
+    before = upload_dirs(main)
+    try:
+        job_id = upload(client, ticket, "Security.evtx", synthetic_evtx(records=RECORDS).read_bytes())["job_id"]
+        assert client.get(f"/jobs/{job_id}").json()["status"] == QUEUED
+        assert len(upload_dirs(main) - before) == 1
+
+        response = client.delete(f"/jobs/{job_id}")
+        assert response.status_code == 200
+        assert response.json()["status"] == "cancelled"
+        # The upload is removed straight away, not once a worker would have picked the job up
+        assert upload_dirs(main) == before
+    finally:
+        release.set()
+        manager.shutdown()
+    assert blocker.cancelled
+    assert not (main.RESULTS_DIR / ticket).exists()
+
+
+def test_failing_upload_stops_its_stages(main, synthetic_evtx, ticket, monkeypatch):
+    monkeypatch.setenv("STUB_STARTUP_SECONDS", "1")
+    started = []
+
+    def start_analysis(*args, **kwargs):
+        futures = original(*args, **kwargs)
+        started.extend(futures)
+        return futures
+
+    def extraction():
+        yield synthetic_evtx("A.evtx", RECORDS), None
+        raise RuntimeError("broken archive")
+
+    original = main.start_analysis
+    monkeypatch.setattr(main, "start_analysis", start_analysis)
+    with pytest.raises(RuntimeError):
+        main.analyze_files(extraction(), ticket, Job(ticket, "upload.zip"))
+    # Nothing may still be reading the inputs once the job's upload is removed
+    assert len(started) == 3
+    assert all(future.done() for future in started)
+    assert not main._active_stems
+
+
+def test_resumable_upload(main, client, wait_for_job, synthetic_evtx, ticket):
+    data = synthetic_evtx(records=RECORDS).read_bytes()
+    size = len(data)
+    response = client.post("/uploads", json={"filename": "Security.evtx", "size": size, "ticket_number": ticket})
+    assert response.status_code == 201, response.text
+    upload_url = response.json()["upload_url"]
+
+    def put(start: int, end: int, body: bytes = None):
+        return client.put(upload_url, content=data[start:end] if body is None else body,
+                          headers={"Content-Range": f"bytes {start}-{end - 1}/{size}"})
+
+    half = size // 2
+    assert put(half, size).status_code == 200
+    status = client.get(upload_url).json()
+    assert status["missing"] == [[0, half]] and not status["complete"]
+    assert client.post(f"{upload_url}/finalize").status_code == 409
+    assert put(0, half, body=data[:half - 1]).status_code == 400
+    assert client.get(upload_url).json()["missing"] == [[half - 1, half]]
+    assert put(half - 1, half).json()["complete"]
+
+    # A checksum mismatch throws away what was received
+    response = client.post(f"{upload_url}/finalize", json={"sha256": "0" * 64})
+    assert response.status_code == 422
+    assert client.get(upload_url).json()["missing"] == [[0, size]]
+
+    assert put(0, size).json()["complete"]
+    sha256 = hashlib.sha256(data).hexdigest()
+    response = client.post(f"{upload_url}/finalize", json={"sha256": sha256})
+    assert response.status_code == 202, response.text
+    assert response.json()["sha256"] == sha256
+    assert client.get(upload_url).status_code == 404
+
+    job = wait_for_job(response.json()["job_id"])
+    assert job["status"] == "completed", job
+    assert len(dump_lines(main, ticket, "Security")) == RECORDS
+
+
+def test_resumable_upload_checks_its_fields(client):
+    assert client.post("/uploads", json={"filename": "Security.evtx", "size": 10}).status_code == 400
+    response = client.post("/uploads", json={"filename": "Security.evtx", "size": 10, "ticket_number": "T1",
+                                             "event_ids": ["x"]})
+    assert response.status_code == 400
+    assert client.post("/uploads", json={"filename": "notes.txt", "size": 10, "ticket_number": "T1"}).status_code == 400
+    assert client.put(f"/uploads/{uuid.uuid4().hex}", content=b"x",
+                      headers={"Content-Range": "bytes 0-0/1"}).status_code == 404
+
+
+def test_scoped_upload(main, client, wait_for_job, synthetic_evtx, ticket):
+    data = synthetic_evtx(records=RECORDS).read_bytes()
+    job = wait_for_job(upload(client, ticket, "Security.evtx", data, event_ids="4624,4688", channels="Security")["job_id"])
+
+    assert job["status"] == "completed", job
+    assert job["event_filter"]["event_ids"] == [4624, 4688]
+    assert job["event_filter"]["not_applied"] == {"hayabusa_report": ["channels"]}
+    lines = dump_lines(main, ticket, "Security")
+    assert 0 < len(lines) < RECORDS
+    # The stub's detections carry no EventID, so none is left in Chainsaw's report
+    report = main.RESULTS_DIR / ticket / "Security" / "Security_chainsaw_report.json"
+    assert json.loads(report.read_text()) == []
+
+
+def test_repeated_upload_is_served_from_the_cache(main, client, wait_for_job, synthetic_evtx, ticket, tmp_path,
+                                                  monkeypatch):
+    monkeypatch.setattr(main, "result_cache", ResultCache(tmp_path / "cache", max_bytes=1 << 30))
+    data = synthetic_evtx(records=RECORDS).read_bytes()
+    first = wait_for_job(upload(client, ticket, "Security.evtx", data)["job_id"])
+    other_ticket = f"{ticket}-again"
+    second = wait_for_job(upload(client, other_ticket, "Renamed.evtx", data)["job_id"])
+
+    assert first["status"] == second["status"] == "completed"
+    assert first["progress"]["files_cached"] == 0
+    assert second["progress"]["files_cached"] == 1
+    assert dump_lines(main, other_ticket, "Renamed") == dump_lines(main, ticket, "Security")
+
+
+def test_same_stem_results_are_not_cached_together(main, client, wait_for_job, synthetic_evtx, ticket, tmp_path,
+                                                   monkeypatch):
+    cache = ResultCache(tmp_path / "cache", max_bytes=1 << 30)
+    monkeypatch.setattr(main, "result_cache", cache)
+    data = zip_of({
+        "host1/Security.evtx": synthetic_evtx("a/Security.evtx", RECORDS, seed=1),
+        "host2/Security.evtx": synthetic_evtx("b/Security.evtx", RECORDS, seed=2),
+    })
+    job = wait_for_job(upload(client, ticket, "collection.zip", data)["job_id"])
+    assert job["status"] == "completed", job
+
+    # Each file is cached on its own, holding only its own reports
+    assert cache.stats()["entries"] == 2
+    for meta_path in cache.cache_dir.glob("*/*/meta.json"):
+        meta = json.loads(meta_path.read_text())
+        assert all(name == "index.html" or name.startswith(f"{meta['stem']}_") for name in meta["files"])
+
+
+def test_deleting_results_forgets_them(main, client, wait_for_job, synthetic_evtx, ticket):
+    data = synthetic_evtx(records=RECORDS).read_bytes()
+    assert wait_for_job(upload(client, ticket, "Security.evtx", data)["job_id"])["status"] == "completed"
+    assert wait_for_job(upload(client, ticket, "System.evtx", data)["job_id"])["status"] == "completed"
+    assert client.get("/detections", params={"ticket": ticket}).json()["total"] > 0
+
+    assert client.delete(f"/delete-results/{ticket}/Security").status_code == 200
+    listing = client.get("/results", params={"q": ticket}).json()
+    assert [f["stem"] for f in listing["tickets"][0]["files"]] == ["System"]
+
+    assert client.delete(f"/delete-ticket/{ticket}").status_code == 200
+    assert client.get("/results", params={"q": ticket}).json()["total"] == 0
+    assert client.get("/detections", params={"ticket": ticket}).json()["total"] == 0
+
+
+# --- Record viewer ---
+@pytest.fixture
+def dumped(main, client, wait_for_job, synthetic_evtx, ticket):
+    job = wait_for_job(upload(client, ticket, "Security.evtx", synthetic_evtx(records=RECORDS).read_bytes())["job_id"])
+    assert job["status"] == "completed", job
+    return ticket
+
+
+def test_records_pages(client, dumped):
+    url = f"/results/{dumped}/Security/Security_dump.jsonl/records"
+    page = client.get(url, params={"start": 10, "limit": 5}).json()
+    assert page["total_lines"] == RECORDS
+    assert [r["line"] for r in page["records"]] == [10, 11, 12, 13, 14]
+    assert [r["record"]["EventRecordID"] for r in page["records"]] == ["11", "12", "13", "14", "15"]
+    assert page["next"] == 15
+
+    last = client.get(url, params={"start": -2}).json()
+    assert [r["line"] for r in last["records"]] == [RECORDS - 2, RECORDS - 1]
+    assert last["next"] is None
+
+
+def test_records_filters(client, dumped):
+    url = f"/results/{dumped}/Security/Security_dump.jsonl/records"
+    response = client.get(url, params={"event_id": "4624"})
+    assert response.status_code == 400
+    assert "where=field=value" in response.json()["detail"]
+
+    page = client.get(url, params={"where": "EventRecordID=42"}).json()
+    assert [r["line"] for r in page["records"]] == [41]
+    assert client.get(url, params={"where": "no-separator"}).status_code == 400
+
+    timeline = f"/results/{dumped}/Security/Security_hayabusa_report.jsonl/records"
+    assert client.get(timeline, params={"event_id": "4624"}).status_code == 200
+    assert client.get(f"/results/{dumped}/Security/Security_chainsaw_report.json/records").status_code == 400
+    assert client.get(f"/results/{dumped}/Security/../../x.jsonl/records").status_code in (400, 404)
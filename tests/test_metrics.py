@@ -0,0 +1,109 @@
+# chayabusaw/tests/test_metrics.py
+import resource
+import threading
+
+import pytest
+
+from jobs import Job, JobCancelled, set_current_job
+from metrics import PipelineMetrics, add_child_rusage, add_child_usage, current_stage, record_io
+
+
+@pytest.fixture
+def metrics():
+    return PipelineMetrics(prefix="test")
+
+
+def test_stage_records_io_and_child_usage(metrics):
+    job = Job("T1", "a.evtx")
+    set_current_job(job)
+    try:
+        with metrics.stage("chainsaw", "Security.evtx") as timer:
+            assert current_stage() is timer
+            record_io(bytes_in=100)
+            record_io(bytes_in=50, bytes_out=10, records=1000)
+            add_child_usage(1.5, 2048)
+            add_child_usage(0.5, 1024)
+    finally:
+        set_current_job(None)
+
+    assert current_stage() is None
+    result = timer.result
+    assert result["outcome"] == "ok"
+    assert (result["bytes_in"], result["bytes_out"], result["records"]) == (150, 10, 1000)
+    assert result["child_cpu_seconds"] == 2.0
+    assert result["peak_rss_bytes"] == 2048
+    assert result["cpu_seconds"] >= 0
+    assert job.to_dict()["stages"] == [result]
+
+
+def test_in_process_stages_have_no_peak_memory(metrics):
+    with metrics.stage("parse", "Security.evtx") as timer:
+        record_io(records=10)
+    assert timer.result["peak_rss_bytes"] is None
+    assert timer.result["child_cpu_seconds"] is None
+    assert 'test_stage_peak_rss_bytes_count{stage="parse"}' not in metrics.render()
+
+
+def test_child_rusage_is_added(metrics):
+    with metrics.stage("hayabusa") as timer:
+        add_child_rusage(resource.getrusage(resource.RUSAGE_CHILDREN))
+        add_child_rusage(None)
+    assert timer.result["peak_rss_bytes"] is not None
+
+
+def test_outcomes(metrics):
+    with pytest.raises(JobCancelled):
+        with metrics.stage("parse") as timer:
+            raise JobCancelled("cancelled")
+    assert timer.result["outcome"] == "cancelled"
+    with pytest.raises(RuntimeError):
+        with metrics.stage("parse") as timer:
+            raise RuntimeError("broken")
+    assert timer.result["outcome"] == "failed"
+    with metrics.stage("parse") as timer:
+        timer.ok = False
+    assert timer.result["outcome"] == "failed"
+    with metrics.stage("parse") as timer:
+        timer.discard()
+    assert timer.result is None
+
+    rendered = metrics.render()
+    assert 'test_stage_runs_total{stage="parse",outcome="cancelled"} 1' in rendered
+    assert 'test_stage_runs_total{stage="parse",outcome="failed"} 2' in rendered
+    with pytest.raises(ValueError):
+        metrics.stage("unknown")
+
+
+def test_measure_decorator(metrics, tmp_path):
+    @metrics.measure("mirror")
+    def mirror(target):
+        record_io(bytes_out=5)
+        return target.name != "bad"
+
+    assert mirror(tmp_path / "good")
+    assert not mirror(tmp_path / "bad")
+    rendered = metrics.render()
+    assert 'test_stage_runs_total{stage="mirror",outcome="ok"} 1' in rendered
+    assert 'test_stage_runs_total{stage="mirror",outcome="failed"} 1' in rendered
+    assert 'test_stage_bytes_out_total{stage="mirror"} 10' in rendered
+
+
+def test_histogram_buckets_are_cumulative(metrics):
+    for seconds in (0.05, 0.3, 7):
+        metrics.duration.observe(seconds, "save")
+    rendered = metrics.render()
+    assert 'test_stage_duration_seconds_bucket{stage="save",le="0.1"} 1' in rendered
+    assert 'test_stage_duration_seconds_bucket{stage="save",le="10"} 3' in rendered
+    assert 'test_stage_duration_seconds_bucket{stage="save",le="+Inf"} 3' in rendered
+    assert 'test_stage_duration_seconds_count{stage="save"} 3' in rendered
+
+
+def test_stages_of_other_threads_are_separate(metrics):
+    seen = []
+    with metrics.stage("parse") as timer:
+        thread = threading.Thread(target=lambda: seen.append(current_stage()))
+        thread.start()
+        thread.join()
+        record_io(records=1)
+    assert seen == [None]
+    assert timer.result["records"] == 1
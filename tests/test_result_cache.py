@@ -0,0 +1,85 @@
+# chayabusaw/tests/test_result_cache.py
+import os
+
+import pytest
+
+from result_cache import ResultCache, clone_file, fingerprint_paths
+
+
+def write_results(output_dir, stem: str, size: int = 1000):
+    output_dir.mkdir(parents=True, exist_ok=True)
+    (output_dir / f"{stem}_dump.jsonl").write_bytes(os.urandom(size))
+    (output_dir / f"{stem}_chainsaw_report.json").write_text("[]")
+    (output_dir / "index.html").write_text("<html></html>")
+    return output_dir
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(tmp_path / "cache", max_bytes=10_000)
+
+
+def test_restores_under_another_stem(cache, tmp_path):
+    key = cache.key("ab" * 32, "rules1")
+    source = write_results(tmp_path / "T1" / "Security", "Security")
+    assert not cache.restore(key, "Security_host2", tmp_path / "T2" / "Security_host2")
+
+    cache.store(key, "Security", source)
+    target = tmp_path / "T2" / "Security_host2"
+    assert cache.restore(key, "Security_host2", target)
+    assert sorted(p.name for p in target.iterdir()) == [
+        "Security_host2_chainsaw_report.json", "Security_host2_dump.jsonl", "index.html",
+    ]
+    assert (target / "Security_host2_dump.jsonl").read_bytes() == (source / "Security_dump.jsonl").read_bytes()
+    assert cache.stats()["hits"] == 1
+
+
+def test_entries_are_evicted_least_recently_used_first(cache, tmp_path):
+    keys = [cache.key(f"{i:064x}", "rules1") for i in range(3)]
+    for i, key in enumerate(keys[:2]):
+        cache.store(key, "Security", write_results(tmp_path / f"r{i}", "Security", 4000))
+    # Using the first entry makes the second the least recently used
+    cache.restore(keys[0], "Security", tmp_path / "restored")
+    cache.store(keys[2], "Security", write_results(tmp_path / "r2", "Security", 4000))
+
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] <= cache.max_bytes
+    assert cache.restore(keys[0], "Security", tmp_path / "again")
+    assert not cache.restore(keys[1], "Security", tmp_path / "again")
+
+
+def test_invalidate_keeps_the_current_rules(cache, tmp_path):
+    source = write_results(tmp_path / "r", "Security", 100)
+    cache.store(cache.key("a" * 64, "old"), "Security", source)
+    cache.store(cache.key("b" * 64, "new"), "Security", source)
+    assert cache.invalidate("new") == 1
+    assert cache.stats()["entries"] == 1
+    assert cache.invalidate() == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = ResultCache(tmp_path / "cache", max_bytes=0)
+    key = cache.key("a" * 64, "rules1")
+    cache.store(key, "Security", write_results(tmp_path / "r", "Security"))
+    assert not cache.restore(key, "Security", tmp_path / "out")
+    assert cache.stats()["entries"] == 0
+
+
+def test_clone_file_copies_independently(tmp_path):
+    src = tmp_path / "src"
+    src.write_bytes(b"report")
+    dst = tmp_path / "dst"
+    assert clone_file(src, dst) in ("reflink", "hardlink", "copy")
+    assert dst.read_bytes() == b"report"
+
+
+def test_fingerprint_changes_with_the_rules(tmp_path):
+    rules = tmp_path / "rules"
+    rules.mkdir()
+    (rules / "a.yml").write_text("title: a")
+    first = fingerprint_paths([rules])
+    assert fingerprint_paths([rules]) == first
+    assert fingerprint_paths([rules], salt="batch") != first
+    (rules / "b.yml").write_text("title: b")
+    assert fingerprint_paths([rules]) != first
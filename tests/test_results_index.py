@@ -0,0 +1,85 @@
+# chayabusaw/tests/test_results_index.py
+import json
+
+import pytest
+
+from results_index import ResultsIndex, artifact_kind
+
+
+def write_stem(results_dir, ticket: str, stem: str, detections: int = 2):
+    stem_dir = results_dir / ticket / stem
+    stem_dir.mkdir(parents=True, exist_ok=True)
+    (stem_dir / f"{stem}_chainsaw_report.json").write_text(json.dumps([{"name": str(i)} for i in range(detections)]))
+    (stem_dir / f"{stem}_hayabusa_report.jsonl").write_text("{}\n" * (detections + 1))
+    (stem_dir / f"{stem}_dump.jsonl").write_text("{}\n")
+    (stem_dir / f"{stem}_dump.jsonl.idx").write_bytes(b"index")
+    (stem_dir / "index.html").write_text("<html></html>")
+    return stem_dir
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = ResultsIndex(tmp_path / "results_index.db")
+    yield index
+    index.close()
+
+
+def test_artifact_kind():
+    assert artifact_kind("Security", "Security_dump.jsonl") == "jsonl"
+    assert artifact_kind("Security", "Security_dump.jsonl.gz") == "jsonl"
+    assert artifact_kind("Security", "Security_chainsaw_report.json") == "chainsaw"
+    assert artifact_kind("Security", "index.html") == "hayabusa_html"
+    assert artifact_kind("Security", "System_dump.jsonl") is None
+
+
+def test_update_and_list(index, tmp_path):
+    results = tmp_path / "results"
+    index.update_stem("T100", "Security", write_stem(results, "T100", "Security", detections=3))
+    index.update_stem("T100", "System", write_stem(results, "T100", "System"))
+    index.update_stem("T200", "Security", write_stem(results, "T200", "Security"))
+
+    total, page = index.list_tickets(sort="ticket")
+    assert total == 2
+    assert [ticket["ticket"] for ticket in page] == ["T100", "T200"]
+    files = page[0]["files"]
+    assert [f["stem"] for f in files] == ["Security", "System"]
+    hits = {artifact["name"]: artifact["hits"] for artifact in files[0]["artifacts"]}
+    assert hits == {
+        "Security_chainsaw_report.json": 3, "Security_dump.jsonl": None,
+        "Security_hayabusa_report.jsonl": 4, "index.html": None,
+    }
+
+    # The latest analysis comes first by default
+    assert [ticket["ticket"] for ticket in index.list_tickets()[1]] == ["T200", "T100"]
+    total, page = index.list_tickets(query="sys")
+    assert total == 1 and [f["stem"] for f in page[0]["files"]] == ["System"]
+    # LIKE wildcards in the query are literal
+    assert index.list_tickets(query="T_00")[0] == 0
+    assert index.list_tickets(offset=1, limit=1)[1][0]["ticket"] == "T100"
+
+
+def test_removal(index, tmp_path):
+    results = tmp_path / "results"
+    stem_dir = write_stem(results, "T100", "Security")
+    index.update_stem("T100", "Security", stem_dir)
+    index.update_stem("T100", "System", write_stem(results, "T100", "System"))
+    index.remove_stem("T100", "System")
+    assert [f["stem"] for f in index.list_tickets()[1][0]["files"]] == ["Security"]
+
+    # A directory that is gone removes its entry
+    for path in stem_dir.iterdir():
+        path.unlink()
+    stem_dir.rmdir()
+    index.update_stem("T100", "Security", stem_dir)
+    assert index.list_tickets() == (0, [])
+
+
+def test_rebuild(index, tmp_path):
+    results = tmp_path / "results"
+    write_stem(results, "T100", "Security")
+    write_stem(results, "T200", "Security")
+    (results / "stray.txt").write_text("")
+    assert index.rebuild(results) == 2
+    assert index.list_tickets()[0] == 2
+    index.remove_ticket("T100")
+    assert index.list_tickets()[0] == 1
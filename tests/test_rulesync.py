@@ -0,0 +1,83 @@
+# chayabusaw/tests/test_rulesync.py
+import os
+
+import pytest
+
+from rulesync import read_rules_version, sync_tree, tree_version, write_rules_version
+
+
+@pytest.fixture
+def trees(tmp_path):
+    src = tmp_path / "src"
+    (src / "windows").mkdir(parents=True)
+    (src / "windows" / "a.yml").write_text("title: a")
+    (src / "windows" / "b.yml").write_text("title: b")
+    (src / "c.yml").write_text("title: c")
+    dst = tmp_path / "dst"
+    dst.mkdir()
+    return src, dst, tmp_path / "state"
+
+
+def touch_later(path):
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_merge_copies_only_changes(trees):
+    src, dst, state = trees
+    assert sync_tree(src, dst, state, mirror=False)["copied"] == 3
+    assert (dst / "windows" / "a.yml").read_text() == "title: a"
+
+    assert sync_tree(src, dst, state, mirror=False) == {"copied": 0, "unchanged": 3, "pruned": 0, "kept": 0}
+
+    (src / "windows" / "a.yml").write_text("title: a2")
+    touch_later(src / "windows" / "a.yml")
+    stats = sync_tree(src, dst, state, mirror=False)
+    assert (stats["copied"], stats["unchanged"]) == (1, 2)
+    assert (dst / "windows" / "a.yml").read_text() == "title: a2"
+
+
+def test_merge_keeps_the_users_files(trees):
+    src, dst, state = trees
+    (dst / "mine.yml").write_text("title: mine")
+    sync_tree(src, dst, state, mirror=False)
+    # An edited copy is the user's now, and so is what they added
+    (dst / "c.yml").write_text("title: edited")
+    touch_later(dst / "c.yml")
+    (src / "c.yml").write_text("title: c2")
+    touch_later(src / "c.yml")
+    (src / "windows" / "b.yml").unlink()
+
+    stats = sync_tree(src, dst, state, mirror=False)
+    assert stats["pruned"] == 1
+    assert (dst / "c.yml").read_text() == "title: edited"
+    assert (dst / "mine.yml").read_text() == "title: mine"
+    assert not (dst / "windows" / "b.yml").exists()
+
+
+def test_mirror_makes_an_exact_copy(trees):
+    src, dst, state = trees
+    (dst / "stale").mkdir()
+    (dst / "stale" / "old.yml").write_text("title: old")
+    sync_tree(src, dst, state, mirror=True)
+    assert not (dst / "stale").exists()
+    assert sorted(p.relative_to(dst).as_posix() for p in dst.rglob("*") if p.is_file()) == [
+        "c.yml", "windows/a.yml", "windows/b.yml",
+    ]
+
+
+def test_version_follows_the_content(trees, tmp_path):
+    src, dst, state = trees
+    sync_tree(src, dst, state, mirror=True)
+    version = tree_version(dst, state)
+    assert tree_version(dst, state) == version
+    assert tree_version(src, state) == version
+
+    info = write_rules_version(tmp_path / "rules_version.json", [dst], state)
+    assert read_rules_version(tmp_path / "rules_version.json") == info
+    (src / "c.yml").write_text("title: changed")
+    touch_later(src / "c.yml")
+    sync_tree(src, dst, state, mirror=True)
+    assert tree_version(dst, state) != version
+    assert write_rules_version(tmp_path / "rules_version.json", [dst], state)["version"] != info["version"]
+    assert read_rules_version(tmp_path / "missing.json") is None
@@ -0,0 +1,64 @@
+# chayabusaw/tests/test_scheduler.py
+import threading
+import time
+
+import pytest
+
+from jobs import Job, JobCancelled, current_job
+from scheduler import StageScheduler
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = StageScheduler(cpu_budget=4)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_stages_stay_within_the_budget(scheduler):
+    lock = threading.Lock()
+    busy = [0]
+    peak = [0]
+
+    def stage(weight):
+        with lock:
+            busy[0] += weight
+            peak[0] = max(peak[0], busy[0])
+        time.sleep(0.05)
+        with lock:
+            busy[0] -= weight
+        return weight
+
+    futures = [scheduler.submit(stage, weight, weight=weight) for weight in (3, 2, 1, 4, 1, 2, 3)]
+    assert [future.result(timeout=10) for future in futures] == [3, 2, 1, 4, 1, 2, 3]
+    assert peak[0] <= 4
+
+
+def test_weights_are_capped_at_the_budget(scheduler):
+    assert scheduler.submit(lambda: "done", weight=16).result(timeout=10) == "done"
+
+
+def test_stages_are_admitted_in_order(scheduler):
+    release = threading.Event()
+    started = []
+    first = scheduler.submit(release.wait, 10, weight=3)
+    time.sleep(0.05)
+    # The heavy stage waits for the first; the light one behind it must not overtake it
+    heavy = scheduler.submit(lambda: started.append("heavy"), weight=4)
+    time.sleep(0.05)
+    light = scheduler.submit(lambda: started.append("light"), weight=1)
+    time.sleep(0.1)
+    assert started == []
+    release.set()
+    for future in (first, heavy, light):
+        future.result(timeout=10)
+    assert started == ["heavy", "light"]
+
+
+def test_stages_run_for_their_job(scheduler):
+    job = Job("T1", "a.evtx")
+    assert scheduler.submit(current_job, job=job).result(timeout=10) is job
+
+    job.cancel()
+    with pytest.raises(JobCancelled):
+        scheduler.submit(current_job, job=job).result(timeout=10)
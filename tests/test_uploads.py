@@ -0,0 +1,218 @@
+# chayabusaw/tests/test_uploads.py
+import asyncio
+import hashlib
+import os
+import zipfile
+
+import pytest
+
+from uploads import UploadError, UploadSessions, ZipExtractor, ZipLimits, parse_content_range
+
+SIZE = 3 * 1024 * 1024 + 17
+UNLIMITED = ZipLimits(max_member_bytes=1 << 40, max_total_bytes=1 << 40, max_ratio=1000)
+
+
+@pytest.fixture
+def payload() -> bytes:
+    return os.urandom(SIZE)
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    return UploadSessions(tmp_path / "sessions", max_bytes=64 * 1024 * 1024, ttl_seconds=3600)
+
+
+async def body(data: bytes, piece: int = 256 * 1024):
+    for i in range(0, len(data), piece):
+        yield data[i:i + piece]
+
+
+def send(sessions, session_id: str, data: bytes, start: int, end: int, sent: bytes = None):
+    """PUTs data[start:end] (or the given body) as one range."""
+    content_range = f"bytes {start}-{end - 1}/{len(data)}"
+    stream = body(data[start:end] if sent is None else sent)
+    return asyncio.run(sessions.receive_range(session_id, content_range, stream))
+
+
+def finish(sessions, session_id: str, dest_dir, sha256: str = None):
+    return asyncio.run(sessions.finish(session_id, dest_dir, sha256))
+
+
+def test_parse_content_range():
+    assert parse_content_range("bytes 0-99/1000", 1000) == (0, 100)
+    assert parse_content_range("bytes 900-999/*", 1000) == (900, 1000)
+    with pytest.raises(UploadError) as error:
+        parse_content_range("0-99", 1000)
+    assert error.value.status_code == 400
+    for header in ("bytes 0-99/999", "bytes 900-1000/1000", "bytes 100-99/1000"):
+        with pytest.raises(UploadError) as error:
+            parse_content_range(header, 1000)
+        assert error.value.status_code == 416
+
+
+def test_create_checks_the_file(sessions):
+    with pytest.raises(UploadError):
+        sessions.create("notes.txt", 100, {})
+    with pytest.raises(UploadError):
+        sessions.create("Security.evtx", 0, {})
+    with pytest.raises(UploadError) as error:
+        sessions.create("Security.evtx", 65 * 1024 * 1024, {})
+    assert error.value.status_code == 413
+    session = sessions.create("C:\\logs\\Security.evtx", 100, {"ticket_number": "T1"})
+    assert session.filename == "Security.evtx"
+    assert session.data_path.stat().st_size == 100
+
+
+def test_ranges_in_any_order_resume_after_restart(sessions, payload, tmp_path):
+    session = sessions.create("Security.evtx", SIZE, {"ticket_number": "T1"})
+    third = SIZE // 3
+    send(sessions, session.id, payload, 2 * third, SIZE)
+    send(sessions, session.id, payload, 0, third)
+    assert session.missing() == [[third, 2 * third]]
+
+    with pytest.raises(UploadError) as error:
+        finish(sessions, session.id, tmp_path)
+    assert error.value.status_code == 409
+
+    # A body that breaks off keeps what arrived
+    with pytest.raises(UploadError):
+        send(sessions, session.id, payload, third, 2 * third, sent=payload[third:third + 1000])
+    assert session.missing() == [[third + 1000, 2 * third]]
+
+    # The state is on disk, so a restarted app continues the session
+    restarted = UploadSessions(sessions.root, sessions.max_bytes, sessions.ttl_seconds)
+    assert restarted.get(session.id).missing() == [[third + 1000, 2 * third]]
+    send(restarted, session.id, payload, third + 1000, 2 * third)
+    assert restarted.get(session.id).complete
+
+    path, digest = finish(restarted, session.id, tmp_path, hashlib.sha256(payload).hexdigest().upper())
+    assert path == tmp_path / "Security.evtx"
+    assert path.read_bytes() == payload
+    assert digest == hashlib.sha256(payload).hexdigest()
+    assert not (sessions.root / session.id).exists()
+    with pytest.raises(UploadError) as error:
+        restarted.get(session.id)
+    assert error.value.status_code == 404
+
+
+def test_checksum_mismatch_resets_the_upload(sessions, payload, tmp_path):
+    session = sessions.create("Security.evtx", SIZE, {})
+    send(sessions, session.id, payload, 0, SIZE)
+
+    with pytest.raises(UploadError) as error:
+        finish(sessions, session.id, tmp_path, "0" * 64)
+    assert error.value.status_code == 422
+    assert session.received == []
+    assert session.missing() == [[0, SIZE]]
+    assert not (tmp_path / "Security.evtx").exists()
+
+    send(sessions, session.id, payload, 0, SIZE)
+    path, _ = finish(sessions, session.id, tmp_path, hashlib.sha256(payload).hexdigest())
+    assert path.read_bytes() == payload
+
+
+def test_body_longer_than_its_range(sessions, payload):
+    session = sessions.create("Security.evtx", SIZE, {})
+    with pytest.raises(UploadError):
+        send(sessions, session.id, payload, 0, 1000, sent=payload[:2000])
+    assert session.received_bytes <= 1000
+
+
+def test_collect_garbage_removes_idle_sessions(sessions):
+    session = sessions.create("Security.evtx", 100, {})
+    assert sessions.collect_garbage(now=session.updated_at + 10) == 0
+    assert sessions.collect_garbage(now=session.updated_at + 3601) == 1
+    assert not session.directory.exists()
+
+
+# --- Zip extraction ---
+def write_zip(path, members: dict, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, "w", compression) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return path
+
+
+def test_extracts_evtx_members_and_truncates_the_archive(tmp_path):
+    members = {
+        "host1/Security.evtx": os.urandom(200_000),
+        "readme.txt": b"not a log",
+        "host2/System.EVTX": os.urandom(300_000),
+        "../escape.evtx": b"x" * 1000,
+    }
+    zip_path = write_zip(tmp_path / "upload.zip", members)
+    dest = tmp_path / "out"
+    with ZipExtractor(zip_path, dest, UNLIMITED) as extractor:
+        assert len(extractor.members) == 3
+        offsets = [member.header_offset for member in extractor.members]
+        extracted = []
+        for (path, sha), offset in zip(extractor.extract(), offsets):
+            # Everything from the member just extracted on is gone from the archive
+            assert zip_path.stat().st_size == offset
+            extracted.append((path, sha))
+
+    assert offsets == sorted(offsets, reverse=True)
+    assert zip_path.stat().st_size == 0
+    by_name = {path.relative_to(dest).as_posix(): sha for path, sha in extracted}
+    assert set(by_name) == {"host1/Security.evtx", "host2/System.EVTX", "escape.evtx"}
+    for name, data in members.items():
+        if name.lower().endswith(".evtx"):
+            target = name.removeprefix("../")
+            assert (dest / target).read_bytes() == data
+            assert by_name[target] == hashlib.sha256(data).hexdigest()
+
+
+def test_members_over_the_limits_are_skipped(tmp_path):
+    members = {
+        "small.evtx": os.urandom(10_000),
+        "large.evtx": os.urandom(50_000),
+        "bomb.evtx": b"\0" * 200_000,
+    }
+    zip_path = write_zip(tmp_path / "upload.zip", members)
+    limits = ZipLimits(max_member_bytes=300_000, max_total_bytes=1 << 40, max_ratio=10, ratio_grace_bytes=20_000)
+    dest = tmp_path / "out"
+    with ZipExtractor(zip_path, dest, limits) as extractor:
+        extracted = [path.name for path, _ in extractor.extract()]
+        skipped = extractor.skipped
+    assert sorted(extracted) == ["large.evtx", "small.evtx"]
+    assert skipped == ["bomb.evtx"]
+    assert not (dest / "bomb.evtx").exists()
+
+    zip_path = write_zip(tmp_path / "upload.zip", members)
+    limits = ZipLimits(max_member_bytes=40_000, max_total_bytes=1 << 40, max_ratio=1000)
+    with ZipExtractor(zip_path, tmp_path / "out2", limits) as extractor:
+        extracted = [path.name for path, _ in extractor.extract()]
+        assert sorted(extractor.skipped) == ["bomb.evtx", "large.evtx"]
+    assert extracted == ["small.evtx"]
+
+
+def test_total_size_limit(tmp_path):
+    members = {f"Log{i}.evtx": os.urandom(30_000) for i in range(4)}
+    zip_path = write_zip(tmp_path / "upload.zip", members, zipfile.ZIP_STORED)
+    limits = ZipLimits(max_member_bytes=1 << 40, max_total_bytes=70_000, max_ratio=1000)
+    with ZipExtractor(zip_path, tmp_path / "out", limits) as extractor:
+        extracted = list(extractor.extract())
+        assert len(extracted) == 2
+        assert len(extractor.skipped) == 2
+    assert zip_path.stat().st_size == 0
+
+
+
+def test_corrupt_member_is_skipped(tmp_path):
+    members = {"First.evtx": os.urandom(100_000), "Second.evtx": os.urandom(100_000)}
+    zip_path = write_zip(tmp_path / "upload.zip", members)
+    with zipfile.ZipFile(zip_path) as archive:
+        first = archive.getinfo("First.evtx")
+        data_offset = first.header_offset + zipfile.sizeFileHeader + len(first.filename.encode())
+    # Breaks the compressed data of the member extracted last
+    with open(zip_path, "r+b") as f:
+        f.seek(data_offset + 1000)
+        f.write(os.urandom(2000))
+
+    with ZipExtractor(zip_path, tmp_path / "out", UNLIMITED) as extractor:
+        extracted = [path.name for path, _ in extractor.extract()]
+        assert extractor.skipped == ["First.evtx"]
+    assert extracted == ["Second.evtx"]
+    assert (tmp_path / "out" / "Second.evtx").read_bytes() == members["Second.evtx"]
+    assert not (tmp_path / "out" / "First.evtx").exists()
+    assert zip_path.stat().st_size == 0